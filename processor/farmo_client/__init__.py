@@ -1,5 +1,21 @@
 from farmo_client.client import Client, PumpMode
 from farmo_client.schedule import ScheduleManager
-from farmo_client.schedule import ScheduleItem
+from farmo_client.schedule import ScheduleItem, TimeslotIndex
 
-from farmo_client.device import TankSensor, PumpController
\ No newline at end of file
+from farmo_client.cache import DeviceStateCache, FileStore, ChannelStore
+from farmo_client.device import TankSensor, PumpController
+
+
+## These pull in aiohttp / numpy, which are slow to import, so only import them when they're first used.
+_LAZY_ATTRS = {
+    "AsyncFarmoClient": "farmo_client.async_client",
+    "RecurrenceSet": "farmo_client.recurrence",
+    "Timeslots": "farmo_client.recurrence",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+
+from typing import Optional
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from farmo_client.client import Route, PumpMode
+
+
+class AsyncFarmoClient:
+    """An asyncio counterpart to `farmo_client.Client`, with the same methods as coroutines
+    (other than `get_pump_mode`, which Farmo doesn't provide yet).
+
+    Requests share a keep-alive connection pool, so independent device commands can be issued concurrently, eg.
+
+        async with AsyncFarmoClient(token) as client:
+            await asyncio.gather(
+                client.set_pump_tank_sensor(pump_imei, tank_imei),
+                client.set_tank_threshold(tank_imei, 50, 90),
+            )
+
+    This requires `aiohttp` to be installed, see `is_available`.
+    """
+
+    def __init__(self,
+            token: str,
+            host: str = "np2.farmo.com.au",
+            port: Optional[int] = None,
+            max_connections: int = 10,
+        ) -> None:
+
+            if aiohttp is None:
+                raise RuntimeError("aiohttp must be installed to use AsyncFarmoClient.")
+
+            self.token = token
+            self.host = host
+            self.port = port
+
+            self.request_timeout = 10
+            self.request_retries = 2
+            self.retry_backoff = 0.5
+
+            self.max_connections = max_connections
+            self._session = None
+
+    @staticmethod
+    def is_available() -> bool:
+        return aiohttp is not None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                headers={"X-Auth-Token": f"{self.token}", "Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _construct_url(self, location: Optional[Route] = None):
+        url = f"https://{self.host}/v1.0/"
+        if self.port:
+            url = f"https://{self.host}:{self.port}/v1.0/"
+
+        if location:
+            return url + location.url
+
+        return url
+
+    async def _request(self, route: Route, **kwargs):
+        url = self._construct_url(route)
+        session = self._get_session()
+
+        # all retry state is local to this call, so concurrent requests never share attempt counters.
+        attempt_counter = 0
+        retries = self.request_retries if route.method == "GET" else 0
+
+        data = None
+        while attempt_counter <= retries:
+            attempt_counter += 1
+
+            logging.debug(f"Making {route.method} request to {url} with kwargs {kwargs}")
+            try:
+                async with session.request(route.method, url, allow_redirects=True, **kwargs) as resp:
+                    status = resp.status
+                    text = await resp.text()
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                logging.info(f"Failed to make request to {url}: {e}")
+                if attempt_counter > retries:
+                    raise
+                await asyncio.sleep(self.retry_backoff * attempt_counter)
+                continue
+
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = text
+
+            if status == 200:
+                ## if we get a 200, we're good to go
+                break
+            elif status == 403:
+                msg = "403 - Access Denied"
+                if data:
+                    msg = msg + f": {data}"
+                raise Exception(msg)
+            elif status == 404:
+                msg = "404 - Not Found"
+                if data:
+                    msg = msg + f": {data}"
+                raise Exception(msg)
+            else:
+                logging.info(f"Failed to make request to {url}. Status code: {status}, message: {text}")
+                if attempt_counter > retries:
+                    raise Exception(text)
+                await asyncio.sleep(self.retry_backoff * attempt_counter)
+
+        logging.debug(f"{url} has received {data}")
+        return data
+
+    async def set_pump_mode(self, imei: str, mode: str):
+        ## Check if the mode is valid
+        if mode not in [PumpMode.OFF, PumpMode.ON, PumpMode.SCHEDULE, PumpMode.TANK_LEVEL, PumpMode.TANK_LEVEL_SCHEDULE]:
+            raise ValueError(f"Invalid pump mode: {mode}")
+
+        return await self._request(Route("POST", "set_pump_mode"),
+            json={
+                "rpc_imei": imei,
+                "pump_mode": mode
+            }
+        )
+
+    async def get_name(self, imei: str):
+        return await self._request(Route("POST", "get_name"),
+            json={
+                "imei": imei,
+            }
+        )
+
+    async def get_tank_level(self, imei: str):
+        return await self._request(Route("POST", "get_tank_level"),
+            json={
+                "imei": imei
+            }
+        )
+
+    async def set_pump_tank_sensor(self, pump_imei: str, tank_sensor_imei: str):
+        return await self._request(Route("POST", "update_tank"),
+            json={
+                "pump_imei": pump_imei,
+                "tank_imei": tank_sensor_imei
+            }
+        )
+
+    async def set_tank_threshold(self, imei: str, low_threshold: int, high_threshold: int):
+        return await self._request(Route("POST", "set_tank_threshold"),
+            json={
+                "tank_imei": imei,
+                "low_threshold": low_threshold,
+                "high_threshold": high_threshold
+            }
+        )
+
+    async def pump_start_now(self, imei: str):
+        return await self._request(Route("POST", "start_now"),
+            json={
+                "imei": imei
+            }
+        )
+
+    async def pump_stop_now(self, imei: str):
+        return await self._request(Route("POST", "stop_now"),
+            json={
+                "imei": imei
+            }
+        )
+
+    async def get_schedules(self, imei: str):
+        return await self._request(Route("GET", "get_schedules/{}", imei))
+
+    async def get_timeslots(self, imei: str):
+        return await self._request(Route("GET", "get_timeslots/{}", imei))
+
+    async def add_schedules(self, data: dict):
+        return await self._request(Route("POST", "add_schedules"), json=data)
+
+    async def update_schedules(self, data: dict):
+        return await self._request(Route("POST", "update_schedules"), json=data)
+
+    async def delete_schedule(self, data: dict):
+        return await self._request(Route("POST", "delete_schedule"), json=data)
+
+    async def add_schedules_manual(self, data: dict):
+        return await self._request(Route("POST", "add_schedules_manual"), json=data)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "farmo_device_cache.json")
+
+## How long (in seconds) each piece of device state is considered fresh for.
+## The tank sensor reports far less often than the pump controller uplinks, and display names rarely change.
+## Settings sent to Farmo (the pump's tank sensor and the tank's thresholds) are only recorded for devices with
+## `skip_unchanged_settings`, which skip re-sending them until they change or this long has passed.
+DEFAULT_TTLS = {
+    "get_tank_level": 5 * 60,
+    "get_farmo_display_name": 7 * 24 * 60 * 60,
+    "get_pump_mode": 60,
+    "tank_sensor": 60 * 60,
+    "tank_threshold": 60 * 60,
+}
+DEFAULT_TTL = 60
+
+
+class FileStore:
+    """Persist the device state cache to a local JSON file, eg. in `/tmp` so warm lambda containers share it."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH) -> None:
+        self.path = path
+
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as e:
+            logging.info(f"Failed to read device cache at {self.path}, ignoring: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, entries: dict) -> None:
+        ## write to a temp file and rename so concurrent invocations never read a half-written cache
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(entries, fp)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.info(f"Failed to write device cache to {self.path}: {e}")
+
+
+class ChannelStore:
+    """Persist the device state cache in a (Doover) channel aggregate, so it is shared by every invocation.
+
+    `channel` is anything with `fetch_aggregate()` and `publish(data, save_log=...)` methods, eg. a `pydoover` Channel.
+    """
+
+    def __init__(self, channel: Any) -> None:
+        self.channel = channel
+
+    def load(self) -> dict:
+        try:
+            data = self.channel.fetch_aggregate()
+        except Exception as e:
+            logging.info(f"Failed to read device cache from channel, ignoring: {e}")
+            return {}
+        return data.get("entries", {}) if isinstance(data, dict) else {}
+
+    def save(self, entries: dict) -> None:
+        try:
+            self.channel.publish({"entries": entries}, save_log=False, override_aggregate=True)
+        except Exception as e:
+            logging.info(f"Failed to write device cache to channel: {e}")
+
+
+class DeviceStateCache:
+    """A TTL-bounded, LRU cache of device state, keyed by (imei, name).
+
+    Parameters
+    ----------
+    store: Optional[FileStore | ChannelStore]
+        Where to persist entries between invocations. If None, the cache is in-memory only.
+    ttls: Optional[dict]
+        Seconds each named value is fresh for, see `DEFAULT_TTLS`. Names not listed use `default_ttl`.
+    max_entries: int
+        Least recently used entries are evicted once the cache holds more than this many.
+    autosave: bool
+        Whether to write to the store on every change. Otherwise changes are only written by `flush`, eg. once per run.
+    """
+
+    def __init__(self,
+            store: Optional[Any] = None,
+            ttls: Optional[dict] = None,
+            default_ttl: int = DEFAULT_TTL,
+            max_entries: int = 256,
+            autosave: bool = True,
+        ) -> None:
+
+        self.store = store
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.autosave = autosave
+
+        self._entries = OrderedDict() # type: OrderedDict[str, dict]
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+
+    @staticmethod
+    def _key(imei: str, name: str) -> str:
+        return f"{imei}/{name}"
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if self.store is not None:
+            self._entries.update(self.store.load())
+            self._evict()
+
+    def _save(self) -> None:
+        self._dirty = True
+        if self.autosave:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self.store is not None and self._dirty:
+            self.store.save(self._entries)
+        self._dirty = False
+
+    def flush(self) -> None:
+        """Write any unsaved changes to the store."""
+        with self._lock:
+            self._flush()
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_ttl(self, name: str) -> int:
+        return self.ttls.get(name, self.default_ttl)
+
+    def get(self, imei: str, name: str) -> tuple[bool, Any]:
+        """Return (hit, value) for a cached value, where hit is False if it is missing or expired."""
+        key = self._key(imei, name)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry["expires_at"] < time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry["value"]
+
+    def set(self, imei: str, name: str, value: Any, ttl: Optional[int] = None) -> None:
+        if ttl is None:
+            ttl = self.get_ttl(name)
+        key = self._key(imei, name)
+        with self._lock:
+            self._load()
+            self._entries[key] = {"value": value, "expires_at": time.time() + ttl}
+            self._entries.move_to_end(key)
+            self._evict()
+            self._save()
+
+    def invalidate(self, imei: str, name: Optional[str] = None) -> None:
+        """Drop a cached value, or every cached value for a device if `name` is None."""
+        with self._lock:
+            self._load()
+            if name is not None:
+                keys = [self._key(imei, name)]
+            else:
+                keys = [k for k in self._entries if k.startswith(f"{imei}/")]
+
+            removed = [self._entries.pop(k) for k in keys if k in self._entries]
+            if removed:
+                self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._save()
+
+
+## Shared by devices that aren't given their own cache, so devices with the same IMEI share state
+default_cache = DeviceStateCache()
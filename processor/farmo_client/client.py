@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import logging
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Union, Callable, overload, Literal, Optional, TypeVar
 from urllib.parse import quote, urlencode
 
@@ -42,9 +44,12 @@ class Client:
 
             self.request_timeout = 10
             self.request_retries = 2
+            self.max_concurrent_requests = 10
 
             self.session = requests.Session()
             self.update_headers()
+            ## the sessions of `gather`'s worker threads
+            self._local = threading.local()
 
 
     def update_headers(self):
@@ -63,6 +68,42 @@ class Client:
         return url
 
 
+    def _init_thread_session(self):
+        ## requests sessions aren't thread-safe, so each worker thread gets its own, with this client's headers and
+        ## (thread-safe) adapters, so they share connection pools (and any adapters mounted for testing)
+        session = requests.Session()
+        session.headers.update(self.session.headers)
+        session.verify = self.session.verify
+        for prefix, adapter in self.session.adapters.items():
+            session.mount(prefix, adapter)
+        self._local.session = session
+
+    def _get_session(self) -> requests.Session:
+        return getattr(self._local, "session", None) or self.session
+
+    def gather(self, *calls: Callable[[], Any], return_exceptions: bool = False) -> list:
+        """Make independent calls concurrently (in threads), returning their results in the order they were passed.
+
+        Each call should take no arguments, eg. `functools.partial(pump_controller.set_pump_mode, mode)`.
+        If `return_exceptions` is True, an exception raised by a call is put in its place in the results,
+        otherwise the first one (in call order) is raised once all calls have finished.
+        """
+        if not calls:
+            return []
+        if len(calls) == 1 and not return_exceptions:
+            return [calls[0]()]
+
+        with ThreadPoolExecutor(max_workers=min(len(calls), self.max_concurrent_requests), initializer=self._init_thread_session) as executor:
+            futures = [executor.submit(call) for call in calls]
+
+        results = []
+        for future in futures:
+            exc = future.exception()
+            if exc is not None and not return_exceptions:
+                raise exc
+            results.append(exc if exc is not None else future.result())
+        return results
+
     def _request(self, route: Route, **kwargs):
         url = self._construct_url(route)
 
@@ -74,7 +115,7 @@ class Client:
             attempt_counter += 1
 
             logging.debug(f"Making {route.method} request to {url} with kwargs {kwargs}")
-            resp = self.session.request(route.method, url, timeout=self.request_timeout, allow_redirects=True, **kwargs)
+            resp = self._get_session().request(route.method, url, timeout=self.request_timeout, allow_redirects=True, **kwargs)
 
             data = None
             try:
@@ -9,43 +9,103 @@ import time
 from datetime import datetime, timedelta
 
 from farmo_client.client import Client, PumpMode
+from farmo_client.cache import DeviceStateCache, default_cache
 
 
-## Define a decorator that, if it finds an appropriately named attr on the class, will return it, otherwise will call the function and set the attr to the
-## result of the function
+## Define a decorator that reads through the device's state cache. If a fresh value is cached for this device (by IMEI),
+## return it, otherwise call the function and cache the result for the TTL configured for the function name.
+## Pass ignore_cache=True to always call the function (the result is still cached).
 def cached_property(func):
-    def wrapper(self, *args, **kwargs):
-        ## if ignore_cache is set, return the result of the function
-        cached_name = f"_{func.__name__}__cached"
-        if not kwargs.get("ignore_cache", False):
-            if hasattr(self, cached_name):
-                return getattr(self, cached_name)
+    def wrapper(self, *args, ignore_cache: bool = False, **kwargs):
+        if not ignore_cache:
+            hit, value = self.cache.get(self.imei, func.__name__)
+            if hit:
+                return value
         result = func(self, *args, **kwargs)
-        setattr(self, cached_name, result)
+        if result is not None:
+            self.cache.set(self.imei, func.__name__, result)
         return result
     return wrapper
 
 
+## The same as cached_property, but for coroutines (ie. methods used with an AsyncFarmoClient).
+## The `_async` suffix is dropped from the cache key, so the sync and async methods share cached values.
+def async_cached_property(func):
+    name = func.__name__.removesuffix("_async")
+
+    async def wrapper(self, *args, ignore_cache: bool = False, **kwargs):
+        if not ignore_cache:
+            hit, value = self.cache.get(self.imei, name)
+            if hit:
+                return value
+        result = await func(self, *args, **kwargs)
+        if result is not None:
+            self.cache.set(self.imei, name, result)
+        return result
+    return wrapper
+
 
 class Device:
+    """A Farmo device. `client` can be either a `Client` or an `AsyncFarmoClient`,
+    in which case the `*_async` methods should be used.
 
-    def __init__(self, client: Client, imei: str) -> None:
+    Device state (eg. tank level) is read through `cache`, a `DeviceStateCache`. If not given, a shared in-memory cache is used.
+
+    With `skip_unchanged_settings`, settings (eg. a tank's thresholds) are only sent when they differ from the ones last
+    sent through `cache`. This is off by default, since a setting changed elsewhere (eg. in the Farmo app), or a failed
+    write, then isn't corrected until the cached setting expires."""
+
+    def __init__(self, client: Client, imei: str, cache: Optional[DeviceStateCache] = None, skip_unchanged_settings: bool = False) -> None:
         self.client = client
         self.imei = imei
+        self.cache = cache if cache is not None else default_cache
+        self.skip_unchanged_settings = skip_unchanged_settings
+
+    def _setting_changed(self, name: str, value: Any) -> bool:
+        ## Whether a setting needs sending to Farmo, ie. always unless it's the same as the one last sent (with skip_unchanged_settings)
+        if not self.skip_unchanged_settings:
+            return True
+        hit, sent = self.cache.get(self.imei, name)
+        return not hit or sent != value
 
+    def _setting_sent(self, name: str, value: Any, result: Any) -> None:
+        ## Only a successful write is recorded, so a failed one is retried next time
+        if self.skip_unchanged_settings and result:
+            self.cache.set(self.imei, name, value)
 
     @cached_property
     def get_farmo_display_name(self) -> str:
         result = self.client.get_name(self.imei)
         self.farmo_display_name = result
         return result
+
+    @async_cached_property
+    async def get_farmo_display_name_async(self) -> str:
+        result = await self.client.get_name(self.imei)
+        self.farmo_display_name = result
+        return result
     
 
 
 class TankSensor(Device):
 
-    def set_tank_threshold(self, low_threshold: int, high_threshold: int) -> bool:
-        return self.client.set_tank_threshold(self.imei, low_threshold, high_threshold)
+    def tank_threshold_changed(self, low_threshold: int, high_threshold: int) -> bool:
+        return self._setting_changed("tank_threshold", [low_threshold, high_threshold])
+
+    ## With skip_unchanged_settings, unchanged thresholds aren't re-sent (unless force=True), and this returns True without a request.
+    def set_tank_threshold(self, low_threshold: int, high_threshold: int, force: bool = False) -> bool:
+        if not force and not self.tank_threshold_changed(low_threshold, high_threshold):
+            return True
+        result = self.client.set_tank_threshold(self.imei, low_threshold, high_threshold)
+        self._setting_sent("tank_threshold", [low_threshold, high_threshold], result)
+        return result
+
+    async def set_tank_threshold_async(self, low_threshold: int, high_threshold: int, force: bool = False) -> bool:
+        if not force and not self.tank_threshold_changed(low_threshold, high_threshold):
+            return True
+        result = await self.client.set_tank_threshold(self.imei, low_threshold, high_threshold)
+        self._setting_sent("tank_threshold", [low_threshold, high_threshold], result)
+        return result
 
 class PumpController(Device):
 
@@ -54,20 +114,56 @@ class PumpController(Device):
         return self.client.get_pump_mode(self.imei)
     
     def set_pump_mode(self, mode: str) -> bool:
+        self.cache.invalidate(self.imei, "get_pump_mode")
         return self.client.set_pump_mode(self.imei, mode)
+
+    async def set_pump_mode_async(self, mode: str) -> bool:
+        self.cache.invalidate(self.imei, "get_pump_mode")
+        return await self.client.set_pump_mode(self.imei, mode)
     
-    def set_tank_sensor(self, tank_sensor: TankSensor) -> bool:
-        return self.client.set_pump_tank_sensor(self.imei, tank_sensor.imei)
-    
-    @cached_property
-    def get_tank_level(self) -> int:
-        result = self.client.get_tank_level(self.imei)
+    def tank_sensor_changed(self, tank_sensor: TankSensor) -> bool:
+        return self._setting_changed("tank_sensor", tank_sensor.imei)
+
+    ## With skip_unchanged_settings, an unchanged tank sensor isn't re-sent (unless force=True), and this returns True without a request.
+    ## The tank level is read through the pump controller, so its cached value is dropped whenever the tank sensor is sent.
+    def set_tank_sensor(self, tank_sensor: TankSensor, force: bool = False) -> bool:
+        if not force and not self.tank_sensor_changed(tank_sensor):
+            return True
+        self.cache.invalidate(self.imei, "get_tank_level")
+        result = self.client.set_pump_tank_sensor(self.imei, tank_sensor.imei)
+        self._setting_sent("tank_sensor", tank_sensor.imei, result)
+        return result
+
+    async def set_tank_sensor_async(self, tank_sensor: TankSensor, force: bool = False) -> bool:
+        if not force and not self.tank_sensor_changed(tank_sensor):
+            return True
+        self.cache.invalidate(self.imei, "get_tank_level")
+        result = await self.client.set_pump_tank_sensor(self.imei, tank_sensor.imei)
+        self._setting_sent("tank_sensor", tank_sensor.imei, result)
+        return result
+
+    @staticmethod
+    def _parse_tank_level(result) -> Optional[int]:
         if result is not None and 'percent_full' in result:
             return result['percent_full']
         return None
+    
+    @cached_property
+    def get_tank_level(self) -> int:
+        return self._parse_tank_level(self.client.get_tank_level(self.imei))
+
+    @async_cached_property
+    async def get_tank_level_async(self) -> int:
+        return self._parse_tank_level(await self.client.get_tank_level(self.imei))
 
     def start_pump(self) -> bool:
         return self.client.pump_start_now(self.imei)
+
+    async def start_pump_async(self) -> bool:
+        return await self.client.pump_start_now(self.imei)
     
     def stop_pump(self) -> bool:
-        return self.client.pump_stop_now(self.imei)
\ No newline at end of file
+        return self.client.pump_stop_now(self.imei)
+
+    async def stop_pump_async(self) -> bool:
+        return await self.client.pump_stop_now(self.imei)
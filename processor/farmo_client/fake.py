@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+## An in-process stand-in for the Farmo API, for running (and benchmarking) processors offline.
+## `FakeFarmoAPI` keeps device state in memory and serves the routes used by `farmo_client.Client`
+## through a `requests` transport adapter, eg.
+##
+##     api = FakeFarmoAPI.from_fixture("fixtures/farmo.json", latency=0.1)
+##     client = Client()
+##     api.install(client.session)
+##
+## Only the synchronous `Client` is supported, `AsyncFarmoClient` uses aiohttp rather than requests.
+
+import copy
+import json
+import re
+import threading
+import time
+
+from collections import Counter
+from typing import Any, Callable, Optional, Union
+from urllib.parse import urlsplit, unquote
+
+import requests
+
+from requests.adapters import BaseAdapter
+
+from farmo_client.client import PumpMode
+from farmo_client.schedule import ScheduleItem, SECONDS_PER_WEEK
+
+
+DEFAULT_HOST = "np2.farmo.com.au"
+
+
+class FakeFarmoAdapter(BaseAdapter):
+    """A `requests` transport adapter that answers requests with `handler(method, path, body) -> (status, data)`."""
+
+    def __init__(self, handler: Callable[[str, str, Any], tuple[int, Any]], latency: Union[float, Callable[[], float]] = 0.0):
+        super().__init__()
+        self.handler = handler
+        self.latency = latency
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode()
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            pass
+
+        status, data = self.handler(request.method, unquote(urlsplit(request.url).path), body)
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(data).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeFarmoAPI:
+    """An in-memory Farmo API.
+
+    Parameters
+    ----------
+    host: str
+        The host requests are made to (see `farmo_client.Client`), which the adapter is mounted on.
+    latency: float or Callable
+        Seconds of latency to add to every request, or a callable returning them (eg. to add jitter).
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, latency: Union[float, Callable[[], float]] = 0.0):
+        self.host = host
+        self.latency = latency
+
+        ## imei -> device state, eg. {"name": ..., "pump_mode": ..., "switch_state": ..., "percent_full": ...}
+        self.devices: dict[str, dict[str, Any]] = dict()
+        ## imei -> schedules, as returned by get_schedules
+        self.schedules: dict[str, list[dict[str, Any]]] = dict()
+
+        self.request_counts = Counter()
+        self._next_schedule_id = 1
+        self._lock = threading.RLock()
+        self._routes = [
+            ("POST", r"set_pump_mode", self._set_pump_mode),
+            ("POST", r"get_name", self._get_name),
+            ("POST", r"get_tank_level", self._get_tank_level),
+            ("POST", r"update_tank", self._update_tank),
+            ("POST", r"set_tank_threshold", self._set_tank_threshold),
+            ("POST", r"start_now", self._start_now),
+            ("POST", r"stop_now", self._stop_now),
+            ("GET", r"get_schedules/([^/]+)", self._get_schedules),
+            ("GET", r"get_timeslots/([^/]+)", self._get_timeslots),
+            ("POST", r"add_schedules", self._add_schedules),
+            ("POST", r"update_schedules", self._update_schedules),
+            ("POST", r"delete_schedule", self._delete_schedule),
+            ("POST", r"add_schedules_manual", self._add_schedules_manual),
+        ]
+        self._routes = [(method, re.compile(f"^/v1.0/{pattern}/?$"), pattern, func) for method, pattern, func in self._routes]
+
+    ## State
+
+    def add_device(self, imei: str, name: Optional[str] = None, **state) -> dict[str, Any]:
+        with self._lock:
+            device = self.devices.setdefault(str(imei), {
+                "name": name or f"Device-{str(imei)[-4:]}",
+                "pump_mode": PumpMode.OFF,
+                "switch_state": 0,
+                "percent_full": None,
+                "tank_imei": None,
+                "low_threshold": None,
+                "high_threshold": None,
+            })
+            device.update(state)
+            return device
+
+    def _device(self, imei) -> Optional[dict[str, Any]]:
+        return self.devices.get(str(imei))
+
+    ## Fixtures
+
+    def to_fixture(self) -> dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy({"devices": self.devices, "schedules": self.schedules})
+
+    def save_fixture(self, path: str) -> None:
+        with open(path, "w") as fp:
+            json.dump(self.to_fixture(), fp, indent=2)
+
+    @classmethod
+    def from_fixture(cls, fixture: Union[str, dict[str, Any]], **kwargs) -> "FakeFarmoAPI":
+        if isinstance(fixture, str):
+            with open(fixture, "r") as fp:
+                fixture = json.load(fp)
+
+        api = cls(**kwargs)
+        api.devices = copy.deepcopy(fixture.get("devices", {}))
+        api.schedules = copy.deepcopy(fixture.get("schedules", {}))
+        ids = [s["schedule_id"] for items in api.schedules.values() for s in items if isinstance(s.get("schedule_id"), int)]
+        api._next_schedule_id = max(ids, default=0) + 1
+        return api
+
+    ## Transport
+
+    def install(self, session: requests.Session) -> FakeFarmoAdapter:
+        """Route a session's requests to the Farmo host to this fake API."""
+        adapter = FakeFarmoAdapter(self.handle, latency=self.latency)
+        session.mount(f"https://{self.host}", adapter)
+        return adapter
+
+    def reset_counts(self) -> None:
+        self.request_counts.clear()
+
+    def handle(self, method: str, path: str, body: Any) -> tuple[int, Any]:
+        for route_method, regex, pattern, func in self._routes:
+            if route_method != method:
+                continue
+            match = regex.match(path)
+            if match is None:
+                continue
+
+            with self._lock:
+                self.request_counts[f"{method} {re.sub(r'[(][^)]*[)]', '{}', pattern)}"] += 1
+                return func(body or {}, *match.groups())
+
+        with self._lock:
+            self.request_counts[f"{method} <unknown>"] += 1
+        return 404, {"error": f"No route for {method} {path}"}
+
+    def _with_device(self, imei, func):
+        device = self._device(imei)
+        if device is None:
+            return 404, {"error": f"Device {imei} not found"}
+        return 200, func(device)
+
+    def _set_pump_mode(self, body):
+        def update(device):
+            device["pump_mode"] = body.get("pump_mode")
+            if device["pump_mode"] == PumpMode.ON:
+                device["switch_state"] = 1
+            elif device["pump_mode"] == PumpMode.OFF:
+                device["switch_state"] = 0
+            return True
+        return self._with_device(body.get("rpc_imei"), update)
+
+    def _get_name(self, body):
+        return self._with_device(body.get("imei"), lambda device: device["name"])
+
+    def _get_tank_level(self, body):
+        def level(device):
+            ## the tank level is read through the pump controller's tank sensor, if it has one
+            tank = self._device(device.get("tank_imei")) if device.get("tank_imei") else device
+            return {"percent_full": (tank or device).get("percent_full")}
+        return self._with_device(body.get("imei"), level)
+
+    def _update_tank(self, body):
+        return self._with_device(body.get("pump_imei"), lambda device: device.update(tank_imei=body.get("tank_imei")) or True)
+
+    def _set_tank_threshold(self, body):
+        return self._with_device(body.get("tank_imei"), lambda device: device.update(
+            low_threshold=body.get("low_threshold"), high_threshold=body.get("high_threshold")
+        ) or True)
+
+    def _start_now(self, body):
+        return self._with_device(body.get("imei"), lambda device: device.update(switch_state=1) or True)
+
+    def _stop_now(self, body):
+        return self._with_device(body.get("imei"), lambda device: device.update(switch_state=0) or True)
+
+    def _get_schedules(self, body, imei):
+        return 200, copy.deepcopy(self.schedules.get(imei, []))
+
+    def _get_timeslots(self, body, imei):
+        now = int(time.time())
+        slots = [
+            {"schedule_id": item.schedule_id, "start_time": start, "end_time": end}
+            for item in (ScheduleItem(json_data=s) for s in self.schedules.get(imei, []))
+            for start, end in item.timeslots(now, now + SECONDS_PER_WEEK)
+        ]
+        return 200, sorted(slots, key=lambda s: s["start_time"])
+
+    def _add_schedule(self, schedule: dict[str, Any]) -> dict[str, Any]:
+        schedule = dict(schedule, schedule_id=self._next_schedule_id)
+        self._next_schedule_id += 1
+        self.schedules.setdefault(str(schedule.get("imei")), []).append(schedule)
+        return schedule
+
+    def _add_schedules(self, body):
+        return 200, self._add_schedule(body)
+
+    def _update_schedules(self, body):
+        for schedule in self.schedules.get(str(body.get("imei")), []):
+            if schedule["schedule_id"] == body.get("schedule_id"):
+                schedule.update(body)
+                return 200, schedule
+        return 404, {"error": "Schedule not found"}
+
+    def _delete_schedule(self, body):
+        schedules = self.schedules.get(str(body.get("imei")), [])
+        remaining = [s for s in schedules if s["schedule_id"] != body.get("schedule_id")]
+        if len(remaining) == len(schedules):
+            return 404, {"error": "Schedule not found"}
+        self.schedules[str(body.get("imei"))] = remaining
+        return 200, True
+
+    def _add_schedules_manual(self, body):
+        added = [
+            self._add_schedule({"imei": body.get("imei"), "start_time": t["start_time"], "end_time": t["end_time"], "frequency": "once"})
+            for t in body.get("timeslots", [])
+        ]
+        return 200, added
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+## A vectorised recurrence engine for Farmo schedules.
+## Expands every schedule (start, duration, period, repeat_until) into concrete timeslots over a horizon in one pass,
+## and answers overlap / merge / next occurrence queries over thousands of timeslots without per-slot Python loops.
+## This requires numpy.
+
+import logging
+import time
+
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from farmo_client.schedule import ScheduleItem, ScheduleFrequency, SECONDS_PER_DAY, SECONDS_PER_WEEK
+
+
+## repeat_until value used for schedules that repeat forever
+NO_END = np.iinfo(np.int64).max if np is not None else None
+
+FREQUENCY_PERIODS = {
+    ScheduleFrequency.once: 0,
+    ScheduleFrequency.daily: SECONDS_PER_DAY,
+    ScheduleFrequency.weekly: SECONDS_PER_WEEK,
+}
+
+
+def _check_numpy():
+    if np is None:
+        raise RuntimeError("numpy must be installed to use the farmo_client recurrence engine.")
+
+
+class Timeslots:
+    """A set of concrete timeslots, sorted by start time.
+
+    Attributes
+    ----------
+    starts, ends: np.ndarray[int64]
+        Epoch seconds (UTC) of the start and end of each timeslot.
+    schedule_index: np.ndarray[int64]
+        Index of the schedule (in the `RecurrenceSet`) each timeslot came from, or -1 for merged timeslots.
+    """
+
+    def __init__(self, starts, ends, schedule_index=None):
+        _check_numpy()
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if schedule_index is None:
+            schedule_index = np.full(len(starts), -1, dtype=np.int64)
+        schedule_index = np.asarray(schedule_index, dtype=np.int64)
+
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.schedule_index = schedule_index[order]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def has_overlaps(self) -> bool:
+        if len(self) < 2:
+            return False
+        return bool(np.any(self.starts[1:] < np.maximum.accumulate(self.ends)[:-1]))
+
+    def overlaps(self):
+        """Return an (n, 2) array of the indices of every pair of overlapping timeslots, (earlier, later)."""
+        if len(self) < 2:
+            return np.empty((0, 2), dtype=np.int64)
+
+        # every slot j > i which starts before slot i ends overlaps slot i
+        last = np.searchsorted(self.starts, self.ends, side="left")
+        counts = np.maximum(last - np.arange(len(self)) - 1, 0)
+
+        first = np.repeat(np.arange(len(self)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.stack([first, first + 1 + offsets], axis=1)
+
+    def merged(self) -> "Timeslots":
+        """Merge overlapping (or touching) timeslots together."""
+        if len(self) == 0:
+            return Timeslots([], [])
+
+        running_end = np.maximum.accumulate(self.ends)
+        is_head = np.ones(len(self), dtype=bool)
+        is_head[1:] = self.starts[1:] > running_end[:-1]
+        heads = np.flatnonzero(is_head)
+
+        return Timeslots(self.starts[heads], np.maximum.reduceat(self.ends, heads))
+
+    def covering(self, at: int):
+        """Return the indices of the timeslots that cover time `at`."""
+        candidates = np.arange(np.searchsorted(self.starts, at, side="right"))
+        return candidates[self.ends[candidates] > at]
+
+    def next_occurrence(self, after: int) -> Optional[int]:
+        """Return the index of the first timeslot starting after `after`, or None."""
+        idx = int(np.searchsorted(self.starts, after, side="right"))
+        if idx >= len(self):
+            return None
+        return idx
+
+
+class RecurrenceSet:
+    """A columnar set of recurring schedules.
+
+    Parameters
+    ----------
+    starts: array of int
+        Epoch seconds (UTC) of each schedule's first occurrence.
+    durations: array of int
+        Duration of each occurrence, in seconds.
+    periods: array of int
+        Seconds between occurrences, or 0 for a once-off schedule.
+    repeat_untils: array of int
+        Occurrences must start before this time (epoch seconds). Use `NO_END` for no end.
+    """
+
+    def __init__(self, starts, durations, periods, repeat_untils=None):
+        _check_numpy()
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.int64)
+        self.periods = np.asarray(periods, dtype=np.int64)
+        if repeat_untils is None:
+            repeat_untils = np.full(len(self.starts), NO_END, dtype=np.int64)
+        self.repeat_untils = np.asarray(repeat_untils, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_schedule_items(cls, items: list[ScheduleItem]) -> "RecurrenceSet":
+        return cls(
+            [int(i.start_time) for i in items],
+            [int(i.duration or 0) for i in items],
+            [i.period or 0 for i in items],
+            [int(i.repeat_until) if (i.period and i.repeat_until) else NO_END for i in items],
+        )
+
+    @classmethod
+    def from_ui_schedules(cls, schedules: list[dict]) -> "RecurrenceSet":
+        """Build from the (non manually edited) schedules in the `schedules` channel aggregate."""
+        schedules = [s for s in schedules if s.get("edited", 0) == 0]
+        periods = [FREQUENCY_PERIODS.get(s["frequency"], 0) for s in schedules]
+        return cls(
+            [s["start_time"] for s in schedules],
+            [int(s["duration"] * 3600) for s in schedules],
+            periods,
+            [s["end_time"] if p else NO_END for s, p in zip(schedules, periods)],
+        )
+
+    def expand(self, horizon_start: int, horizon_end: int) -> Timeslots:
+        """Expand every schedule into the timeslots which overlap [horizon_start, horizon_end)."""
+        recurring = self.periods > 0
+        period = np.where(recurring, self.periods, 1)
+        limit = np.minimum(horizon_end, self.repeat_untils)
+
+        # first occurrence k that ends after the horizon starts, and the last that starts before the limit
+        first_k = np.maximum((horizon_start - self.durations - self.starts) // period + 1, 0)
+        last_k = -((self.starts - limit) // period) - 1
+
+        once_in_horizon = (self.starts < horizon_end) & (self.starts + self.durations > horizon_start)
+        first_k = np.where(recurring, first_k, 0)
+        last_k = np.where(recurring, last_k, np.where(once_in_horizon, 0, -1))
+
+        counts = np.maximum(last_k - first_k + 1, 0)
+        schedule_index = np.repeat(np.arange(len(self)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first_k, counts)
+
+        starts = self.starts[schedule_index] + k * self.periods[schedule_index]
+        return Timeslots(starts, starts + self.durations[schedule_index], schedule_index)
+
+    def next_occurrence(self, after: int):
+        """Return the start of each schedule's first occurrence after `after`, or -1 if there are no more."""
+        recurring = self.periods > 0
+        period = np.where(recurring, self.periods, 1)
+
+        k = np.where(self.starts > after, 0, (after - self.starts) // period + 1)
+        k = np.where(recurring, k, 0)
+        candidate = self.starts + k * self.periods
+
+        valid = (candidate > after) & (~recurring | (self.starts > after) | (candidate < self.repeat_untils))
+        return np.where(valid, candidate, -1)
+
+
+if __name__ == "__main__":
+
+    logging.getLogger().setLevel(logging.INFO)
+
+    ## Benchmark expanding a large multi-pump schedule over a year
+    rng = np.random.default_rng(0)
+    n = 5000
+    now = int(time.time())
+    recurrence = RecurrenceSet(
+        starts=now + rng.integers(0, 7 * SECONDS_PER_DAY, n),
+        durations=rng.integers(15, 240, n) * 60,
+        periods=rng.choice([0, SECONDS_PER_DAY, SECONDS_PER_WEEK], n),
+        repeat_untils=now + rng.integers(30, 365, n) * SECONDS_PER_DAY,
+    )
+
+    t0 = time.perf_counter()
+    slots = recurrence.expand(now, now + 365 * SECONDS_PER_DAY)
+    t1 = time.perf_counter()
+    merged = slots.merged()
+    t2 = time.perf_counter()
+    has_overlaps = slots.has_overlaps()
+    t3 = time.perf_counter()
+
+    logging.info(f"Expanded {n} schedules into {len(slots)} timeslots in {(t1 - t0) * 1000:.1f}ms")
+    logging.info(f"Merged into {len(merged)} timeslots in {(t2 - t1) * 1000:.1f}ms")
+    logging.info(f"Overlap check ({has_overlaps}) in {(t3 - t2) * 1000:.1f}ms")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import bisect
 import logging
 
 from typing import Any, Union, Callable, overload, Literal, Optional, TypeVar
@@ -34,6 +35,28 @@ def time_to_epoch(time: Union[datetime, int, str]) -> int:
     return time
 
 
+SECONDS_PER_DAY = 24 * 3600
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+def next_start_time(start_time: int, frequency: str, after: int) -> Optional[int]:
+    """Roll a schedule's start time forward to its first occurrence after `after`.
+
+    Returns None for a once-off schedule that has already started.
+    """
+    if start_time > after:
+        return start_time
+
+    if frequency == ScheduleFrequency.daily:
+        period = SECONDS_PER_DAY
+    elif frequency == ScheduleFrequency.weekly:
+        period = SECONDS_PER_WEEK
+    else:
+        return None
+
+    return start_time + ((after - start_time) // period + 1) * period
+
+
 class ScheduleItem:
 
     def __init__(self, 
@@ -46,6 +69,8 @@ class ScheduleItem:
                 end_time: Optional[Any] = None, ## Either Epoch UTC Secs or Python datetime
                 duration: Optional[Any] = None, ## Either Seconds or Python timedelta
                 frequency: Optional[ScheduleFrequency] = None, 
+                repeat_until: Optional[Any] = None, ## Either Epoch UTC Secs or Python datetime
+                manual: bool = False, ## Whether this is a manually edited timeslot, added with add_schedules_manual
 
             ) -> None:
 
@@ -58,6 +83,8 @@ class ScheduleItem:
 
         self.client = client
 
+        ## Items created locally get a placeholder ID until Farmo assigns one (see `has_server_id`)
+        self._generated_id = not schedule_id
         if not schedule_id:
             schedule_id = uuid.uuid4().int
             # schedule_id = int(str(uuid.uuid4().int)[:8])
@@ -70,7 +97,11 @@ class ScheduleItem:
         self.schedule_id = schedule_id # type: int
         self.start_time = start_time # type: int, epoch secs UTC
         self.end_time = end_time # type: int, epoch secs UTC
+        if duration and not end_time:
+            self.duration = duration
         self.frequency = frequency # type: ScheduleFrequency
+        self.repeat_until = time_to_epoch(repeat_until) # type: int, epoch secs UTC
+        self.manual = manual
 
         if json_data:
             self.from_json(json_data)
@@ -78,6 +109,11 @@ class ScheduleItem:
     def set_client(self, client: Client) -> None:
         self.client = client
 
+    @property
+    def has_server_id(self) -> bool:
+        """Whether `schedule_id` was assigned by Farmo, rather than generated for an item that hasn't been synced."""
+        return self.schedule_id is not None and not self._generated_id
+
     @property
     def start_time(self) -> Optional[int]:
         return self._start_time
@@ -93,7 +129,7 @@ class ScheduleItem:
     @end_time.setter
     def end_time(self, end_time: Any) -> None:
         end_time = time_to_epoch(end_time)
-        self._duration = end_time - self._start_time if self._start_time else None
+        self._duration = end_time - self._start_time if (self._start_time and end_time) else None
 
     @property
     def duration(self) -> Optional[int]:
@@ -111,10 +147,12 @@ class ScheduleItem:
     def from_json(self, json_data: dict) -> None:
         self.imei = json_data.get("imei")
         self.schedule_id = json_data.get("schedule_id")
+        self._generated_id = False
         self.start_time = json_data.get("start_time")
         self.end_time = json_data.get("end_time")
         if json_data.get("frequency"):
             self.frequency = ScheduleFrequency(json_data.get("frequency"))
+        self.repeat_until = time_to_epoch(json_data.get("repeat_until"))
 
     def to_json(self, field_filters=[]) -> dict:
         result = {
@@ -124,12 +162,91 @@ class ScheduleItem:
             "end_time": int(self.end_time) if self.end_time else None,
             "frequency": self.frequency
         }
+        if self.repeat_until:
+            result["repeat_until"] = int(self.repeat_until)
         for field in field_filters:
             result.pop(field, None)
         return result
+
+    @property
+    def period(self) -> Optional[int]:
+        if self.frequency == ScheduleFrequency.daily:
+            return SECONDS_PER_DAY
+        elif self.frequency == ScheduleFrequency.weekly:
+            return SECONDS_PER_WEEK
+        return None
+
+    def timeslots(self, horizon_start: int, horizon_end: int):
+        """Yield the (start, end) of each occurrence of this schedule which overlaps [horizon_start, horizon_end)."""
+        start, duration, period = int(self.start_time or 0), int(self.duration or 0), self.period
+        if not period:
+            if start < horizon_end and start + duration > horizon_start:
+                yield start, start + duration
+            return
+
+        limit = min(horizon_end, int(self.repeat_until)) if self.repeat_until else horizon_end
+        if start + duration <= horizon_start:
+            start += ((horizon_start - duration - start) // period + 1) * period
+        while start < limit:
+            yield start, start + duration
+            start += period
+
+    def sync_key(self, include_repeat_until: bool = True) -> tuple:
+        """A key identifying this schedule by what it does, rather than its ID.
+
+        Recurring schedules are keyed by their phase within the period rather than their start time,
+        since the same schedule is rolled forward to its next occurrence each time it is synced.
+        """
+        start = int(self.start_time or 0)
+        period = self.period
+        if period:
+            start = start % period
+        repeat_until = int(self.repeat_until) if (period and self.repeat_until and include_repeat_until) else None
+        return (start, int(self.duration or 0), str(self.frequency), repeat_until)
     
     def pretty_print(self) -> str:
         return f"Schedule ID: {self.schedule_id}, IMEI: {self.imei}, Start Time: {self.start_time}, End Time: {self.end_time}, Frequency: {self.frequency}"
+
+    @classmethod
+    def from_ui_schedule(cls, imei: str, schedule: dict, current_time: int, lead_time: int = 30) -> list["ScheduleItem"]:
+        """Convert a schedule from the `schedules` channel aggregate into the items that should exist in Farmo.
+
+        Recurring schedules that have already started are rolled forward to their next occurrence,
+        and anything that has already passed (or expired) is skipped. Manually edited schedules
+        produce one once-off item per upcoming timeslot.
+        """
+        after = current_time + lead_time
+
+        if schedule["edited"] != 0:
+            items = []
+            for timeslot in schedule["timeslots"]:
+                if timeslot["start_time"] <= after:
+                    logging.info("timeslot is in the past - skipping")
+                    continue
+                items.append(cls(
+                    imei=imei,
+                    start_time=timeslot["start_time"],
+                    end_time=timeslot["end_time"],
+                    frequency=ScheduleFrequency.once,
+                    manual=True,
+                ))
+            return items
+
+        start_time = next_start_time(schedule["start_time"], schedule["frequency"], after)
+        if start_time is None:
+            logging.info("schedule is in the past and is a once off schedule - skipping")
+            return []
+        if start_time != schedule["start_time"] and start_time >= schedule["end_time"]:
+            logging.info("schedule has expired - skipping")
+            return []
+
+        return [cls(
+            imei=imei,
+            start_time=start_time,
+            end_time=start_time + (schedule["duration"] * 3600),
+            frequency=ScheduleFrequency(schedule["frequency"]),
+            repeat_until=schedule["end_time"],
+        )]
     
     def _api_add(self) -> None:
         return self.client.add_schedules(
@@ -142,11 +259,98 @@ class ScheduleItem:
         )
 
     def _api_delete(self) -> None:
-        return self.client.delete_schedules(
-            data=self.to_json(field_filters=["start_time", "end_time", "frequency"]),
+        return self.client.delete_schedule(
+            data=self.to_json(field_filters=["start_time", "end_time", "frequency", "repeat_until"]),
         )
     
 
+class TimeslotIndex:
+    """A sorted index over concrete timeslots, for point / range queries in O(log n).
+
+    Each entry is a `(start, end, item)` tuple, where `item` is the `ScheduleItem` the timeslot came from.
+    Timeslots are kept sorted by start time. Since no timeslot is longer than the longest one in the index,
+    only those starting within `max_duration` of a query can cover it, so queries never scan the whole index.
+    """
+
+    def __init__(self, timeslots: Optional[list[tuple]] = None) -> None:
+        self._starts = []
+        self._entries = []
+        self.max_duration = 0
+
+        for start, end, item in sorted(timeslots or [], key=lambda t: t[0]):
+            self._starts.append(start)
+            self._entries.append((start, end, item))
+            self.max_duration = max(self.max_duration, end - start)
+
+    @classmethod
+    def from_schedule_items(cls, items: list[ScheduleItem], horizon_start: int, horizon_end: int) -> "TimeslotIndex":
+        return cls([(start, end, item) for item in items for start, end in item.timeslots(horizon_start, horizon_end)])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def add(self, start: int, end: int, item: Optional[ScheduleItem] = None) -> None:
+        idx = bisect.bisect_right(self._starts, start)
+        self._starts.insert(idx, start)
+        self._entries.insert(idx, (start, end, item))
+        self.max_duration = max(self.max_duration, end - start)
+
+    def overlapping(self, start: int, end: int) -> list[tuple]:
+        """Return the timeslots which overlap [start, end)."""
+        lo = bisect.bisect_right(self._starts, start - self.max_duration)
+        hi = bisect.bisect_left(self._starts, end)
+        return [entry for entry in self._entries[lo:hi] if entry[1] > start]
+
+    def at(self, time: int) -> list[tuple]:
+        """Return the timeslots which cover `time`, eg. to answer "is the pump scheduled now?"."""
+        return self.overlapping(time, time + 1)
+
+    def conflicts(self) -> list[tuple]:
+        """Return each pair of timeslots (from different schedule items) which overlap, as (earlier, later)."""
+        conflicts = []
+        for idx, (start, end, item) in enumerate(self._entries):
+            hi = bisect.bisect_left(self._starts, end, lo=idx + 1)
+            for other in self._entries[idx + 1:hi]:
+                if other[2] is not item:
+                    conflicts.append(((start, end, item), other))
+        return conflicts
+
+    @staticmethod
+    def conflict_horizon(items: list[ScheduleItem]) -> tuple[int, int]:
+        """A horizon long enough to find any conflict between `items`.
+
+        Daily and weekly schedules line up the same way every week, so once the last schedule has started
+        a week (plus the longest duration) of timeslots covers every way they can overlap.
+        """
+        if not items:
+            return 0, 0
+        starts = [int(item.start_time or 0) for item in items]
+        max_duration = max(int(item.duration or 0) for item in items)
+        return min(starts), max(starts) + SECONDS_PER_WEEK + max_duration
+
+
+class ScheduleDiff:
+    """The changes required to bring the remote (Farmo) schedules in line with the desired schedules.
+
+    There is no `to_update`: the Farmo update endpoint resets a schedule's frequency to `once`,
+    so a changed schedule is deleted and re-added instead.
+    """
+
+    def __init__(self, to_add: list[ScheduleItem], to_delete: list[ScheduleItem], unchanged: list[ScheduleItem]) -> None:
+        self.to_add = to_add
+        self.to_delete = to_delete
+        self.unchanged = unchanged
+
+    def __bool__(self) -> bool:
+        return bool(self.to_add or self.to_delete)
+
+    def pretty_print(self) -> str:
+        return f"Add: {len(self.to_add)}, Delete: {len(self.to_delete)}, Unchanged: {len(self.unchanged)}"
+
+
 class ScheduleManager:
 
     def __init__(self,
@@ -159,6 +363,7 @@ class ScheduleManager:
         self.imei = imei
 
         self.schedule_items = [] # type: List[ScheduleItem]
+        self._items_by_id = {} # type: dict[int, ScheduleItem]
 
         if json_data:
             self.from_json(json_data)
@@ -175,6 +380,13 @@ class ScheduleManager:
         if not self.imei and self.schedule_items:
             self.imei = self.schedule_items[0].imei
 
+        for item in self.schedule_items:
+            if not item.imei:
+                item.imei = self.imei
+
+        self._items_by_id = {}
+        self._index_items(self.schedule_items)
+
     def to_json(self) -> dict:
         return [item.to_json() for item in self.schedule_items]
     
@@ -184,17 +396,19 @@ class ScheduleManager:
     def pull(self) -> None:
         self.from_json(self.client.get_schedules(self.imei))
     
-    def get_schedule_item(self, id: int) -> None:
-        for item in self.schedule_items:
-            if item.schedule_id == id:
-                return item
-        return None
+    def _index_items(self, items: list[ScheduleItem]) -> None:
+        ## Only index items by an ID Farmo assigned, items added locally are found by ID after the next pull
+        self._items_by_id.update({item.schedule_id: item for item in items if item.has_server_id})
+
+    def get_schedule_item(self, id: int) -> Optional[ScheduleItem]:
+        return self._items_by_id.get(id)
     
     def add_schedule_item(self, item: ScheduleItem) -> None:
         item.set_client(self.client)
         try:
             item._api_add()
             self.schedule_items.append(item)
+            self._index_items([item])
         except Exception as e:
             logging.error(f"Failed to add schedule item: {e}")
         
@@ -221,6 +435,7 @@ class ScheduleManager:
         try:
             item._api_delete()
             self.schedule_items.remove(item)
+            self._items_by_id.pop(item.schedule_id, None)
         except Exception as e:
             logging.error(f"Failed to delete schedule item: {e}")
 
@@ -228,6 +443,88 @@ class ScheduleManager:
         while self.schedule_items:
             self.delete_schedule_item(item=self.schedule_items[0])
 
+    def get_timeslot_index(self, horizon_start: int, horizon_end: int) -> TimeslotIndex:
+        return TimeslotIndex.from_schedule_items(self.schedule_items, horizon_start, horizon_end)
+
+    def scheduled_at(self, time: int) -> list[ScheduleItem]:
+        """Return the schedule items with a timeslot covering `time`."""
+        return [item for _, _, item in self.get_timeslot_index(time, time + 1).at(time)]
+
+    def expand_timeslots(self, horizon_start: int, horizon_end: int):
+        """Expand the schedule items into concrete timeslots over [horizon_start, horizon_end) locally,
+        rather than asking Farmo with `get_timeslots`. See `farmo_client.recurrence`, this requires numpy.
+        """
+        from farmo_client.recurrence import RecurrenceSet
+        return RecurrenceSet.from_schedule_items(self.schedule_items).expand(horizon_start, horizon_end)
+
+    def diff(self, desired_items: list[ScheduleItem]) -> ScheduleDiff:
+        """Compute the minimal set of adds / deletes to turn the current schedule items into `desired_items`.
+
+        Items are matched on `ScheduleItem.sync_key` only, never on their IDs (desired items don't have one yet).
+        If Farmo doesn't report a `repeat_until` for a remote item, it is matched ignoring `repeat_until`.
+        """
+        pending = {}
+        for item in desired_items:
+            pending.setdefault(item.sync_key(), []).append(item)
+
+        to_delete = []
+        unchanged = []
+        for remote in self.schedule_items:
+            include_repeat_until = remote.repeat_until is not None
+            key = remote.sync_key(include_repeat_until)
+
+            matches = pending.get(key)
+            if not matches and not include_repeat_until:
+                # match any desired item with the same schedule, regardless of its repeat_until
+                key = next((k for k in pending if k[:3] == key[:3] and pending[k]), None)
+                matches = key and pending[key]
+
+            if matches:
+                matches.pop()
+                unchanged.append(remote)
+            else:
+                to_delete.append(remote)
+
+        to_add = [item for items in pending.values() for item in items]
+        return ScheduleDiff(to_add, to_delete, unchanged)
+
+    def apply_diff(self, diff: ScheduleDiff) -> None:
+        for item in diff.to_delete:
+            self.delete_schedule_item(item=item)
+
+        for item in diff.to_add:
+            if not item.manual:
+                self.add_schedule_item(item)
+
+        # manually edited timeslots can all be added in a single request
+        manual_items = [item for item in diff.to_add if item.manual]
+        if manual_items:
+            try:
+                self.client.add_schedules_manual({
+                    "imei": self.imei,
+                    "timeslots": [{"start_time": item.start_time, "end_time": item.end_time} for item in manual_items],
+                })
+                self.schedule_items.extend(manual_items)
+                self._index_items(manual_items)
+            except Exception as e:
+                logging.error(f"Failed to add manual schedule items: {e}")
+
+    def sync(self, desired_items: list[ScheduleItem], verify: bool = True) -> ScheduleDiff:
+        """Reconcile the remote schedules with `desired_items`, only making the API calls needed to do so.
+
+        The current schedule items should be up to date (eg. from `get_schedule` or `pull`) before calling this.
+        If `verify` is True, the schedules are re-fetched once at the end.
+        """
+        diff = self.diff(desired_items)
+        logging.info(f"Schedule diff for {self.imei}: {diff.pretty_print()}")
+
+        if diff:
+            self.apply_diff(diff)
+            if verify:
+                self.pull()
+
+        return diff
+
 
 
 
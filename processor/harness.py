@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+## Run this processor end to end offline, against in-process fakes of the Doover and Farmo APIs
+## (see `pydoover.cloud.api.fake` and `farmo_client.fake`), and report the requests made and wall time per message type.
+##
+##     python3 harness.py                                  # every message type, 20 times each
+##     python3 harness.py -t UPLINK DOWNLINK -n 100 --latency 0.05 --warm
+##     python3 harness.py -t UPLINK --burst 50 --batch-uplinks       # a pump reconnecting, with batched uplink ingest
+##     python3 harness.py -t UPLINK --importtime -n 5      # the cold-start imports of an uplink, see `importtime`
+##     python3 harness.py --record                         # regenerate the fixtures from an empty fake
+##
+## The fakes are loaded from the fixtures in `fixtures/`, which hold a deployed agent (with its channels and
+## deployment config) and its pump controller and tank sensor.
+
+import argparse
+import json
+import logging
+import os
+import time
+
+from collections import Counter
+
+from pydoover.cloud.api.cache import ChannelCache
+from pydoover.cloud.api.fake import FakeDooverAPI
+from pydoover.cloud.processor.replay import percentile
+
+from farmo_client import Client as FarmoClient
+from farmo_client import DeviceStateCache, PumpMode
+from farmo_client.fake import FakeFarmoAPI
+
+from target import target
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DOOVER_FIXTURE = os.path.join(FIXTURES_DIR, "doover.json")
+FARMO_FIXTURE = os.path.join(FIXTURES_DIR, "farmo.json")
+
+AGENT_ID = "a120447b-3b21-412a-94fb-df64c69b64ee"
+## The user (agent) sending commands from the UI
+USER_AGENT_ID = "6f1d2c3b-8a4e-4b7f-9c1d-2e3f4a5b6c7d"
+TASK_ID = "harness-task"
+
+PUMP_IMEI = "354513596466486"
+TANK_IMEI = "354513596400017"
+
+MESSAGE_TYPES = ("DEPLOY", "UPLINK", "DOWNLINK", "SCHEDULE_UPDATE")
+
+
+class Harness:
+    """Invoke the processor against fake APIs, counting the requests each invocation makes.
+
+    Parameters
+    ----------
+    doover_api: FakeDooverAPI
+    farmo_api: FakeFarmoAPI
+    warm: bool
+        Whether to share the channel and device state caches between invocations, as a warm lambda container would.
+    package_config: dict
+        Extra package config to invoke the processor with, eg. {"batch_uplinks": True}.
+    """
+
+    def __init__(self, doover_api: FakeDooverAPI, farmo_api: FakeFarmoAPI, warm: bool = False, package_config: dict = None):
+        self.doover_api = doover_api
+        self.farmo_api = farmo_api
+        self.warm = warm
+        self.package_config = package_config or {}
+
+        self.channel_cache = ChannelCache(path=None)
+        self.device_state_cache = DeviceStateCache()
+
+    @classmethod
+    def from_fixtures(cls, latency: float = 0.0, **kwargs) -> "Harness":
+        """Create a harness with fake APIs loaded from the fixtures in `fixtures/`."""
+        return cls(
+            FakeDooverAPI.from_fixture(DOOVER_FIXTURE, latency=latency),
+            FakeFarmoAPI.from_fixture(FARMO_FIXTURE, latency=latency),
+            **kwargs,
+        )
+
+    def invoke(self, message_type: str, msg_obj: dict = None) -> tuple[float, Counter, Counter]:
+        """Invoke the processor once, returning the wall time and the Doover and Farmo requests it made."""
+        channel_cache = self.channel_cache if self.warm else ChannelCache(path=None)
+
+        class HarnessTarget(target):
+            def get_channel_cache(self):
+                return channel_cache
+
+        agent = self.doover_api.agents[AGENT_ID]
+        processor = HarnessTarget(
+            agent_id=AGENT_ID,
+            access_token="fake",
+            api_endpoint=self.doover_api.base_url,
+            package_config=dict(self.package_config, message_type=message_type),
+            msg_obj=msg_obj,
+            task_id=TASK_ID,
+            log_channel=None,
+            agent_settings={"deployment_config": agent["deployment_config"]},
+        )
+        self.doover_api.install(processor.api.session)
+
+        farmo_client = FarmoClient()
+        self.farmo_api.install(farmo_client.session)
+        processor._farmo_client = farmo_client
+        processor._device_state_cache = self.device_state_cache if self.warm else DeviceStateCache()
+
+        self.doover_api.reset_counts()
+        self.farmo_api.reset_counts()
+
+        start = time.perf_counter()
+        processor.execute()
+        elapsed = time.perf_counter() - start
+
+        return elapsed, Counter(self.doover_api.request_counts), Counter(self.farmo_api.request_counts)
+
+    def _trigger(self, channel_name: str, payload: dict, agent_id: str) -> dict:
+        ## Publish a message to the fake API (as the device or a user would), and return the message that invokes the processor
+        channel_id = self.doover_api.add_channel(AGENT_ID, channel_name)
+        message = self.doover_api.publish(channel_id, payload, agent_id=agent_id)
+        return {
+            "message": message["message"],
+            "agent": message["agent"],
+            "channel": channel_id,
+            "channel_name": channel_name,
+            "timestamp": message["timestamp"],
+        }
+
+    def message_for(self, message_type: str, i: int) -> dict:
+        """Create the i'th message that invokes the processor with `message_type`."""
+        if message_type == "DEPLOY":
+            return None
+
+        if message_type == "UPLINK":
+            switch_state = i % 2
+            self.farmo_api.add_device(PUMP_IMEI, switch_state=switch_state)
+            return self._trigger("farmo_uplink_recv", {
+                "unitID": PUMP_IMEI,
+                "message": {
+                    "timestamp": int(time.time()),
+                    "farmo_device_name": "RPC-6486",
+                    "farmo_device_type": "remote_pump_control_v1",
+                    "imei": PUMP_IMEI,
+                    "switch_state": switch_state,
+                },
+            }, AGENT_ID)
+
+        if message_type == "DOWNLINK":
+            pump_mode = PumpMode.ON if i % 2 == 0 else PumpMode.OFF
+            return self._trigger("ui_cmds", {"cmds": {"pumpMode": pump_mode}}, USER_AGENT_ID)
+
+        if message_type == "SCHEDULE_UPDATE":
+            ## Alternate between two sets of schedules, so every update adds and deletes some in Farmo
+            tomorrow = (int(time.time()) // 86400 + 1) * 86400
+            schedules = [
+                {
+                    "start_time": tomorrow + (6 + 2 * j + i % 2) * 3600,
+                    "end_time": tomorrow + 30 * 86400,
+                    "duration": 1,
+                    "frequency": "daily" if j % 2 == 0 else "weekly",
+                    "edited": 0,
+                    "timeslots": [],
+                }
+                for j in range(4)
+            ]
+            return self._trigger("schedules", {"schedules": schedules}, USER_AGENT_ID)
+
+        raise ValueError(f"Unknown message type {message_type}")
+
+    def run(self, message_type: str, runs: int, burst: int = 1) -> dict:
+        """Invoke the processor `runs` times with `message_type`, returning a summary of the requests and wall time.
+
+        With `burst`, each run publishes that many messages at once and then invokes the processor for each of them
+        (as when a pump reconnects and Farmo flushes its uplinks), and the summary is per burst.
+        """
+        times = []
+        doover_requests, farmo_requests = Counter(), Counter()
+        for i in range(runs):
+            messages = [self.message_for(message_type, i * burst + j) for j in range(burst)]
+            for msg_obj in messages:
+                elapsed, doover, farmo = self.invoke(message_type, msg_obj)
+                times.append(elapsed)
+                doover_requests.update(doover)
+                farmo_requests.update(farmo)
+
+        ## Per run (ie. per burst), rather than per invocation
+        times = [sum(times[i:i + burst]) for i in range(0, len(times), burst)]
+
+        times.sort()
+        return {
+            "message_type": message_type,
+            "runs": runs,
+            "mean": sum(times) / runs,
+            "p50": percentile(times, 50),
+            "p95": percentile(times, 95),
+            "doover_requests": sum(doover_requests.values()) / runs,
+            "farmo_requests": sum(farmo_requests.values()) / runs,
+            "routes": {k: v / runs for k, v in (doover_requests + farmo_requests).most_common()},
+        }
+
+
+def record_fixtures():
+    """Deploy the processor against empty fakes, and save their state as the fixtures."""
+    doover_api = FakeDooverAPI()
+    doover_api.add_agent(AGENT_ID, deployment_config={
+        "FARMO_IMEI": PUMP_IMEI,
+        "TANK_SENSORS": [{"IMEI": TANK_IMEI, "NAME": "House Tank"}],
+    })
+    farmo_api = FakeFarmoAPI()
+    farmo_api.add_device(PUMP_IMEI, name="RPC-6486")
+    farmo_api.add_device(TANK_IMEI, name="TLS-0017", percent_full=72)
+
+    harness = Harness(doover_api, farmo_api)
+    harness.invoke("DEPLOY")
+    ## Select the tank sensor in the UI, and receive a first uplink from the pump controller
+    harness._trigger("ui_cmds", {"cmds": {"targetSensor": TANK_IMEI, "tankLevelTriggers": [30, 90]}}, USER_AGENT_ID)
+    harness.invoke("UPLINK", harness.message_for("UPLINK", 0))
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    doover_api.save_fixture(DOOVER_FIXTURE)
+    farmo_api.save_fixture(FARMO_FIXTURE)
+    print(f"Saved fixtures to {DOOVER_FIXTURE} and {FARMO_FIXTURE}")
+
+
+def print_report(results: list[dict], verbose: bool = False):
+    print(f"{'message type':<16} {'runs':>5} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'doover req':>11} {'farmo req':>10}")
+    for r in results:
+        print(
+            f"{r['message_type']:<16} {r['runs']:>5} {r['mean'] * 1000:>9.1f} {r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f}"
+            f" {r['doover_requests']:>11.1f} {r['farmo_requests']:>10.1f}"
+        )
+        if verbose:
+            for route, count in r["routes"].items():
+                print(f"    {count:>6.1f}  {route}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the processor against fake Doover and Farmo APIs.")
+    parser.add_argument("-t", "--types", nargs="+", choices=MESSAGE_TYPES, default=list(MESSAGE_TYPES))
+    parser.add_argument("-n", "--runs", type=int, default=20, help="Number of invocations per message type")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of latency added to every request")
+    parser.add_argument("--warm", action="store_true", help="Share caches between invocations, as a warm container would")
+    parser.add_argument("--burst", type=int, default=1, help="Number of messages published (and invocations) per run")
+    parser.add_argument("--batch-uplinks", action="store_true", help="Enable batched uplink ingest in the package config")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the requests made to each route")
+    parser.add_argument("--record", action="store_true", help="Regenerate the fixtures, rather than running")
+    parser.add_argument("--importtime", action="store_true", help="Report the cold-start imports of a run, rather than timing runs")
+    args = parser.parse_args()
+
+    if args.importtime:
+        ## Each in a fresh interpreter, as on a cold start (see `pydoover.cloud.processor.importtime`)
+        from pydoover.cloud.processor import importtime
+        for message_type in args.types:
+            importtime.report(
+                "target",
+                repeats=args.runs,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                setup=f"import harness; h = harness.Harness.from_fixtures(); msg_obj = h.message_for({message_type!r}, 0)",
+                run=f"h.invoke({message_type!r}, msg_obj)",
+            )
+        return
+
+    ## The processor logs at INFO (and collects those logs itself), so only print warnings and errors
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.WARNING)
+    logging.getLogger().addHandler(handler)
+
+    if args.record:
+        record_fixtures()
+        return
+
+    results = []
+    for message_type in args.types:
+        ## Each message type starts from the same (fixture) state
+        harness = Harness.from_fixtures(
+            latency=args.latency,
+            warm=args.warm,
+            package_config={"batch_uplinks": True} if args.batch_uplinks else None,
+        )
+        results.append(harness.run(message_type, args.runs, burst=args.burst))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    main()
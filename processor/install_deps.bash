@@ -1,3 +1,12 @@
 pip install ~/pydoover -t ./ --upgrade --no-dependencies
+
+## Optional dependencies, installed into the package (like pydoover) so they're deployed with it. Run with OPTIONAL_DEPS=1.
+##   aiohttp - pydoover's AsyncClient and farmo_client's AsyncFarmoClient (the processor falls back to the sync clients without it)
+##   numpy   - the vectorised helpers: farmo_client.recurrence, ChannelArchive, KalmanFilterBank, map_readings and PIDBank
+## Without them, those raise a RuntimeError saying what needs installing.
+if [ "$OPTIONAL_DEPS" = "1" ]; then
+    pip install aiohttp numpy -t ./ --upgrade
+fi
+
 find . | grep -E "(/__pycache__$|\.pyc$|\.pyo$)" | xargs rm -rf
 rm -rf ./pydoover/docker
\ No newline at end of file
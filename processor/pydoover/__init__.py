@@ -1,5 +1,21 @@
 # __all__ = ["pydoover"]
-from . import *
+import importlib
+
+# Subpackages are imported the first time they're accessed (eg. `pydoover.utils`), so a processor importing
+# `pydoover.cloud.processor` doesn't also load the CLI, docker plumbing or the kalman / pid utilities.
+_SUBMODULES = ("cli", "cloud", "ui", "utils")
+
+__all__ = list(_SUBMODULES)
+
+
+def __getattr__(name: str):
+    if name not in _SUBMODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return importlib.import_module(f".{name}", __name__)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
 
 # from .cloud.data_iface import doover_api_iface
-# from .docker import *
\ No newline at end of file
+# from .docker import *
@@ -12,9 +12,8 @@ import time
 import traceback
 import uuid
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
 from datetime import datetime, timedelta
+from functools import partial
 from getpass import getpass
 from typing import Optional
 
@@ -32,7 +31,9 @@ from . import parsers
 from .. import __version__
 from ..cloud.api import Client, Forbidden, NotFound
 from ..cloud.api.channel import Processor, Task
+from ..cloud.api.export import CSVExportReader
 from ..cloud.api.message import Message
+from ..cloud.processor.replay import ReplayEngine
 
 from .config import ConfigEntry, ConfigManager, NotSet
 from .decorators import command, annotate_arg
@@ -396,18 +397,24 @@ class CLI:
             return output
 
         if csv_file is not None:
-            messages = Message.from_csv_export(self.api, csv_file)
-            print(f"Loaded {len(messages)} messages from CSV export.")
+            ## stream the messages in timestamp order, rather than loading the whole export into memory
+            messages = CSVExportReader(csv_file, self.api)
+            total = len(messages)
+            print(f"Loaded {total} messages from CSV export.")
 
             if not parallel_processes or parallel_processes == 1:
-                for msg in messages:
-                    print(f"\nRunning task for message: {msg.id}, with timestamp: {msg.timestamp}. {messages.index(msg) + 1}/{len(messages)}\n")
+                for i, msg in enumerate(messages):
+                    print(f"\nRunning task for message: {msg.id}, with timestamp: {msg.timestamp}. {i + 1}/{total}\n")
                     run_for_single_message(msg)
+            elif dry_run:
+                print(run_for_single_message(None))
             else:
-                with ThreadPoolExecutor(max_workers=parallel_processes) as executor:
-                    futures = [executor.submit(run_for_single_message, msg, task_num=messages.index(msg), total_tasks=len(messages)) for msg in messages]
-                    for future in as_completed(futures):
-                        print(future.result())
+                ## each worker process imports the package once, and runs each agent's messages in order
+                engine = ReplayEngine.for_task(
+                    task, package_path, {"deployment_config": agent.deployment_config}, processes=parallel_processes
+                )
+                print(engine.run(messages))
+            messages.close()
 
         else:
 
@@ -544,45 +551,78 @@ class CLI:
 
         print("Read config file.")
 
-        proc_deploy_data = data.get("processor_deployments")
-        if proc_deploy_data:
-            for processor_data in proc_deploy_data.get("processors", []):
-                processor = self.api.create_processor(processor_data["name"], self.agent_id)
-                processor.update_from_package(os.path.join(parent_dir, processor_data["processor_package_dir"]))
-                processor.update()
-                print(f"Created or updated processor {processor.name} with processor data length: {len(processor.aggregate)}")
-
-            for task_data in proc_deploy_data.get("tasks", []):
-                processor = self.api.get_channel_named(task_data["processor_name"], self.agent_id)
-                task = self.api.create_task(task_data["name"], self.agent_id, processor.id)
-                task.publish(task_data["task_config"])
-                print(f"Created or updated task {task.name}, and deployed new config.")
-
-                for subscription in task_data.get("subscriptions", []):
-                    channel = self.api.create_channel(subscription["channel_name"], self.agent_id)
-                    if subscription["is_active"] is True:
-                        task.subscribe_to_channel(channel.id)
-                        print(f"Added {channel.name} as a subscription to task {task.name}.")
-                    else:
-                        task.unsubscribe_from_channel(channel.id)
-                        print(f"Removed {channel.name} as a subscription from task {task.name}.")
-
-        file_deploy_data = data.get("file_deployments")
-        if file_deploy_data:
-            for entry in file_deploy_data.get("files", []):
-                channel = self.api.create_channel(entry["name"], self.agent_id)
-                mime_type = entry.get("mime_type", None)
-                channel.update_from_file(os.path.join(parent_dir, entry["file_dir"]), mime_type)
-                print(f"Published file to {channel.name}")
-
-        for entry in data.get("deployment_channel_messages", []):
-            channel = self.api.create_channel(entry["channel_name"], self.agent_id)
-            save_log = entry.get("save_log", True)
-            channel.publish(entry["channel_message"], save_log=save_log)
-            print(f"Published message to {channel.name}")
+        proc_deploy_data = data.get("processor_deployments") or {}
+        processors = proc_deploy_data.get("processors", [])
+        tasks = proc_deploy_data.get("tasks", [])
+        files = (data.get("file_deployments") or {}).get("files", [])
+        messages = data.get("deployment_channel_messages", [])
+
+        # Deployments to different channels are independent, so they're made concurrently. Those to the same channel
+        # are made in the order they're configured, so the channel's final aggregate is the same as a serial deploy.
+        # Processors need to exist before any tasks that reference them can be created, so do those first.
+        self._gather_per_channel([(p["name"], partial(self._deploy_processor, p, parent_dir)) for p in processors])
+
+        # create every other channel once up front, so concurrent deployments never race to create the same channel.
+        channel_names = list(dict.fromkeys([
+            *[s["channel_name"] for task_data in tasks for s in task_data.get("subscriptions", [])],
+            *[entry["name"] for entry in files],
+            *[entry["channel_name"] for entry in messages],
+        ]))
+        channels = dict(zip(
+            channel_names, self.api.gather(*[partial(self.api.create_channel, name, self.agent_id) for name in channel_names])
+        ))
+
+        self._gather_per_channel([(t["name"], partial(self._deploy_task, t, channels)) for t in tasks])
+        self._gather_per_channel([
+            *[(entry["name"], partial(self._deploy_file, entry, channels[entry["name"]], parent_dir)) for entry in files],
+            *[(entry["channel_name"], partial(self._deploy_channel_message, entry, channels[entry["channel_name"]])) for entry in messages],
+        ])
 
         print("Successfully deployed config.")
 
+    def _gather_per_channel(self, calls):
+        # run (channel name, call) pairs concurrently across channels, but in order for each channel.
+        by_channel = dict()
+        for channel_name, call in calls:
+            by_channel.setdefault(channel_name, []).append(call)
+
+        def run_in_order(channel_calls):
+            for call in channel_calls:
+                call()
+
+        self.api.gather(*[partial(run_in_order, channel_calls) for channel_calls in by_channel.values()])
+
+    def _deploy_processor(self, processor_data, parent_dir):
+        processor = self.api.create_processor(processor_data["name"], self.agent_id)
+        processor.update_from_package(os.path.join(parent_dir, processor_data["processor_package_dir"]))
+        processor.update()
+        print(f"Created or updated processor {processor.name} with processor data length: {len(processor.aggregate)}")
+
+    def _deploy_task(self, task_data, channels):
+        processor = self.api.get_channel_named(task_data["processor_name"], self.agent_id)
+        task = self.api.create_task(task_data["name"], self.agent_id, processor.id)
+        task.publish(task_data["task_config"])
+        print(f"Created or updated task {task.name}, and deployed new config.")
+
+        for subscription in task_data.get("subscriptions", []):
+            channel = channels[subscription["channel_name"]]
+            if subscription["is_active"] is True:
+                task.subscribe_to_channel(channel.id)
+                print(f"Added {channel.name} as a subscription to task {task.name}.")
+            else:
+                task.unsubscribe_from_channel(channel.id)
+                print(f"Removed {channel.name} as a subscription from task {task.name}.")
+
+    def _deploy_file(self, entry, channel, parent_dir):
+        mime_type = entry.get("mime_type", None)
+        channel.update_from_file(os.path.join(parent_dir, entry["file_dir"]), mime_type)
+        print(f"Published file to {channel.name}")
+
+    def _deploy_channel_message(self, entry, channel):
+        save_log = entry.get("save_log", True)
+        channel.publish(entry["channel_message"], save_log=save_log)
+        print(f"Published message to {channel.name}")
+
     @command(description="Update doover CLI to the latest version")
     @annotate_arg("onefile", "Whether to use the one-file version of the CLI. Defaults to False.")
     def update_cli(self, onefile: parsers.BoolFlag = False):
@@ -1,5 +1,18 @@
 from .agent import Agent
+from .cache import ChannelCache
 from .channel import Channel, Processor
 from .client import Client
+from .export import CSVExportReader
 from .message import Message
 from .exceptions import Forbidden, HTTPException, NotFound
+
+
+def __getattr__(name: str):
+    # the async client pulls in aiohttp, and the archive numpy, which are slow to import and not needed by most processors
+    if name == "AsyncClient":
+        from .async_client import AsyncClient
+        return AsyncClient
+    if name == "ChannelArchive":
+        from .archive import ChannelArchive
+        return ChannelArchive
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
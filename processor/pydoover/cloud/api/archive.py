@@ -0,0 +1,388 @@
+"""A local, columnar archive of a channel's message history, for fast offline analytics.
+
+Each message's payload is flattened into columns (nested keys are joined with "."), eg. a Farmo uplink of
+
+    {"unitID": "3545...", "message": {"timestamp": 1727851754, "switch_state": 0}}
+
+becomes the columns `unitID`, `message.timestamp` and `message.switch_state`, alongside `timestamp` and `message_id`.
+Numeric and boolean fields are stored as float64 (NaN where missing), and everything else as strings.
+
+Columns are stored as NumPy `.npy` files, in append-only segments, and are read back memory-mapped,
+so a time range can be queried without loading the whole archive or creating any `Message` objects:
+
+    archive = ChannelArchive("archives/pump_1/farmo_uplink_recv")
+    archive.sync(channel, since=datetime(2024, 1, 1))  # later syncs only fetch new messages
+    data = archive.read(["message.switch_state"], since=week_start, until=week_end)
+    runtime = time_in_state(data["timestamp"], data["message.switch_state"], week_start, week_end)
+
+This requires numpy.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from .channel import Channel
+    from .message import Message
+
+
+log = logging.getLogger(__name__)
+
+# bump this whenever the layout of the archive changes, so old archives are rebuilt rather than misread
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+TIMESTAMP_COLUMN = "timestamp"
+MESSAGE_ID_COLUMN = "message_id"
+
+
+def _check_numpy():
+    if np is None:
+        raise RuntimeError("numpy must be installed to use ChannelArchive.")
+
+
+def flatten_payload(payload: Any, prefix: str = "") -> dict[str, Any]:
+    """Flatten a (nested) payload into a dict of `"a.b.c": value` leaves. Lists are kept as a single (JSON) value."""
+    if not isinstance(payload, dict):
+        return {prefix or "payload": payload}
+
+    result = dict()
+    for k, v in payload.items():
+        key = f"{prefix}.{k}" if prefix else str(k)
+        if isinstance(v, dict):
+            result.update(flatten_payload(v, key))
+        else:
+            result[key] = v
+    return result
+
+
+def _is_numeric(value: Any) -> bool:
+    return isinstance(value, (bool, int, float)) and not isinstance(value, str)
+
+
+def _to_column(values: list[Any]) -> "np.ndarray":
+    present = [v for v in values if v is not None]
+    if all(_is_numeric(v) for v in present):
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+    strings = [
+        "" if v is None else (v if isinstance(v, str) else json.dumps(v, sort_keys=True))
+        for v in values
+    ]
+    return np.array(strings, dtype=np.str_)
+
+
+def _format_number(value: float) -> str:
+    # how `_to_column` would have written a (float) numeric value to a string column
+    if np.isnan(value):
+        return ""
+    if value.is_integer():
+        return json.dumps(int(value))
+    return json.dumps(float(value))
+
+
+def _as_strings(values: "np.ndarray") -> "np.ndarray":
+    if values.dtype.kind != "f":
+        return values.astype(np.str_)
+    return np.array([_format_number(v) for v in values.tolist()], dtype=np.str_)
+
+
+def _missing(dtype: "np.dtype", length: int) -> "np.ndarray":
+    if dtype.kind == "f":
+        return np.full(length, np.nan, dtype=dtype)
+    return np.full(length, "", dtype=dtype)
+
+
+def time_in_state(timestamps, values, start: Union[datetime, float], end: Union[datetime, float]) -> float:
+    """The total number of seconds between `start` and `end` that `values` was truthy (non-zero and not NaN).
+
+    Each value is taken to hold from its timestamp until the next one, eg. the total runtime of a pump from
+    its `switch_state` history. The value before the first timestamp is unknown, so isn't counted.
+    """
+    _check_numpy()
+    start = start.timestamp() if isinstance(start, datetime) else float(start)
+    end = end.timestamp() if isinstance(end, datetime) else float(end)
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(timestamps) == 0 or end <= start:
+        return 0.0
+
+    interval_starts = np.clip(timestamps, start, end)
+    interval_ends = np.clip(np.append(timestamps[1:], end), start, end)
+    on = np.nan_to_num(values, nan=0.0) != 0
+    return float(np.sum((interval_ends - interval_starts)[on]))
+
+
+class ChannelArchive:
+    """A local columnar archive of a single channel's messages, stored as segments of `.npy` columns in `path`.
+
+    Parameters
+    ----------
+    path: str
+        Directory to store the archive in. It is created if it doesn't exist.
+    segment_size: int
+        Maximum number of messages in each segment written by `sync` / `append_messages`.
+    """
+
+    def __init__(self, path: str, segment_size: int = 50_000):
+        _check_numpy()
+        self.path = path
+        self.segment_size = segment_size
+
+        self._lock = threading.Lock()
+        self._manifest = self._load_manifest()
+
+    def _empty_manifest(self) -> dict[str, Any]:
+        return {
+            "version": ARCHIVE_VERSION,
+            "segments": [],
+            "next_segment": 0,
+            "last_timestamp": None,
+            "last_message_ids": [],
+        }
+
+    def _load_manifest(self) -> dict[str, Any]:
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return self._empty_manifest()
+
+        try:
+            with open(manifest_path, "r") as fp:
+                manifest = json.load(fp)
+        except (OSError, ValueError) as e:
+            log.info(f"Failed to read archive manifest at {manifest_path}, starting a new archive: {e}")
+            return self._empty_manifest()
+
+        if manifest.get("version") != ARCHIVE_VERSION:
+            log.info(f"Ignoring archive at {self.path} from a different version.")
+            return self._empty_manifest()
+        return manifest
+
+    def _save_manifest(self):
+        # write to a temp file and rename, so a reader never sees a manifest referencing a half-written segment
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(self._manifest, fp)
+        os.replace(tmp_path, manifest_path)
+
+    def __len__(self):
+        return sum(s["count"] for s in self._manifest["segments"])
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """Timestamp of the most recent archived message, or None if the archive is empty."""
+        return self._manifest["last_timestamp"]
+
+    @property
+    def columns(self) -> list[str]:
+        """The names of every column in the archive."""
+        names = {TIMESTAMP_COLUMN: None, MESSAGE_ID_COLUMN: None}
+        for segment in self._manifest["segments"]:
+            names.update(dict.fromkeys(segment["columns"]))
+        return list(names)
+
+    def _write_segment(self, rows: list[tuple[str, float, Any]]):
+        rows.sort(key=lambda r: r[1])
+        flat = [flatten_payload(payload) if payload is not None else {} for _, _, payload in rows]
+
+        columns = {
+            TIMESTAMP_COLUMN: np.array([r[1] for r in rows], dtype=np.float64),
+            MESSAGE_ID_COLUMN: np.array([r[0] or "" for r in rows], dtype=np.str_),
+        }
+        keys = dict.fromkeys(k for f in flat for k in f)
+        for key in keys:
+            if key in columns:
+                # don't let payload fields shadow the message's own columns
+                continue
+            columns[key] = _to_column([f.get(key) for f in flat])
+
+        self._write_columns(columns)
+
+    def _write_columns(self, columns: dict[str, "np.ndarray"]):
+        # segment names are never reused, so a segment that is being read is never overwritten
+        name = f"segment_{self._manifest.get('next_segment', 0):06d}"
+        segment_dir = os.path.join(self.path, name)
+        tmp_dir = f"{segment_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        files = dict()
+        for i, (column, values) in enumerate(columns.items()):
+            # column names come from payload keys, so don't use them as file names
+            files[column] = f"{i}.npy"
+            np.save(os.path.join(tmp_dir, files[column]), values, allow_pickle=False)
+
+        if os.path.exists(segment_dir):
+            shutil.rmtree(segment_dir)
+        os.replace(tmp_dir, segment_dir)
+
+        timestamps = columns[TIMESTAMP_COLUMN]
+        self._manifest["next_segment"] = self._manifest.get("next_segment", 0) + 1
+        self._manifest["segments"].append({
+            "name": name,
+            "count": len(timestamps),
+            "start": float(timestamps[0]),
+            "end": float(timestamps[-1]),
+            "columns": files,
+        })
+
+    def append_messages(self, messages: Iterable["Message"]) -> int:
+        """Append messages (eg. from `Channel.iter_messages`), oldest first, to the archive, returning the number added.
+
+        Messages older than the most recent archived message, or already archived, are skipped.
+        """
+        with self._lock:
+            last_timestamp = self._manifest["last_timestamp"]
+            last_ids = set(self._manifest["last_message_ids"])
+
+            added = 0
+            rows = []
+            for message in messages:
+                timestamp = message.timestamp
+                if timestamp is None:
+                    continue
+                if last_timestamp is not None and (
+                    timestamp < last_timestamp or (timestamp == last_timestamp and message.id in last_ids)
+                ):
+                    continue
+
+                rows.append((message.id, float(timestamp), message.cached_payload))
+                if last_timestamp is None or timestamp > last_timestamp:
+                    last_timestamp, last_ids = timestamp, set()
+                last_ids.add(message.id)
+
+                if len(rows) >= self.segment_size:
+                    os.makedirs(self.path, exist_ok=True)
+                    self._write_segment(rows)
+                    added += len(rows)
+                    rows = []
+
+            if rows:
+                os.makedirs(self.path, exist_ok=True)
+                self._write_segment(rows)
+                added += len(rows)
+
+            if added:
+                self._manifest["last_timestamp"] = last_timestamp
+                self._manifest["last_message_ids"] = sorted(last_ids)
+                self._save_manifest()
+
+        return added
+
+    def sync(
+        self,
+        channel: "Channel",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        page_size: int = 100,
+        list_size: int = 100,
+    ) -> int:
+        """Fetch any messages published to `channel` since the last sync, returning the number added.
+
+        `since` is only used when the archive is empty, after that the archive resumes from its last message.
+        """
+        if self.last_timestamp is not None:
+            since = datetime.fromtimestamp(self.last_timestamp, tz=timezone.utc)
+        elif since is None:
+            raise ValueError("since is required for the first sync of an archive.")
+
+        return self.append_messages(channel.iter_messages(since=since, until=until, page_size=page_size, list_size=list_size))
+
+    def _load_column(self, segment: dict[str, Any], column: str) -> Optional["np.ndarray"]:
+        file_name = segment["columns"].get(column)
+        if file_name is None:
+            return None
+        return np.load(os.path.join(self.path, segment["name"], file_name), mmap_mode="r", allow_pickle=False)
+
+    def read(
+        self,
+        columns: Optional[list[str]] = None,
+        since: Optional[Union[datetime, float]] = None,
+        until: Optional[Union[datetime, float]] = None,
+    ) -> dict[str, "np.ndarray"]:
+        """Read columns for the messages between `since` and `until` (inclusive), in timestamp order.
+
+        The timestamp column is always included. Segments outside the range aren't read at all, and
+        a range within a single segment is returned as views of the memory-mapped column files.
+
+        Parameters
+        ----------
+        columns: list[str]
+            The columns to read, defaults to every column. Columns missing from a segment are NaN (or "") there.
+        since, until: datetime or float
+            The range of message timestamps to read, defaults to the whole archive.
+        """
+        since = since.timestamp() if isinstance(since, datetime) else since
+        until = until.timestamp() if isinstance(until, datetime) else until
+
+        if columns is None:
+            columns = self.columns
+        columns = [TIMESTAMP_COLUMN] + [c for c in columns if c != TIMESTAMP_COLUMN]
+
+        parts = {c: [] for c in columns}
+        dtypes = dict()
+        for segment in self._manifest["segments"]:
+            if (since is not None and segment["end"] < since) or (until is not None and segment["start"] > until):
+                continue
+
+            timestamps = self._load_column(segment, TIMESTAMP_COLUMN)
+            lo = 0 if since is None else int(np.searchsorted(timestamps, since, side="left"))
+            hi = len(timestamps) if until is None else int(np.searchsorted(timestamps, until, side="right"))
+            if lo >= hi:
+                continue
+
+            for column in columns:
+                values = self._load_column(segment, column)
+                if values is not None:
+                    values = values[lo:hi]
+                    # a column is numeric only if it's numeric in every segment
+                    if dtypes.get(column, values.dtype).kind == "f":
+                        dtypes[column] = values.dtype
+                parts[column].append((values, hi - lo))
+
+        result = dict()
+        for column, column_parts in parts.items():
+            dtype = dtypes.get(column, np.dtype(np.float64))
+            arrays = [values if values is not None else _missing(dtype, length) for values, length in column_parts]
+            if not arrays:
+                result[column] = np.empty(0, dtype=dtype)
+            elif len(arrays) == 1:
+                result[column] = arrays[0]
+            else:
+                if dtype.kind != "f":
+                    # string columns may have a different width in each segment, and may be numeric in some of them
+                    arrays = [_as_strings(a) for a in arrays]
+                result[column] = np.concatenate(arrays)
+        return result
+
+    def compact(self):
+        """Rewrite the archive as (as few as possible) full segments, eg. after many small incremental syncs."""
+        with self._lock:
+            old_segments = self._manifest["segments"]
+            if len(old_segments) <= 1:
+                return
+
+            data = self.read()
+            self._manifest["segments"] = []
+            try:
+                for i in range(0, len(data[TIMESTAMP_COLUMN]), self.segment_size):
+                    self._write_columns({c: np.asarray(values[i:i + self.segment_size]) for c, values in data.items()})
+            except Exception:
+                self._manifest["segments"] = old_segments
+                raise
+
+            self._save_manifest()
+            for segment in old_segments:
+                shutil.rmtree(os.path.join(self.path, segment["name"]), ignore_errors=True)
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .agent import Agent
+from .cache import ChannelCache
+from .channel import Channel, Processor, Task
+from .client import AccessToken, Route, T, _history_range, _listing_reaches, _messages_in_range
+from .exceptions import NotFound, Forbidden, HTTPException
+from .message import Message
+
+
+log = logging.getLogger(__name__)
+
+
+class AsyncClient:
+    """An asyncio counterpart to `Client` for the Doover channel API.
+
+    This mirrors the channel, message and subscription methods of `Client`, but every request is a coroutine,
+    so many agents / channels can be fetched concurrently from a single thread, eg.
+
+        async with AsyncClient(token=token) as client:
+            channels = await asyncio.gather(*[client.get_channel_named("ui_state", a) for a in agent_ids])
+
+    Channels and messages returned by this client should use their `*_async` methods (eg. `fetch_aggregate_async`)
+    rather than their synchronous counterparts.
+
+    Only token authentication is supported, since username / password login can require interactive 2FA.
+    This requires `aiohttp` to be installed.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        token_expires: datetime = None,
+        base_url: str = "https://my.doover.dev",
+        agent_id: str = None,
+        verify: bool = True,
+        channel_cache: Optional[ChannelCache] = None,
+        max_concurrent_requests: int = 32,
+    ):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp must be installed to use AsyncClient.")
+        if not token:
+            raise RuntimeError("Must have access token set.")
+
+        self.access_token = AccessToken(token, token_expires)
+        self.agent_id = agent_id
+        self.channel_cache = channel_cache
+
+        self.verify = verify
+        self.base_url = base_url
+
+        self.request_retries = 1
+        self.request_timeout = 25
+        self.max_concurrent_requests = max_concurrent_requests
+
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            # the connector limit bounds concurrency and keeps connections alive between requests
+            connector = aiohttp.TCPConnector(limit=self.max_concurrent_requests, ssl=True if self.verify else False)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Authorization": f"Token {self.access_token.token}"},
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def request(self, route: Route, **kwargs):
+        if self.access_token.expires_at and self.access_token.expires_at < datetime.utcnow():
+            raise RuntimeError("Access token has expired.")
+
+        session = self._get_session()
+        url = self.base_url + route.url
+
+        attempt_counter = 0
+        retries = self.request_retries if route.method == "GET" else 0
+
+        while attempt_counter <= retries:
+            attempt_counter += 1
+
+            log.debug(f"Making {route.method} request to {url} with kwargs {kwargs}")
+
+            try:
+                async with session.request(route.method, url, **kwargs) as resp:
+                    status = resp.status
+                    text = await resp.text()
+            except asyncio.TimeoutError:
+                log.info(f"Request to {url} timed out.")
+                if attempt_counter > retries:
+                    raise HTTPException(f"Request timed out. {url}")
+                continue
+
+            if status == 200:
+                break
+            elif status == 403:
+                raise Forbidden(f"Access denied. {url}")
+            elif status == 404:
+                raise NotFound(f"Resource not found. {url}")
+            else:
+                log.info(f"Failed to make request to {url}. Status code: {status}, message: {text}")
+                if attempt_counter > retries:
+                    raise HTTPException(text)
+
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = text
+
+        log.debug(f"{url} has received {data}")
+        return data
+
+    async def _get_agent_raw(self, agent_id: str) -> dict[str, Any]:
+        return await self.request(Route("GET", "/ch/v1/agent/{}/", agent_id))
+
+    async def get_agent(self, agent_id: str) -> Optional[Agent]:
+        data = await self._get_agent_raw(agent_id)
+        if data and self.channel_cache is not None:
+            self.channel_cache.set_many(agent_id, {c["name"]: c["channel"] for c in data.get("channels", [])})
+        return data and Agent(client=self, data=data)
+
+    def _parse_channel(self, data) -> T:
+        if data["name"].startswith("!"):
+            return Task(client=self, data=data)
+        elif data["name"].startswith("#"):
+            return Processor(client=self, data=data)
+        else:
+            return Channel(client=self, data=data)
+
+    async def _get_channel_raw(self, channel_id: str) -> dict[str, Any]:
+        return await self.request(Route("GET", "/ch/v1/channel/{}/", channel_id))
+
+    async def get_channel(self, channel_id: str) -> Optional[T]:
+        data = await self._get_channel_raw(channel_id)
+        return data and self._parse_channel(data)
+
+    async def _get_channel_named_raw(self, channel_name: str, agent_id: str) -> dict[str, Any]:
+        return await self.request(Route("GET", "/ch/v1/agent/{}/{}/", agent_id, channel_name))
+
+    async def get_channel_named(self, channel_name: str, agent_id: str) -> Optional[T]:
+        data = await self._get_channel_named_raw(channel_name, agent_id)
+        if data and self.channel_cache is not None:
+            self.channel_cache.set(agent_id, channel_name, data["channel"])
+        return data and self._parse_channel(data)
+
+    async def resolve_channel_named(self, channel_name: str, agent_id: str) -> Optional[T]:
+        if self.channel_cache is not None:
+            data = self.channel_cache.get(agent_id, channel_name)
+            if data is not None:
+                return self._parse_channel(data)
+
+        return await self.get_channel_named(channel_name, agent_id)
+
+    async def get_channel_messages(self, channel_id: str, num_messages: Optional[int] = None) -> list[Message]:
+        if num_messages:
+            data = await self.request(Route("GET", "/ch/v1/channel/{}/messages/{}/", channel_id, str(num_messages)))
+        else:
+            data = await self.request(Route("GET", "/ch/v1/channel/{}/messages/", channel_id))
+
+        if not data:
+            return []
+
+        return [Message(client=self, data=m, channel_id=channel_id) for m in data["messages"]]
+
+    async def _get_message_raw(self, channel_id: str, message_id: str) -> dict[str, Any]:
+        return await self.request(Route("GET", "/ch/v1/channel/{}/message/{}", channel_id, message_id))
+
+    async def get_message(self, channel_id: str, message_id: str) -> Optional[Message]:
+        data = await self._get_message_raw(channel_id, message_id)
+        return data and Message(client=self, data=data, channel_id=channel_id)
+
+    async def fetch_payloads(self, messages: list[Message]) -> list[Message]:
+        """See `Client.fetch_payloads`."""
+        to_fetch = [m for m in messages if m.cached_payload is None]
+        results = await asyncio.gather(
+            *[self._get_message_raw(m.channel_id, m.id) for m in to_fetch], return_exceptions=True
+        )
+
+        for message, data in zip(to_fetch, results):
+            if isinstance(data, Exception):
+                log.info(f"Failed to fetch payload of message {message.id}: {data}")
+            elif data:
+                message._payload = json.loads(data["payload"])
+        return messages
+
+    async def list_channel_messages_since(self, channel_id: str, since: float, list_size: int = 100) -> list[Message]:
+        """See `Client.list_channel_messages_since`."""
+        num_messages = list_size
+        while True:
+            messages = await self.get_channel_messages(channel_id, num_messages)
+            if _listing_reaches(messages, num_messages, since):
+                return messages
+            num_messages *= 2
+
+    async def iter_channel_messages(
+        self,
+        channel_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        page_size: int = 100,
+        list_size: int = 100,
+        fetch_payloads: bool = True,
+    ) -> AsyncIterator[Message]:
+        """See `Client.iter_channel_messages`. The whole range is listed up front, only payloads are fetched lazily."""
+        start, end = _history_range(since, until)
+        listed = await self.list_channel_messages_since(channel_id, start, list_size)
+        messages = _messages_in_range(listed, start, end)
+
+        for i in range(0, len(messages), page_size):
+            page = messages[i:i + page_size]
+            if fetch_payloads:
+                await self.fetch_payloads(page)
+            for message in page:
+                yield message
+
+    async def create_channel(self, channel_name: str, agent_id: str) -> T:
+        try:
+            return await self.resolve_channel_named(channel_name, agent_id)
+        except NotFound:
+            pass
+        # see `Client.create_channel` - publishing to a non-existent channel creates it.
+        await self.request(Route("POST", "/ch/v1/agent/{}/{}/", agent_id, channel_name))
+        return await self.get_channel_named(channel_name, agent_id)
+
+    async def _maybe_subscribe_to_channel(self, channel_id: str, task_id: str, subscribe: bool):
+        data = {"channel_id": channel_id, "subscribe": subscribe}
+        return await self.request(Route("POST", "/ch/v1/channel/{}/subscribe/", task_id), json=data)
+
+    async def subscribe_to_channel(self, channel_id: str, task_id: str) -> bool:
+        return await self._maybe_subscribe_to_channel(channel_id, task_id, True)
+
+    async def unsubscribe_from_channel(self, channel_id: str, task_id: str) -> bool:
+        return await self._maybe_subscribe_to_channel(channel_id, task_id, False)
+
+    @staticmethod
+    def _get_publish_data(data: Any, save_log: bool, log_aggregate: bool, override_aggregate: bool, timestamp: Optional[datetime]):
+        post_data = {"msg": data, "record_log": save_log}
+        if log_aggregate:
+            post_data["log_aggregate"] = True
+        if override_aggregate:
+            post_data["override_aggregate"] = True
+        if timestamp:
+            post_data["timestamp"] = int(timestamp.timestamp())
+        return post_data
+
+    async def publish_to_channel(self, channel_id: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
+        post_data = self._get_publish_data(data, save_log, log_aggregate, override_aggregate, timestamp)
+        return await self.request(Route("POST", "/ch/v1/channel/{}/", channel_id), json=post_data)
+
+    async def publish_to_channel_name(self, agent_id: str, channel_name: str, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
+        post_data = self._get_publish_data(data, save_log, log_aggregate, override_aggregate, timestamp)
+        return await self.request(Route("POST", "/ch/v1/agent/{}/{}/", agent_id, channel_name), json=post_data)
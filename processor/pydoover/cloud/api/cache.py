@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from typing import Optional
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "pydoover_channel_cache.json")
+
+
+class ChannelCache:
+    """A (agent_id, channel_name) -> channel_id resolution cache.
+
+    Channel IDs effectively never change once a channel has been created, so resolving them by name on every
+    processor invocation is wasted round-trips. Entries are persisted to a local JSON file so that warm lambda
+    containers (which share `/tmp`) can skip the lookups entirely.
+
+    Parameters
+    ----------
+    path: Optional[str]
+        File to persist entries to. If None, the cache is in-memory only.
+    ttl: int
+        Number of seconds an entry is considered valid for.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, ttl: int = 60 * 60 * 24):
+        self.path = path
+        self.ttl = ttl
+
+        self._entries: dict[str, dict] = dict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def _key(agent_id: str, channel_name: str) -> str:
+        return f"{agent_id}/{channel_name}"
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if self.path is None or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as e:
+            log.info(f"Failed to read channel cache at {self.path}, ignoring: {e}")
+            return
+
+        if isinstance(data, dict):
+            self._entries.update(data)
+
+    def _save(self):
+        if self.path is None:
+            return
+
+        # write to a temp file and rename so concurrent invocations never read a half-written cache.
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(self._entries, fp)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.info(f"Failed to write channel cache to {self.path}: {e}")
+
+    def get(self, agent_id: str, channel_name: str) -> Optional[dict]:
+        """Get the cached channel data (`channel`, `name`, `agent`) for a channel name, or None if not cached."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self._key(agent_id, channel_name))
+
+        if entry is None:
+            return None
+        if time.time() - entry["cached_at"] > self.ttl:
+            return None
+
+        return {"channel": entry["channel"], "name": channel_name, "agent": agent_id}
+
+    def set(self, agent_id: str, channel_name: str, channel_id: str):
+        self.set_many(agent_id, {channel_name: channel_id})
+
+    def set_many(self, agent_id: str, channels: dict[str, str]):
+        """Cache several channel name -> ID resolutions for an agent, writing the file (at most) once."""
+        with self._lock:
+            self._load()
+            now = time.time()
+            changed = False
+            for channel_name, channel_id in channels.items():
+                key = self._key(agent_id, channel_name)
+                existing = self._entries.get(key)
+                if existing and existing["channel"] == channel_id and now - existing["cached_at"] < self.ttl / 2:
+                    # don't rewrite the file on every lookup
+                    continue
+
+                self._entries[key] = {"channel": channel_id, "cached_at": now}
+                changed = True
+
+            if changed:
+                self._save()
+
+    def invalidate(self, agent_id: str, channel_name: str):
+        with self._lock:
+            self._load()
+            if self._entries.pop(self._key(agent_id, channel_name), None) is not None:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._save()
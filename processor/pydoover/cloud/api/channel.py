@@ -9,10 +9,11 @@ import importlib
 import pathlib
 from datetime import datetime
 
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional
 
 if TYPE_CHECKING:
     from .client import Client
+    from .message import Message
 
 
 class Channel:
@@ -21,6 +22,8 @@ class Channel:
         self.client: "Client" = client
         self._aggregate = None
         self._messages = None
+        # the number of messages requested by the fetch that cached `_messages` (None for all of them)
+        self._messages_num = None
 
         self._from_data(data)
 
@@ -47,6 +50,10 @@ class Channel:
         res = self.client._get_channel_raw(self.id)
         self._from_data(res)
 
+    async def update_async(self):
+        res = await self.client._get_channel_raw(self.id)
+        self._from_data(res)
+
     def get_tunnel_url(self, address):
         if self.name != "tunnels":
             raise RuntimeError("Tunnels are only valid in the `tunnels` channel.")
@@ -68,6 +75,13 @@ class Channel:
         self._agent = self.client.get_agent(self.agent_id)
         return self._agent
 
+    async def fetch_agent_async(self):
+        if self._agent is not None:
+            return self._agent
+
+        self._agent = await self.client.get_agent(self.agent_id)
+        return self._agent
+
     def fetch_aggregate(self):
         if self._aggregate is not None:
             return self._aggregate
@@ -75,16 +89,89 @@ class Channel:
         self.update()
         return self._aggregate
 
+    async def fetch_aggregate_async(self):
+        if self._aggregate is not None:
+            return self._aggregate
+
+        await self.update_async()
+        return self._aggregate
+
+    def _get_cached_messages(self, num_messages: Optional[int]):
+        # the cached messages (most recent first) can answer any request for as many, or fewer, messages.
+        # if the fetch that cached them got fewer than it asked for (or asked for all), they're the whole channel
+        # and can answer any request.
+        if self._messages is None:
+            return None
+        complete = not self._messages_num or len(self._messages) < self._messages_num
+        if complete:
+            return self._messages[:num_messages] if num_messages else self._messages
+        if num_messages and len(self._messages) >= num_messages:
+            return self._messages[:num_messages]
+        return None
+
+    def _set_cached_messages(self, messages, num_messages: Optional[int]):
+        self._messages = messages
+        self._messages_num = num_messages
+
     def fetch_messages(self, num_messages: int = 10):
-        if self._messages is not None:
-            return self._messages
+        cached = self._get_cached_messages(num_messages)
+        if cached is not None:
+            return cached
 
-        self._messages = self.client.get_channel_messages(self.id, num_messages=num_messages)
+        self._set_cached_messages(self.client.get_channel_messages(self.id, num_messages=num_messages), num_messages)
         return self._messages
 
+    async def fetch_messages_async(self, num_messages: int = 10):
+        cached = self._get_cached_messages(num_messages)
+        if cached is not None:
+            return cached
+
+        self._set_cached_messages(await self.client.get_channel_messages(self.id, num_messages=num_messages), num_messages)
+        return self._messages
+
+    def iter_messages(
+        self,
+        since: datetime,
+        until: Optional[datetime] = None,
+        page_size: int = 100,
+        list_size: int = 100,
+        fetch_payloads: bool = True,
+    ) -> Iterator["Message"]:
+        """Iterate through this channel's message history, oldest first, with payloads fetched in bulk.
+
+        eg. `for message in channel.iter_messages(since=datetime.now(timezone.utc) - timedelta(weeks=2)): ...`
+
+        See `Client.iter_channel_messages` for a description of the parameters.
+        """
+        return self.client.iter_channel_messages(
+            self.id, since, until, page_size=page_size, list_size=list_size, fetch_payloads=fetch_payloads
+        )
+
+    def iter_messages_async(
+        self,
+        since: datetime,
+        until: Optional[datetime] = None,
+        page_size: int = 100,
+        list_size: int = 100,
+        fetch_payloads: bool = True,
+    ) -> AsyncIterator["Message"]:
+        """The same as `iter_messages`, for use with `async for`."""
+        return self.client.iter_channel_messages(
+            self.id, since, until, page_size=page_size, list_size=list_size, fetch_payloads=fetch_payloads
+        )
+
     def publish(self, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
         return self.client.publish_to_channel(self.id, data, save_log, log_aggregate, override_aggregate, timestamp)
 
+    async def publish_async(self, data: Any, save_log: bool = True, log_aggregate: bool = False, override_aggregate: bool = False, timestamp: Optional[datetime] = None):
+        return await self.client.publish_to_channel(self.id, data, save_log, log_aggregate, override_aggregate, timestamp)
+
+    async def fetch_last_message_async(self):
+        messages = await self.fetch_messages_async(num_messages=1)
+        if messages is None or len(messages) == 0:
+            return None
+        return messages[0]
+
     @property
     def last_message(self):
         messages = self.fetch_messages(num_messages=1)
@@ -141,15 +228,10 @@ class Processor(Channel):
         ):
         
         logging.basicConfig(level=logging.DEBUG)
-        sys.path.append(package_dir)
-
-        ## import the loaded generator file
-        spec = importlib.util.spec_from_file_location("target", "target.py")
-        target_task = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(target_task)
 
-        # from .target import generator
-        target_task = getattr(target_task, 'target')
+        ## import the loaded generator file from the package (see `ReplayEngine` to invoke many messages)
+        from ..processor.replay import load_target
+        target_task = load_target(package_dir)
 
         #     'agent_id' : The Doover agent id invoking the task e.g. '9843b273-6580-4520-bdb0-0afb7bfec049'
         #     'access_token' : A temporary token that can be used to interact with the Doover API .e.g 'ABCDEFGHJKLMNOPQRSTUVWXYZ123456890',
@@ -191,12 +273,27 @@ class Task(Channel):
         self._processor = self.client.get_channel(self.processor_id)
         return self._processor
 
+    async def fetch_processor_async(self) -> Optional[Processor]:
+        if self._processor is not None:
+            return self._processor
+        if self.processor_id is None:
+            return
+
+        self._processor = await self.client.get_channel(self.processor_id)
+        return self._processor
+
     def subscribe_to_channel(self, channel_id: str):
         return self.client.subscribe_to_channel(channel_id, self.id)
 
+    async def subscribe_to_channel_async(self, channel_id: str):
+        return await self.client.subscribe_to_channel(channel_id, self.id)
+
     def unsubscribe_from_channel(self, channel_id: str):
         return self.client.unsubscribe_from_channel(channel_id, self.id)
 
+    async def unsubscribe_from_channel_async(self, channel_id: str):
+        return await self.client.unsubscribe_from_channel(channel_id, self.id)
+
     def invoke_locally(self, package_dir, msg_obj, agent_settings):
         processor = self.fetch_processor()
         if processor is None:
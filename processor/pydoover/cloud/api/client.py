@@ -1,14 +1,20 @@
+import json
 import logging
 
 from collections import namedtuple
-from datetime import datetime, timedelta
-from typing import Any, Union, Callable, overload, Literal, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Any, Union, Callable, Iterator, overload, Literal, Optional, TypeVar
 from urllib.parse import quote, urlencode
 
 import requests
 
+from requests.adapters import HTTPAdapter
+
 from .message import Message
 from .agent import Agent
+from .cache import ChannelCache
 from .channel import Channel, Processor, Task
 from .exceptions import NotFound, Forbidden, HTTPException
 
@@ -18,6 +24,27 @@ AccessToken = namedtuple("AccessToken", ["token", "expires_at"], defaults=(None,
 T = TypeVar("T", bound=Channel)
 
 
+def _history_range(since: datetime, until: Optional[datetime]) -> tuple[float, float]:
+    """Convert a message history range to epoch timestamps, where `until` defaults to now."""
+    return since.timestamp(), (until or datetime.now(timezone.utc)).timestamp()
+
+
+def _listing_reaches(messages: list[Message], num_messages: int, since: float) -> bool:
+    # whether a listing of the last `num_messages` messages has everything since `since`, ie. it holds the whole
+    # channel (fewer messages than asked for), or its oldest message is from before `since`
+    if len(messages) < num_messages:
+        return True
+    oldest = min((m.timestamp for m in messages if m.timestamp is not None), default=None)
+    return oldest is not None and oldest < since
+
+
+def _messages_in_range(messages: list[Message], since: float, until: float) -> list[Message]:
+    # listings are newest first, so sort the messages in [since, until] oldest first
+    result = [m for m in messages if m.timestamp is not None and since <= m.timestamp <= until]
+    result.sort(key=lambda m: m.timestamp)
+    return result
+
+
 class Route:
     def __init__(self, method, route, *args, **kwargs):
         self.method = method
@@ -42,10 +69,13 @@ class Client:
         agent_id: str = None,
         verify: bool = True,
         login_callback: Callable = None,
+        channel_cache: Optional[ChannelCache] = None,
+        max_concurrent_requests: int = 8,
     ):
         self.access_token = AccessToken(token, token_expires)
         self.agent_id = agent_id
         self.login_callback = login_callback
+        self.channel_cache = channel_cache
 
         self.username = username
         self.password = password
@@ -54,6 +84,13 @@ class Client:
         self.base_url = base_url
         self.session = requests.Session()
 
+        # size the connection pool to match the number of requests `gather` will make at once,
+        # otherwise concurrent requests would have to open (and then discard) their own connections.
+        self.max_concurrent_requests = max_concurrent_requests
+        adapter = HTTPAdapter(pool_connections=max_concurrent_requests, pool_maxsize=max_concurrent_requests)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
         self.request_retries = 1
         self.request_timeout = 25
 
@@ -110,6 +147,59 @@ class Client:
         log.debug(f"{url} has received {data}")
         return data
 
+    def gather(self, *calls: Callable[[], Any], return_exceptions: bool = False) -> list[Any]:
+        """Run independent calls concurrently, returning their results in the order they were passed.
+
+        Each call should be a callable taking no arguments, eg. `functools.partial(client.get_channel, channel_id)`.
+
+        Parameters
+        ----------
+        *calls: Callable
+            The calls to make.
+        return_exceptions: bool
+            If True, an exception raised by a call is put in its place in the results.
+            Otherwise, the first exception (in call order) is raised once all calls have finished.
+        """
+        if not calls:
+            return []
+
+        if len(calls) == 1:
+            outcomes = [self._run_call(calls[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(calls), self.max_concurrent_requests)) as executor:
+                futures = [executor.submit(self._run_call, call) for call in calls]
+            outcomes = [f.result() for f in futures]
+
+        results = []
+        for result, exc in outcomes:
+            if exc is not None and not return_exceptions:
+                raise exc
+            results.append(exc if exc is not None else result)
+
+        return results
+
+    @staticmethod
+    def _run_call(call: Callable[[], Any]):
+        try:
+            return call(), None
+        except Exception as e:
+            return None, e
+
+    def map_requests(
+        self, routes: list[Union[Route, tuple[Route, dict[str, Any]]]], return_exceptions: bool = False
+    ) -> list[Any]:
+        """Make independent requests concurrently, returning their responses in order.
+
+        Each entry is either a `Route`, or a tuple of `(Route, kwargs)` where kwargs are passed to `request`.
+        See `gather` for a description of `return_exceptions`.
+        """
+        calls = []
+        for entry in routes:
+            route, kwargs = entry if isinstance(entry, tuple) else (entry, {})
+            calls.append(partial(self.request, route, **kwargs))
+
+        return self.gather(*calls, return_exceptions=return_exceptions)
+
     def _get_agent_raw(self, agent_id: str) -> dict[str, Any]:
         return self.request(Route("GET", "/ch/v1/agent/{}/", agent_id))
 
@@ -118,6 +208,8 @@ class Client:
 
     def get_agent(self, agent_id: str) -> Optional[Agent]:
         data = self._get_agent_raw(agent_id)
+        if data and self.channel_cache is not None:
+            self.channel_cache.set_many(agent_id, {c["name"]: c["channel"] for c in data.get("channels", [])})
         return data and Agent(client=self, data=data)
 
     def get_agent_list(self) -> list[Agent]:
@@ -146,8 +238,23 @@ class Client:
 
     def get_channel_named(self, channel_name: str, agent_id: str) -> Optional[T]:
         data = self._get_channel_named_raw(channel_name, agent_id)
+        if data and self.channel_cache is not None:
+            self.channel_cache.set(agent_id, channel_name, data["channel"])
         return data and self._parse_channel(data)
 
+    def resolve_channel_named(self, channel_name: str, agent_id: str) -> Optional[T]:
+        """Get a channel by name, using the channel cache (if set) to avoid a round-trip.
+
+        Channels resolved from the cache only have their ID and name populated,
+        use `Channel.fetch_aggregate()` or `Channel.update()` to fetch the rest.
+        """
+        if self.channel_cache is not None:
+            data = self.channel_cache.get(agent_id, channel_name)
+            if data is not None:
+                return self._parse_channel(data)
+
+        return self.get_channel_named(channel_name, agent_id)
+
     def get_channel_messages(self, channel_id: str, num_messages: Optional[int] = None) -> list[Message]:
         if num_messages:
             data = self.request(Route("GET", "/ch/v1/channel/{}/messages/{}/", channel_id, str(num_messages)))
@@ -166,9 +273,78 @@ class Client:
         data = self._get_message_raw(channel_id, message_id)
         return data and Message(client=self, data=data, channel_id=channel_id)
 
+    def fetch_payloads(self, messages: list[Message]) -> list[Message]:
+        """Fetch the payloads of any messages that don't have one yet, concurrently (see `gather`).
+
+        Afterwards, `Message.fetch_payload` returns without making a request.
+        """
+        to_fetch = [m for m in messages if m.cached_payload is None]
+        results = self.gather(
+            *[partial(self._get_message_raw, m.channel_id, m.id) for m in to_fetch], return_exceptions=True
+        )
+
+        for message, data in zip(to_fetch, results):
+            if isinstance(data, Exception):
+                log.info(f"Failed to fetch payload of message {message.id}: {data}")
+            elif data:
+                message._payload = json.loads(data["payload"])
+        return messages
+
+    def list_channel_messages_since(self, channel_id: str, since: float, list_size: int = 100) -> list[Message]:
+        """List (without payloads) at least every message published to a channel since an epoch timestamp, newest first.
+
+        Channels only list their latest messages, so this asks for `list_size` of them, doubling that until the
+        listing goes back past `since`.
+        """
+        num_messages = list_size
+        while True:
+            messages = self.get_channel_messages(channel_id, num_messages)
+            if _listing_reaches(messages, num_messages, since):
+                return messages
+            num_messages *= 2
+
+    def iter_channel_messages(
+        self,
+        channel_id: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        page_size: int = 100,
+        list_size: int = 100,
+        fetch_payloads: bool = True,
+    ) -> Iterator[Message]:
+        """Iterate through a channel's message history, oldest first.
+
+        This isn't lazy paging: the whole range is listed up front, before the first message is yielded
+        (with `list_channel_messages_since`, which holds only each message's ID and timestamp). Only the payloads
+        are fetched lazily, concurrently and `page_size` messages at a time, as the iterator is consumed.
+
+        Parameters
+        ----------
+        channel_id: str
+            The channel to iterate through.
+        since: datetime
+            Time of the first message to include.
+        until: datetime
+            Time of the last message to include, defaults to now.
+        page_size: int
+            The number of messages to fetch payloads for at once.
+        list_size: int
+            The number of (latest) messages to list at first. Use a larger size for busy channels.
+        fetch_payloads: bool
+            Whether to fetch message payloads. If False, messages only have their ID and timestamp.
+        """
+        start, end = _history_range(since, until)
+        messages = _messages_in_range(self.list_channel_messages_since(channel_id, start, list_size), start, end)
+
+        for i in range(0, len(messages), page_size):
+            page = messages[i:i + page_size]
+            if fetch_payloads:
+                self.fetch_payloads(page)
+            yield from page
+
     def create_channel(self, channel_name: str, agent_id: str) -> T:
         try:
-            return self.get_channel_named(channel_name, agent_id)
+            return self.resolve_channel_named(channel_name, agent_id)
         except NotFound:
             pass
         # all we need to do is publish to a channel with an empty payload
@@ -177,6 +353,112 @@ class Client:
         # channel it can either return a new channel ID (if created), or the message ID of the posted message.
         return self.get_channel_named(channel_name, agent_id)
 
+    def bootstrap(
+        self,
+        agent_id: str,
+        channels: list[str],
+        with_last_message: Optional[list[str]] = None,
+        create_missing: bool = False,
+    ) -> dict[str, T]:
+        """Fetch a set of channels, their aggregates and (optionally) their last message in as few round-trips as possible.
+
+        Channel IDs are resolved from the channel cache, falling back to a single agent listing (which includes every
+        channel the agent owns). The channels and last messages are then fetched concurrently.
+        If a cached ID turns out to be stale, it's invalidated and that channel is resolved again.
+
+        Parameters
+        ----------
+        agent_id: str
+            Agent that owns the channels.
+        channels: list[str]
+            Channel names to fetch.
+        with_last_message: Optional[list[str]]
+            Channel names (a subset of `channels`) to also prefetch the last message for.
+        create_missing: bool
+            Whether to create any channels that don't exist yet. If False, missing channels are left out of the result.
+
+        Returns
+        -------
+        dict[str, Channel]
+            Channel name -> channel, with aggregates (and last messages, where requested) populated.
+        """
+        with_last_message = set(with_last_message or [])
+
+        channel_ids = dict()
+        if self.channel_cache is not None:
+            for name in channels:
+                data = self.channel_cache.get(agent_id, name)
+                if data is not None:
+                    channel_ids[name] = data["channel"]
+        cached = set(channel_ids)
+
+        unresolved = [name for name in channels if name not in channel_ids]
+        if unresolved:
+            try:
+                agent = self.get_agent(agent_id)
+            except (Forbidden, NotFound, HTTPException) as e:
+                log.info(f"Failed to list channels for agent {agent_id}, resolving by name instead: {e}")
+                agent = None
+
+            if agent is not None:
+                known = {c.name: c.id for c in agent.channels}
+                channel_ids.update({name: known[name] for name in unresolved if name in known})
+            else:
+                results = self.gather(
+                    *[partial(self._get_channel_named_raw, name, agent_id) for name in unresolved],
+                    return_exceptions=True,
+                )
+                for name, data in zip(unresolved, results):
+                    if isinstance(data, NotFound):
+                        continue
+                    elif isinstance(data, Exception):
+                        raise data
+                    channel_ids[name] = data["channel"]
+
+        for name in channels:
+            if name not in channel_ids and create_missing:
+                channel_ids[name] = self.create_channel(name, agent_id).id
+
+        to_fetch = [name for name in channels if name in channel_ids]
+        if not to_fetch:
+            return dict()
+
+        with_messages = [name for name in to_fetch if name in with_last_message]
+        results = self.gather(
+            *[partial(self._get_channel_raw, channel_ids[name]) for name in to_fetch],
+            *[partial(self.get_channel_messages, channel_ids[name], 1) for name in with_messages],
+            return_exceptions=True,
+        )
+        channel_data = dict(zip(to_fetch, results))
+        messages = dict(zip(with_messages, results[len(to_fetch):]))
+
+        # a cached channel ID is stale if the channel has since been deleted (or re-created),
+        # so forget it and resolve the channel again.
+        stale = [name for name in to_fetch if name in cached and isinstance(channel_data[name], NotFound)]
+        for name in stale:
+            log.info(f"Cached channel ID for {name} is stale, resolving it again.")
+            self.channel_cache.invalidate(agent_id, name)
+
+        result = dict()
+        for name in to_fetch:
+            if name in stale:
+                continue
+            for data in (channel_data[name], messages.get(name)):
+                if isinstance(data, Exception):
+                    raise data
+
+            channel = self._parse_channel(channel_data[name])
+            if name in messages:
+                channel._messages = messages[name]
+            result[name] = channel
+
+        if stale:
+            result.update(self.bootstrap(
+                agent_id, stale, with_last_message=[name for name in stale if name in with_last_message], create_missing=create_missing
+            ))
+
+        return {name: result[name] for name in channels if name in result}
+
     def create_processor(self, processor_name: str, agent_id: str) -> Processor:
         return self.create_channel("#" + processor_name.lstrip('#'), agent_id)
 
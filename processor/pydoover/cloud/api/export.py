@@ -0,0 +1,247 @@
+"""A streaming reader for Doover CSV message exports.
+
+Exports can have hundreds of thousands of rows, so rather than loading (and decoding) every row, the reader makes
+one pass over the file to build an index of each row's timestamp and byte offset, sorts that index by timestamp,
+and then reads rows one at a time by seeking to them. Payloads are only decoded when they're used.
+
+The index is saved alongside the export (as `<export>.idx`), so opening the same export again doesn't re-scan it:
+
+    reader = CSVExportReader("export.csv", client)
+    for message in reader:                              # in timestamp order
+        ...
+    message = reader[1000]                              # random access, also in timestamp order
+    for message in reader.iter_range(since, until):     # a time range, found by bisection
+        ...
+"""
+
+import bisect
+import csv
+import io
+import json
+import logging
+import os
+import struct
+import threading
+
+from array import array
+from datetime import datetime
+from typing import Any, Iterator, Optional, Union
+
+from .message import Message
+
+
+log = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"PDCSVIDX"
+# bump this whenever the layout of the index file changes, so old index files are rebuilt
+INDEX_VERSION = 1
+
+KEY_FIELD = "Key"
+TIMESTAMP_FIELD = "Timestamp (UTC)"
+CHANNEL_NAME_FIELD = "Channel"
+CHANNEL_ID_FIELD = "Channel ID"
+AGENT_ID_FIELD = "Agent ID"
+PAYLOAD_FIELD = "Payload"
+
+
+def _iter_records(fp) -> Iterator[tuple[int, bytes]]:
+    # yield (offset, raw bytes) of each CSV record. A record ends at a newline outside of a quoted field,
+    # ie. once it contains an even number of quotes (escaped quotes are doubled, so don't change the parity).
+    offset = 0
+    record = b""
+    record_start = 0
+    for line in fp:
+        if not record:
+            record_start = offset
+        record += line
+        offset += len(line)
+        if record.count(b'"') % 2 == 0:
+            yield record_start, record
+            record = b""
+
+    if record:
+        yield record_start, record
+
+
+def _parse_record(raw: bytes) -> list[str]:
+    return next(csv.reader(io.StringIO(raw.decode("utf-8"))), [])
+
+
+class CSVExportReader:
+    """Read a Doover CSV message export as `Message`s in timestamp order, without loading the whole file.
+
+    Parameters
+    ----------
+    path: str
+        Path to the CSV export.
+    client: Client
+        Client to attach to each message.
+    use_index_file: bool
+        Whether to save (and reuse) the row index in a sidecar file next to the export.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], client=None, use_index_file: bool = True):
+        self.path = os.fspath(path)
+        self.client = client
+        self.index_path = f"{self.path}.idx"
+        self.use_index_file = use_index_file
+
+        self._fp = None
+        self._lock = threading.Lock()
+
+        self.fields: list[str] = []
+        # the timestamp, byte offset and length of each row, sorted by timestamp
+        self.timestamps = array("d")
+        self.offsets = array("q")
+        self.lengths = array("q")
+
+        if not (use_index_file and self._load_index()):
+            self._build_index()
+            if use_index_file:
+                self._save_index()
+
+        self._columns = {name: i for i, name in enumerate(self.fields)}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> Message:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("CSV export index out of range")
+
+        with self._lock:
+            if self._fp is None:
+                self._fp = open(self.path, "rb")
+            self._fp.seek(self.offsets[i])
+            raw = self._fp.read(self.lengths[i])
+
+        return self._to_message(_parse_record(raw), self.timestamps[i])
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def iter_range(self, since: Optional[Union[datetime, float]] = None, until: Optional[Union[datetime, float]] = None) -> Iterator[Message]:
+        """Iterate over the messages between `since` and `until` (inclusive), in timestamp order."""
+        since = since.timestamp() if isinstance(since, datetime) else since
+        until = until.timestamp() if isinstance(until, datetime) else until
+
+        lo = 0 if since is None else bisect.bisect_left(self.timestamps, since)
+        hi = len(self) if until is None else bisect.bisect_right(self.timestamps, until)
+        for i in range(lo, hi):
+            yield self[i]
+
+    def _to_message(self, row: list[str], timestamp: float) -> Message:
+        def get(name):
+            i = self._columns.get(name)
+            return row[i] if i is not None and i < len(row) else None
+
+        message = Message(
+            self.client,
+            data=None,
+            channel_id=get(CHANNEL_ID_FIELD),
+            agent_id=get(AGENT_ID_FIELD),
+            channel_name=get(CHANNEL_NAME_FIELD),
+        )
+        message.id = get(KEY_FIELD)
+        message.timestamp = timestamp
+        message._raw_payload = get(PAYLOAD_FIELD)
+        return message
+
+    def _build_index(self):
+        timestamps, offsets, lengths = array("d"), array("q"), array("q")
+
+        with open(self.path, "rb") as fp:
+            records = _iter_records(fp)
+            header = next(records, None)
+            if header is None:
+                return
+            self.fields = _parse_record(header[1])
+            try:
+                timestamp_index = self.fields.index(TIMESTAMP_FIELD)
+            except ValueError:
+                raise ValueError(f"{self.path} isn't a Doover CSV export, it has no '{TIMESTAMP_FIELD}' column.")
+
+            for offset, raw in records:
+                row = _parse_record(raw)
+                if not row:
+                    continue  # blank line
+                # Convert timestamp to UTC epoch timestamp
+                timestamps.append(datetime.fromisoformat(row[timestamp_index]).timestamp())
+                offsets.append(offset)
+                lengths.append(len(raw))
+
+        # exports are usually already in (either) order, so avoid sorting them where possible
+        count = len(timestamps)
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(count - 1)):
+            order = None
+        else:
+            order = sorted(range(count), key=timestamps.__getitem__)
+
+        if order is None:
+            self.timestamps, self.offsets, self.lengths = timestamps, offsets, lengths
+        else:
+            self.timestamps = array("d", (timestamps[i] for i in order))
+            self.offsets = array("q", (offsets[i] for i in order))
+            self.lengths = array("q", (lengths[i] for i in order))
+
+    def _source_info(self) -> dict[str, Any]:
+        stat = os.stat(self.path)
+        return {"version": INDEX_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def _load_index(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+
+        try:
+            with open(self.index_path, "rb") as fp:
+                if fp.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                    return False
+                (header_length, ) = struct.unpack("<I", fp.read(4))
+                header = json.loads(fp.read(header_length))
+                if {k: header.get(k) for k in ("version", "size", "mtime_ns")} != self._source_info():
+                    log.info(f"CSV export {self.path} has changed since it was indexed, re-indexing.")
+                    return False
+
+                count = header["count"]
+                timestamps, offsets, lengths = array("d"), array("q"), array("q")
+                timestamps.fromfile(fp, count)
+                offsets.fromfile(fp, count)
+                lengths.fromfile(fp, count)
+        except (OSError, ValueError, KeyError, EOFError, struct.error) as e:
+            log.info(f"Failed to read CSV export index at {self.index_path}, re-indexing: {e}")
+            return False
+
+        self.fields = header["fields"]
+        self.timestamps, self.offsets, self.lengths = timestamps, offsets, lengths
+        return True
+
+    def _save_index(self):
+        header = json.dumps(dict(self._source_info(), count=len(self), fields=self.fields)).encode()
+
+        # write to a temp file and rename so a reader never sees a half-written index
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as fp:
+                fp.write(INDEX_MAGIC)
+                fp.write(struct.pack("<I", len(header)))
+                fp.write(header)
+                self.timestamps.tofile(fp)
+                self.offsets.tofile(fp)
+                self.lengths.tofile(fp)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            log.info(f"Failed to write CSV export index to {self.index_path}: {e}")
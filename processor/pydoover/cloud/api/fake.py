@@ -0,0 +1,304 @@
+"""An in-process stand-in for the Doover channel API, for running processors offline.
+
+`FakeDooverAPI` keeps agents, channels, aggregates and messages in memory and serves the routes used by `Client`
+through a `requests` transport adapter, so no code under test needs to change:
+
+    api = FakeDooverAPI.from_fixture("fixtures/doover.json", latency=0.05)
+    client = Client(token="fake", base_url=api.base_url)
+    api.install(client.session)
+
+    ...
+
+    print(api.request_counts)  # eg. {"GET /ch/v1/agent/{}/{}/": 5, "POST /ch/v1/channel/{}/": 2}
+
+Publishing behaves as the real API does: dict payloads are merged into the channel's aggregate (with None values
+removing keys), other payloads (or `override_aggregate`) replace it, and messages are only logged with `record_log`.
+"""
+
+import copy
+import json
+import re
+import threading
+import time
+import uuid
+
+from collections import Counter
+from typing import Any, Callable, Optional, Union
+from urllib.parse import urlsplit, unquote
+
+import requests
+
+from requests.adapters import BaseAdapter
+
+
+DEFAULT_BASE_URL = "https://fake.doover.local"
+
+
+def merge_aggregate(aggregate: Any, update: Any) -> Any:
+    """Merge a published payload into an aggregate, as the Doover API does."""
+    if not isinstance(aggregate, dict) or not isinstance(update, dict):
+        return copy.deepcopy(update)
+
+    result = dict(aggregate)
+    for k, v in update.items():
+        if v is None:
+            result.pop(k, None)
+        elif isinstance(v, dict) and isinstance(result.get(k), dict):
+            result[k] = merge_aggregate(result[k], v)
+        else:
+            result[k] = copy.deepcopy(v)
+    return result
+
+
+class FakeAdapter(BaseAdapter):
+    """A `requests` transport adapter that answers requests with a handler rather than the network.
+
+    `handler(method, path, body)` returns `(status_code, data)`, where data is serialised as JSON.
+    `latency` (seconds, or a callable returning seconds) is added to every request.
+    """
+
+    def __init__(self, handler: Callable[[str, str, Any], tuple[int, Any]], latency: Union[float, Callable[[], float]] = 0.0):
+        super().__init__()
+        self.handler = handler
+        self.latency = latency
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode()
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            pass
+
+        url = urlsplit(request.url)
+        status, data = self.handler(request.method, unquote(url.path), body)
+
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(data).encode() if not isinstance(data, str) else data.encode()
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeDooverAPI:
+    """An in-memory Doover channel API. See the module docstring for usage.
+
+    Parameters
+    ----------
+    base_url: str
+        The base URL requests are made to, which the adapter is mounted on.
+    latency: float or Callable
+        Seconds of latency to add to every request, or a callable returning them (eg. to add jitter).
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, latency: Union[float, Callable[[], float]] = 0.0):
+        self.base_url = base_url
+        self.latency = latency
+
+        self.agents: dict[str, dict[str, Any]] = dict()
+        self.channels: dict[str, dict[str, Any]] = dict()
+
+        self.request_counts = Counter()
+        self._lock = threading.RLock()
+        self._routes = [
+            ("GET", r"/ch/v1/list_agents/", self._list_agents),
+            ("GET", r"/ch/v1/agent/([^/]+)/", self._get_agent),
+            ("GET", r"/ch/v1/agent/([^/]+)/([^/]+)/", self._get_channel_named),
+            ("POST", r"/ch/v1/agent/([^/]+)/([^/]+)/", self._publish_named),
+            ("GET", r"/ch/v1/channel/([^/]+)/", self._get_channel),
+            ("POST", r"/ch/v1/channel/([^/]+)/", self._publish),
+            ("GET", r"/ch/v1/channel/([^/]+)/messages/", self._get_messages),
+            ("GET", r"/ch/v1/channel/([^/]+)/messages/(\d+)/", self._get_messages),
+            ("GET", r"/ch/v1/channel/([^/]+)/message/([^/]+)/", self._get_message),
+            ("POST", r"/ch/v1/channel/([^/]+)/subscribe/", self._subscribe),
+        ]
+        self._routes = [(method, re.compile(f"^{pattern}?$"), pattern, func) for method, pattern, func in self._routes]
+
+    ## State
+
+    def add_agent(self, agent_id: str, deployment_config: Optional[dict[str, Any]] = None, type: str = "device") -> None:
+        with self._lock:
+            self.agents.setdefault(agent_id, {"type": type, "channels": {}, "deployment_config": {}})
+            if deployment_config is not None:
+                self.agents[agent_id]["deployment_config"] = deployment_config
+
+    def add_channel(self, agent_id: str, name: str, aggregate: Any = None, channel_id: Optional[str] = None) -> str:
+        """Add a channel (and its agent, if needed), returning its ID."""
+        with self._lock:
+            self.add_agent(agent_id)
+            existing = self.agents[agent_id]["channels"].get(name)
+            if existing is not None:
+                return existing
+
+            channel_id = channel_id or str(uuid.uuid4())
+            self.agents[agent_id]["channels"][name] = channel_id
+            self.channels[channel_id] = {"name": name, "owner": agent_id, "aggregate": aggregate, "messages": []}
+            return channel_id
+
+    def channel_id(self, agent_id: str, name: str) -> Optional[str]:
+        return self.agents.get(agent_id, {}).get("channels", {}).get(name)
+
+    def publish(
+        self, channel_id: str, data: Any, record_log: bool = True, override_aggregate: bool = False,
+        timestamp: Optional[float] = None, agent_id: Optional[str] = None,
+    ) -> Optional[dict[str, Any]]:
+        """Publish to a channel, returning the logged message (if `record_log`)."""
+        with self._lock:
+            channel = self.channels[channel_id]
+            if override_aggregate:
+                channel["aggregate"] = copy.deepcopy(data)
+            else:
+                channel["aggregate"] = merge_aggregate(channel["aggregate"], data)
+
+            if not record_log:
+                return None
+
+            message = {
+                "message": str(uuid.uuid4()),
+                "agent": agent_id or channel["owner"],
+                "channel": channel_id,
+                "channel_name": channel["name"],
+                "timestamp": timestamp if timestamp is not None else time.time(),
+                "payload": copy.deepcopy(data),
+            }
+            channel["messages"].append(message)
+            channel["messages"].sort(key=lambda m: m["timestamp"])
+            return message
+
+    ## Fixtures
+
+    def to_fixture(self) -> dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy({"agents": self.agents, "channels": self.channels})
+
+    def save_fixture(self, path: str) -> None:
+        with open(path, "w") as fp:
+            json.dump(self.to_fixture(), fp, indent=2)
+
+    @classmethod
+    def from_fixture(cls, fixture: Union[str, dict[str, Any]], **kwargs) -> "FakeDooverAPI":
+        """Create a fake API from a fixture (a dict, or path to a JSON file) saved by `save_fixture`."""
+        if isinstance(fixture, str):
+            with open(fixture, "r") as fp:
+                fixture = json.load(fp)
+
+        api = cls(**kwargs)
+        api.agents = copy.deepcopy(fixture.get("agents", {}))
+        api.channels = copy.deepcopy(fixture.get("channels", {}))
+        return api
+
+    ## Transport
+
+    def install(self, session: requests.Session) -> FakeAdapter:
+        """Route a session's requests to `base_url` to this fake API."""
+        adapter = FakeAdapter(self.handle, latency=self.latency)
+        session.mount(self.base_url, adapter)
+        return adapter
+
+    def reset_counts(self) -> None:
+        self.request_counts.clear()
+
+    def handle(self, method: str, path: str, body: Any) -> tuple[int, Any]:
+        for route_method, regex, pattern, func in self._routes:
+            if route_method != method:
+                continue
+            match = regex.match(path)
+            if match is None:
+                continue
+
+            with self._lock:
+                self.request_counts[f"{method} {re.sub(r'[(][^)]*[)]', '{}', pattern)}"] += 1
+                return func(body, *match.groups())
+
+        with self._lock:
+            self.request_counts[f"{method} <unknown>"] += 1
+        return 404, {"detail": f"No route for {method} {path}"}
+
+    def _channel_data(self, channel_id: str) -> dict[str, Any]:
+        channel = self.channels[channel_id]
+        data = {"channel": channel_id, "name": channel["name"], "owner": channel["owner"], "type": "base"}
+        if channel["aggregate"] is not None:
+            data["aggregate"] = {"payload": copy.deepcopy(channel["aggregate"])}
+        return data
+
+    @staticmethod
+    def _message_summary(message: dict[str, Any]) -> dict[str, Any]:
+        # messages are listed without their payloads
+        return {k: message[k] for k in ("message", "agent", "timestamp")}
+
+    def _list_agents(self, body):
+        return 200, {"agents": [self._get_agent(None, agent_id)[1] for agent_id in self.agents]}
+
+    def _get_agent(self, body, agent_id):
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            return 404, {"detail": "Not found."}
+        return 200, {
+            "agent": agent_id,
+            "type": agent["type"],
+            "settings": {"deployment_config": copy.deepcopy(agent["deployment_config"])},
+            "channels": [
+                {"channel": channel_id, "name": name, "type": "base", "agent": agent_id}
+                for name, channel_id in agent["channels"].items()
+            ],
+        }
+
+    def _get_channel_named(self, body, agent_id, name):
+        channel_id = self.channel_id(agent_id, name)
+        if channel_id is None:
+            return 404, {"detail": "Not found."}
+        return 200, self._channel_data(channel_id)
+
+    def _publish_body(self, channel_id, body):
+        body = body if isinstance(body, dict) else {"msg": body}
+        message = self.publish(
+            channel_id,
+            body.get("msg"),
+            record_log=body.get("record_log", True),
+            override_aggregate=body.get("override_aggregate", False),
+            timestamp=body.get("timestamp"),
+        )
+        return 200, {"channel": channel_id, "message": message and message["message"]}
+
+    def _publish_named(self, body, agent_id, name):
+        # publishing to a channel that doesn't exist creates it
+        return self._publish_body(self.add_channel(agent_id, name), body)
+
+    def _get_channel(self, body, channel_id):
+        if channel_id not in self.channels:
+            return 404, {"detail": "Not found."}
+        return 200, self._channel_data(channel_id)
+
+    def _publish(self, body, channel_id):
+        if channel_id not in self.channels:
+            return 404, {"detail": "Not found."}
+        return self._publish_body(channel_id, body)
+
+    def _get_messages(self, body, channel_id, num_messages="10"):
+        if channel_id not in self.channels:
+            return 404, {"detail": "Not found."}
+        messages = self.channels[channel_id]["messages"][::-1][:int(num_messages)]
+        return 200, {"messages": [self._message_summary(m) for m in messages]}
+
+    def _get_message(self, body, channel_id, message_id):
+        channel = self.channels.get(channel_id)
+        found = channel and next((m for m in channel["messages"] if m["message"] == message_id), None)
+        if not found:
+            return 404, {"detail": "Not found."}
+        return 200, dict(self._message_summary(found), payload=json.dumps(found["payload"]))
+
+    def _subscribe(self, body, task_id):
+        if task_id not in self.channels:
+            return 404, {"detail": "Not found."}
+        return 200, True
@@ -1,5 +1,4 @@
-import json, time, csv
-from datetime import datetime
+import json, time
 from typing import Any
 
 
@@ -15,6 +14,8 @@ class Message:
         self.agent_id = agent_id
         self.channel_name = channel_name
         self._payload = None
+        # a payload that hasn't been decoded yet (eg. from a CSV export), see `cached_payload`
+        self._raw_payload = None
 
         if data is not None:
             self._from_data(data)
@@ -43,63 +44,51 @@ class Message:
             "timestamp": self.timestamp,
             "channel": self.channel_id,
             "channel_name": self.channel_name,
-            "payload": self._payload
+            "payload": self.cached_payload
         }
 
     def update(self):
         data = self.client._get_message_raw(self.channel_id, self.id)
         self._from_data(data)
 
+    async def update_async(self):
+        data = await self.client._get_message_raw(self.channel_id, self.id)
+        self._from_data(data)
+
+    @property
+    def cached_payload(self):
+        """The payload, if it's available without making a request (otherwise None)."""
+        if self._payload is None and self._raw_payload is not None:
+            self._payload = json.loads(self._raw_payload)
+            self._raw_payload = None
+        return self._payload
+
     def fetch_payload(self):
-        if self._payload is not None:
+        if self.cached_payload is not None:
             return self._payload
 
         data = self.client._get_message_raw(self.channel_id, self.id)
         self._payload = json.loads(data["payload"])
         return self._payload
 
+    async def fetch_payload_async(self):
+        if self.cached_payload is not None:
+            return self._payload
+
+        data = await self.client._get_message_raw(self.channel_id, self.id)
+        self._payload = json.loads(data["payload"])
+        return self._payload
+
     def get_age(self):
         return time.time() - self.timestamp
 
 
     @staticmethod
     def from_csv_export(client, csv_file_path):
-        
-        messages = []
-
-        # Open and read the CSV file using the csv module
-        with open(csv_file_path, 'r', newline='') as file:
-            reader = csv.DictReader(file)  # Use DictReader to handle headers
-
-            for row in reader:
-                # Extract data from the row
-                key = row['Key']
-                timestamp = row['Timestamp (UTC)']
-                channel_name = row['Channel']
-                channel_id = row['Channel ID']
-                agent_name = row['Agent']
-                agent_id = row['Agent ID']
-                payload = row['Payload']
-
-                # Convert timestamp to UTC epoch timestamp
-                timestamp = datetime.fromisoformat(timestamp).timestamp()
-
-                # Create a Message instance
-                message = Message(
-                    client,
-                    data=None,
-                    channel_id=channel_id,
-                    agent_id=agent_id,
-                    channel_name=channel_name
-                )
-
-                message.id = key
-                message.timestamp = timestamp
-                message._payload = json.loads(payload)
-
-                messages.append(message)
-
-        # Sort the messages by timestamp
-        messages.sort(key=lambda x: x.timestamp)
-
-        return messages
+        """Load every message in a CSV export, sorted by timestamp.
+
+        Payloads are decoded when they're first used. To process a large export without loading it all at once,
+        iterate over a `CSVExportReader` instead.
+        """
+        from .export import CSVExportReader
+        return list(CSVExportReader(csv_file_path, client))
@@ -1 +1,3 @@
 from .base import ProcessorBase
+from .warm_state import WarmStateStore
+from .replay import ReplayEngine, ReplayReport
@@ -11,11 +11,13 @@ import logging
 import sys
 import time
 
-from typing import Any
+from functools import partial
+from typing import Any, Optional
 
-from ...cloud.api import Client, Message
+from ...cloud.api import ChannelCache, Client, Message
 
 from ...ui import UIManager
+from .warm_state import WarmStateStore
 
 # use the root logger since we want to pipe these logs to a channel.
 log = logging.getLogger()
@@ -41,6 +43,12 @@ class LogHandler(logging.NullHandler):
 
 
 class ProcessorBase:
+    # keep caches (eg. a processor's device state) between invocations in a warm container, see `get_warm_state_store`.
+    # this can also be enabled with `"use_warm_state": true` in the package config.
+    use_warm_state = False
+    # delete the pydoover package from `sys.modules` at the start of each invocation, see `import_modules`.
+    purge_modules = False
+
     def __init__(self, **kwargs):
 
         self.agent_id: str = kwargs["agent_id"]
@@ -48,7 +56,9 @@ class ProcessorBase:
         self.log_channel_id: str = kwargs["log_channel"]
         self.task_id: str = kwargs["task_id"]
 
-        self.api: Client = Client(token=self.access_token, base_url=kwargs["api_endpoint"])
+        self.api: Client = Client(
+            token=self.access_token, base_url=kwargs["api_endpoint"], channel_cache=self.get_channel_cache()
+        )
         self.ui_manager: UIManager = UIManager(self.agent_id, self.api)
         
         self._log_handler = LogHandler()
@@ -62,6 +72,9 @@ class ProcessorBase:
         self.deployment_config: dict[str, Any] = kwargs["agent_settings"].get("deployment_config", {})
         self.package_config: dict[str, Any] = kwargs.get("package_config", {})
 
+        self.warm_state: Optional[WarmStateStore] = self.get_warm_state_store()
+        self.ui_manager.max_pull_age = self.get_ui_max_pull_age()
+
         try:
             if kwargs["msg_obj"] is None:
                 raise KeyError
@@ -81,6 +94,30 @@ class ProcessorBase:
         #       'deployment_config' : {} # a dictionary of the deployment config for this agent
         #     }
 
+    def get_channel_cache(self) -> Optional[ChannelCache]:
+        """Override this to customise (or disable, by returning None) the channel name -> ID resolution cache."""
+        return ChannelCache()
+
+    def get_warm_state_store(self) -> Optional[WarmStateStore]:
+        """Override this to customise the warm state store. By default this is only used if `use_warm_state` is set."""
+        if self.use_warm_state or self.package_config.get("use_warm_state"):
+            return WarmStateStore()
+        return None
+
+    def get_ui_max_pull_age(self) -> float:
+        """Override this to let a UI push skip its pull if the aggregates were loaded this recently (in seconds),
+        eg. by `bootstrap_channels` earlier in the run. By default this is only done with warm state, otherwise 0 (always pull).
+        """
+        return 5 if self.warm_state is not None else 0
+
+    def bootstrap_channels(self, channels: list[str], with_last_message: Optional[list[str]] = None, create_missing: bool = False) -> dict:
+        """Fetch channels with their aggregates (and, where requested, their last message), see `Client.bootstrap`."""
+        return self.api.bootstrap(self.agent_id, channels, with_last_message=with_last_message, create_missing=create_missing)
+
+    def save_warm_state(self):
+        if self.warm_state is not None:
+            self.warm_state.flush()
+
     def setup(self):
         return NotImplemented
 
@@ -110,9 +147,16 @@ class ProcessorBase:
         except Exception as e:
             log.error(f"ERROR attempting to close process: {e} ", exc_info=e)
 
+        try:
+            self.save_warm_state()
+        except Exception as e:
+            log.error(f"ERROR attempting to save warm state: {e} ", exc_info=e)
+
         end_time = time.time()
         log.info(f"Finished at {end_time}. Process took {end_time - start_time} seconds.")
 
+        # the handler is on the root logger, so remove it rather than letting handlers build up across invocations
+        log.removeHandler(self._log_handler)
         if self._log_handler.get_logs() and self.log_channel_id is not None:
             self.api.publish_to_channel(self.log_channel_id, self._log_handler.get_logs())
 
@@ -124,19 +168,14 @@ class ProcessorBase:
         ## Optionally update the UI at the end
         # self.ui_manager.push()
 
-    @staticmethod
-    def import_modules():
-        """Attempt to delete any loaded pydoover modules that persist across lambdas."""
-        if 'pydoover' in sys.modules:
-            del sys.modules['pydoover']
-        try:
-            del pydoover
-        except:
-            pass
-        try:
-            del pd
-        except:
-            pass
+    def import_modules(self):
+        """Delete the loaded pydoover package that persists across lambdas, if `purge_modules` is set.
+
+        By default, modules are kept so warm invocations reuse them rather than paying for the imports again."""
+        if not self.purge_modules:
+            return
+
+        sys.modules.pop("pydoover", None)
 
     def get_agent_config(self, filter_key: str = None):
         if not self.deployment_config:
@@ -150,3 +189,7 @@ class ProcessorBase:
 
     def fetch_channel_named(self, channel_name: str):
         return self.api.get_channel_named(channel_name, self.agent_id)
+
+    def create_channels(self, *channel_names: str) -> list:
+        """Get (or create, if they don't exist) several channels concurrently, returned in the order given."""
+        return self.api.gather(*[partial(self.api.create_channel, name, self.agent_id) for name in channel_names])
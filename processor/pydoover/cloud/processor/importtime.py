@@ -0,0 +1,120 @@
+"""Measure the cold-start import time of a processor, using `python -X importtime`.
+
+Processors run in a fresh interpreter on every cold start, so import time is paid (and billed) on every uplink
+that lands on a new container. Run this module with the processor's module name to see where it goes, eg.
+
+    python -m pydoover.cloud.processor.importtime target
+
+This reports the total (cumulative) import time, and the time spent importing each top-level package.
+
+Modules imported lazily (eg. inside a method) are missed by that, but are paid on the same cold start if the
+processor's run imports them. Pass `--run` (with `--setup` to build whatever it needs, eg. fake APIs) to also report
+the imports made while running it, eg.
+
+    python -m pydoover.cloud.processor.importtime target \\
+        --setup "import harness; h = harness.Harness.from_fixtures(); m = h.message_for('UPLINK', 0)" \\
+        --run "h.invoke('UPLINK', m)"
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+from collections import defaultdict
+
+
+# `import time: self [us] | cumulative | imported package`, where nesting is shown by indenting the package name
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$")
+
+# written to stderr between the import, setup and run phases of `measure_run_imports`
+PHASE_MARKER = "-- importtime phase --"
+
+
+def _run_importtime(code: str, python: str, cwd: str) -> list[list[str]]:
+    # returns the importtime lines of each phase of `code`, split on PHASE_MARKER
+    result = subprocess.run([python, "-X", "importtime", "-c", code], capture_output=True, text=True, cwd=cwd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to run {code!r}: {result.stderr.strip().splitlines()[-1:]}")
+
+    phases = [[]]
+    for line in result.stderr.splitlines():
+        if line == PHASE_MARKER:
+            phases.append([])
+        else:
+            phases[-1].append(line)
+    return phases
+
+
+def _package_times(lines: list[str], module: str = None) -> dict[str, int]:
+    # the total is the cumulative time of `module` if given, otherwise of every top-level (un-nested) import
+    packages = defaultdict(int)
+    total = 0
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        if module is None and len(indent) == 1:
+            total += int(cumulative_us)
+        elif name == module:
+            total = int(cumulative_us)
+
+    packages["total"] = total
+    return dict(packages)
+
+
+def measure_import_time(module: str, python: str = sys.executable, cwd: str = None) -> dict[str, int]:
+    """Import `module` in a fresh interpreter and return the import time (in microseconds) of each top-level package.
+
+    The total import time of `module` (including everything it imports) is under the `"total"` key.
+    """
+    phases = _run_importtime(f"import {module}", python, cwd)
+    return _package_times(phases[0], module)
+
+
+def measure_run_imports(module: str, run: str, setup: str = "", python: str = sys.executable, cwd: str = None) -> dict[str, int]:
+    """Import `module`, then execute `setup` and `run` in a fresh interpreter, and return the import time
+    (in microseconds) of each top-level package imported by `run`.
+
+    Modules already imported by `module` or `setup` aren't counted. The total is under the `"total"` key.
+    """
+    mark = f"sys.stderr.write({PHASE_MARKER + chr(10)!r}); sys.stderr.flush()"
+    code = "\n".join([f"import sys, {module}", mark, setup, mark, run])
+    phases = _run_importtime(code, python, cwd)
+    if len(phases) != 3:
+        raise RuntimeError(f"Failed to find the run phase of {run!r}.")
+    return _package_times(phases[2])
+
+
+def report(module: str, repeats: int = 5, top: int = 10, cwd: str = None, run: str = None, setup: str = ""):
+    """Print the median import time of `module` (and of `run`, if given), and of the slowest top-level packages."""
+
+    def print_median(title, runs):
+        def median(name):
+            values = sorted(r.get(name, 0) for r in runs)
+            return values[len(values) // 2]
+
+        names = {name for r in runs for name in r if name != "total"}
+        slowest = sorted(names, key=median, reverse=True)[:top]
+
+        print(f"{title}: {median('total') / 1000:.1f} ms (median of {repeats})")
+        for name in slowest:
+            print(f"  {name:<30} {median(name) / 1000:>8.1f} ms")
+
+    print_median(f"import {module}", [measure_import_time(module, cwd=cwd) for _ in range(repeats)])
+    if run is not None:
+        print_median(f"imported by {run}", [measure_run_imports(module, run, setup, cwd=cwd) for _ in range(repeats)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold-start import time of a processor.")
+    parser.add_argument("module", nargs="?", default="pydoover.cloud.processor")
+    parser.add_argument("--run", help="Code to run after importing the module, whose imports are also reported")
+    parser.add_argument("--setup", default="", help="Code to run before --run, whose imports aren't reported")
+    parser.add_argument("-n", "--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    report(args.module, repeats=args.repeats, run=args.run, setup=args.setup)
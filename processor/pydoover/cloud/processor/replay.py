@@ -0,0 +1,268 @@
+"""A process-pool engine for replaying messages through a processor package locally.
+
+Invoking a processor mutates global state: it imports the package's `target.py`, and its `ProcessorBase` installs a
+handler on the root logger. Running invocations on threads makes those races, so instead each worker process
+imports the package once (when it starts) and then runs invocations one at a time, capturing each run's logs
+with its own handler.
+
+Messages from the same agent often depend on the state left by the previous one (eg. ui_state), so every message for
+an agent is sent to the same worker, in the order given. Messages for different agents run in parallel.
+
+    engine = ReplayEngine.for_task(task, package_dir, agent_settings, processes=8)
+    report = engine.run(CSVExportReader("export.csv"))
+    print(report)
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import sys
+import time
+import traceback
+
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Union
+
+if TYPE_CHECKING:
+    from ..api.channel import Task
+    from ..api.message import Message
+
+
+log = logging.getLogger(__name__)
+
+# set in each worker process by `_init_worker`
+_worker_target = None
+_worker_kwargs = None
+
+
+def load_target(package_dir: str, module_name: str = "target", class_name: str = "target"):
+    """Import a processor package's target module (from `package_dir`), returning its processor class."""
+    package_dir = os.path.abspath(package_dir)
+    if package_dir not in sys.path:
+        sys.path.append(package_dir)
+
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(package_dir, f"{module_name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+def _init_worker(package_dir: str, processor_kwargs: dict[str, Any], log_level: int):
+    global _worker_target, _worker_kwargs
+
+    # logs are captured per run (see `_run_batch`), so don't also print every run's logs from every worker
+    logging.getLogger().setLevel(log_level)
+    _worker_target = load_target(package_dir)
+    _worker_kwargs = processor_kwargs
+
+
+class _RunLogHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.errors = []
+
+    def emit(self, record):
+        try:
+            message = self.format(record)
+        except Exception:
+            return
+        self.records.append(message)
+        if record.levelno >= logging.ERROR:
+            self.errors.append(message)
+
+
+def _run_batch(messages: list[dict[str, Any]], keep_logs: bool) -> list[tuple[Optional[str], Optional[str], float, Optional[str], Optional[str]]]:
+    results = []
+    root = logging.getLogger()
+
+    for msg_obj in messages:
+        handler = _RunLogHandler()
+        root.addHandler(handler)
+
+        error = None
+        start = time.perf_counter()
+        try:
+            _worker_target(**_worker_kwargs, msg_obj=msg_obj).execute()
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            latency = time.perf_counter() - start
+            root.removeHandler(handler)
+
+        # `execute` logs (rather than raises) errors in the processor itself, so treat those as failures too
+        if error is None and handler.errors:
+            error = handler.errors[0]
+
+        logs = "\n".join(handler.records) if (keep_logs or error is not None) else None
+        results.append((msg_obj.get("agent"), msg_obj.get("message"), latency, error, logs))
+
+    return results
+
+
+class ReplayResult:
+    """The outcome of replaying a single message."""
+
+    def __init__(self, agent_id: Optional[str], message_id: Optional[str], latency: float, error: Optional[str], logs: Optional[str]):
+        self.agent_id = agent_id
+        self.message_id = message_id
+        self.latency = latency
+        self.error = error
+        self.logs = logs
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"<ReplayResult message_id={self.message_id}, latency={self.latency:.3f}, ok={self.ok}>"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """The `q`th percentile (0-100) of already sorted values, using linear interpolation."""
+    if not sorted_values:
+        return 0.0
+
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class ReplayReport:
+    """A summary of a replay: throughput, latency percentiles and failures."""
+
+    def __init__(self, results: list[ReplayResult], wall_time: float, processes: int):
+        self.results = results
+        self.wall_time = wall_time
+        self.processes = processes
+
+    @property
+    def failures(self) -> list[ReplayResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def throughput(self) -> float:
+        """Messages replayed per second."""
+        return len(self.results) / self.wall_time if self.wall_time > 0 else 0.0
+
+    def latency_percentiles(self, percentiles: Iterable[float] = (50, 90, 95, 99)) -> dict[float, float]:
+        latencies = sorted(r.latency for r in self.results)
+        return {q: percentile(latencies, q) for q in percentiles}
+
+    def __str__(self):
+        agents = len({r.agent_id for r in self.results})
+        lines = [
+            f"Replayed {len(self.results)} messages for {agents} agents in {self.wall_time:.2f}s "
+            f"with {self.processes} processes ({self.throughput:.1f} messages/s).",
+            f"Failures: {len(self.failures)}",
+        ]
+        if self.results:
+            latency = ", ".join(f"p{q:g}={v * 1000:.1f}ms" for q, v in self.latency_percentiles().items())
+            lines.append(f"Latency: {latency}, max={max(r.latency for r in self.results) * 1000:.1f}ms")
+        for failure in self.failures[:5]:
+            lines.append(f"  {failure.message_id}: {failure.error.strip().splitlines()[-1]}")
+        return "\n".join(lines)
+
+
+class ReplayEngine:
+    """Replay messages through a processor package on a pool of worker processes.
+
+    Parameters
+    ----------
+    package_dir: str
+        Directory of the processor package, containing `target.py`.
+    processor_kwargs: dict
+        The arguments every processor is invoked with (see `ProcessorBase`), other than `msg_obj`.
+    processes: int
+        Number of worker processes, defaults to the number of CPUs.
+    batch_size: int
+        Number of (consecutive) messages sent to a worker at once.
+    keep_logs: bool
+        Whether to keep the logs of every run in the report. Logs of failed runs are always kept.
+    log_level: int
+        Level of the logs captured from each run.
+    """
+
+    def __init__(
+        self,
+        package_dir: str,
+        processor_kwargs: dict[str, Any],
+        processes: Optional[int] = None,
+        batch_size: int = 16,
+        keep_logs: bool = False,
+        log_level: int = logging.INFO,
+    ):
+        self.package_dir = os.path.abspath(package_dir)
+        self.processor_kwargs = processor_kwargs
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.keep_logs = keep_logs
+        self.log_level = log_level
+
+    @classmethod
+    def for_task(cls, task: "Task", package_dir: str, agent_settings: dict[str, Any], **kwargs) -> "ReplayEngine":
+        """Create an engine that invokes `task`'s processor as `Task.invoke_locally` does."""
+        processor_kwargs = {
+            "agent_id": task.client.agent_id,
+            "access_token": task.client.access_token.token,
+            "api_endpoint": task.client.base_url,
+            "package_config": task.fetch_aggregate(),
+            "task_id": task.id,
+            "log_channel": None,
+            "agent_settings": agent_settings,
+        }
+        return cls(package_dir, processor_kwargs, **kwargs)
+
+    def _worker_for(self, agent_id: Optional[str]) -> int:
+        # a stable hash, so an agent's messages always go to the same worker (and so run in order)
+        digest = hashlib.md5(str(agent_id).encode()).digest()
+        return int.from_bytes(digest[:4], "little") % self.processes
+
+    def run(self, messages: Iterable[Union["Message", dict[str, Any]]]) -> ReplayReport:
+        """Replay messages (`Message`s or message dicts), returning a report once they've all run.
+
+        Messages are read lazily, so only a bounded number are held in memory at once.
+        """
+        initargs = (self.package_dir, self.processor_kwargs, self.log_level)
+        # one single-process pool per worker: each pool runs its batches in the order they're submitted,
+        # which keeps every agent's messages in order.
+        pools = [
+            ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs)
+            for _ in range(self.processes)
+        ]
+
+        results = []
+        pending = set()
+        max_pending = self.processes * 4
+
+        def collect(return_when):
+            nonlocal pending
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                results.extend(ReplayResult(*r) for r in future.result())
+
+        start = time.perf_counter()
+        try:
+            batches: dict[int, list[dict[str, Any]]] = {}
+            for message in messages:
+                msg_obj = message if isinstance(message, dict) else message.to_dict()
+                worker = self._worker_for(msg_obj.get("agent"))
+
+                batch = batches.setdefault(worker, [])
+                batch.append(msg_obj)
+                if len(batch) >= self.batch_size:
+                    pending.add(pools[worker].submit(_run_batch, batches.pop(worker), self.keep_logs))
+                    if len(pending) >= max_pending:
+                        collect(FIRST_COMPLETED)
+
+            for worker, batch in batches.items():
+                pending.add(pools[worker].submit(_run_batch, batch, self.keep_logs))
+            if pending:
+                collect(ALL_COMPLETED)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        return ReplayReport(results, time.perf_counter() - start, self.processes)
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from typing import Any, Optional
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WARM_STATE_PATH = os.path.join(tempfile.gettempdir(), "pydoover_warm_state.json")
+
+# bump this whenever the layout of the stored state changes, so old state files are ignored
+WARM_STATE_VERSION = 1
+
+
+class WarmStateSection:
+    """A single key of an agent's warm state, with the `load` / `save` interface of a cache store.
+
+    This lets other caches (eg. `farmo_client.DeviceStateCache`) persist into the warm state store.
+    """
+
+    def __init__(self, store: "WarmStateStore", agent_id: str, key: str):
+        self.store = store
+        self.agent_id = agent_id
+        self.key = key
+
+    def load(self) -> dict:
+        return self.store.get(self.agent_id, self.key) or {}
+
+    def save(self, entries: dict):
+        self.store.set(self.agent_id, self.key, dict(entries))
+
+
+class WarmStateStore:
+    """State kept between processor invocations in the same (warm) container, in a versioned local JSON file.
+
+    Each agent's state is a dict of keys (eg. a section used as a `farmo_client.DeviceStateCache` store),
+    which expires `max_age` seconds after it was last saved. Changes are only written to disk on `flush`.
+
+    Parameters
+    ----------
+    path: str
+        File to persist the state to. Lambda containers share `/tmp` between warm invocations.
+    max_age: int
+        Number of seconds after which an agent's saved state is ignored.
+    """
+
+    def __init__(self, path: str = DEFAULT_WARM_STATE_PATH, max_age: int = 10 * 60):
+        self.path = path
+        self.max_age = max_age
+
+        self._agents: dict[str, dict[str, Any]] = dict()
+        self._dirty = False
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError) as e:
+            log.info(f"Failed to read warm state at {self.path}, ignoring: {e}")
+            return
+
+        if not isinstance(data, dict) or data.get("version") != WARM_STATE_VERSION:
+            log.info(f"Ignoring warm state at {self.path} from a different version.")
+            return
+
+        now = time.time()
+        self._agents = {
+            agent_id: state for agent_id, state in data.get("agents", {}).items()
+            if now - state.get("saved_at", 0) < self.max_age
+        }
+
+    def get(self, agent_id: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            self._load()
+            return self._agents.get(agent_id, {}).get("data", {}).get(key, default)
+
+    def set(self, agent_id: str, key: str, value: Any):
+        with self._lock:
+            self._load()
+            state = self._agents.setdefault(agent_id, {"data": {}})
+            state["data"][key] = value
+            state["saved_at"] = time.time()
+            self._dirty = True
+
+    def section(self, agent_id: str, key: str) -> WarmStateSection:
+        return WarmStateSection(self, agent_id, key)
+
+    def invalidate(self, agent_id: str):
+        with self._lock:
+            self._load()
+            if self._agents.pop(agent_id, None) is not None:
+                self._dirty = True
+
+    def flush(self):
+        """Write any changes to disk."""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            # write to a temp file and rename so concurrent invocations never read a half-written file.
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w") as fp:
+                    json.dump({"version": WARM_STATE_VERSION, "agents": self._agents}, fp)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except (OSError, TypeError, ValueError) as e:
+                log.info(f"Failed to write warm state to {self.path}: {e}")
@@ -1,7 +1,60 @@
-from .element import *
-from .interaction import *
-from .manager import UIManager
-from .misc import *
-from .parameter import *
-from .submodule import *
-from .variable import *
+import importlib
+
+from typing import TYPE_CHECKING
+
+# Elements are imported from their submodule the first time they're accessed (eg. `ui.Submodule`),
+# so importing `pydoover.ui` (eg. for just the `UIManager`) doesn't load every element type.
+_LAZY_ATTRS = {
+    **dict.fromkeys((
+        "Element", "ConnectionType", "ConnectionInfo", "AlertStream", "Camera", "Multiplot", "RemoteComponent",
+        "doover_ui_element", "doover_ui_connection_info", "doover_ui_camera", "doover_ui_alert_stream",
+        "doover_ui_multiplot", "doover_ui_remote_component",
+    ), "element"),
+    **dict.fromkeys((
+        "Interaction", "Action", "WarningIndicator", "HiddenValue", "SlimCommand", "StateCommand", "Slider",
+        "doover_ui_interaction", "doover_ui_action", "doover_ui_state_command", "doover_ui_warning_indicator",
+        "doover_ui_hidden_value", "doover_ui_slider",
+        "action", "warning_indicator", "state_command", "hidden_value", "slider",
+    ), "interaction"),
+    "UIManager": "manager",
+    **dict.fromkeys(("Colour", "Range", "Option", "Widget"), "misc"),
+    **dict.fromkeys((
+        "Parameter", "NumericParameter", "TextParameter", "BooleanParameter", "DateTimeParameter",
+        "doover_ui_float_parameter", "doover_ui_text_parameter", "doover_ui_datetime_parameter",
+        "numeric_parameter", "text_parameter", "boolean_parameter", "datetime_parameter",
+    ), "parameter"),
+    **dict.fromkeys((
+        "NAME_VALIDATOR", "Container", "Submodule", "doover_ui_container", "doover_ui_submodule",
+    ), "submodule"),
+    **dict.fromkeys((
+        "NotSet", "Variable", "NumericVariable", "TextVariable", "BooleanVariable", "DateTimeVariable",
+        "doover_ui_variable",
+    ), "variable"),
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    try:
+        submodule = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f".{submodule}", __name__), name)
+    globals()[name] = value  # so later lookups don't go through __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
+
+if TYPE_CHECKING:
+    from .element import *
+    from .interaction import *
+    from .manager import UIManager
+    from .misc import *
+    from .parameter import *
+    from .submodule import *
+    from .variable import *
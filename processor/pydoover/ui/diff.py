@@ -0,0 +1,166 @@
+"""A single-pass diff engine between the local UI element tree and the cloud `ui_state`.
+
+The element tree and the cloud state are walked together once. Each element is serialised at most once per diff
+(with `Element.to_dict_cached`, so elements that haven't changed since the last diff aren't re-serialised at all),
+and containers are compared child-by-child rather than by serialising their whole subtree at every level.
+
+Run this module to benchmark the diff against the tree size, eg. `python -m pydoover.ui.diff`.
+"""
+
+import time
+
+from typing import Any, Optional
+
+from .element import Element
+from .submodule import Container
+
+
+def _diff_attrs(this: dict[str, Any], other: dict[str, Any], remove: bool, retain_fields: list) -> dict[str, Any]:
+    result = {k: v for k, v in this.items() if k in retain_fields or other.get(k) != v}
+    if remove:
+        result.update({k: None for k in other if k not in this and k != "children"})  # to_remove
+    return result
+
+
+def _full_dict(element: Element) -> dict[str, Any]:
+    # the serialised form of a whole subtree, for elements that don't exist in the cloud state yet
+    result = dict(element.to_dict_cached())
+    if isinstance(element, Container):
+        result["children"] = {name: _full_dict(c) for name, c in element._children.items()}
+    return result
+
+
+def diff_element(
+    element: Element,
+    other: dict[str, Any],
+    remove: bool = True,
+    retain_fields: Optional[list] = None,
+    only_dirty: bool = False,
+) -> Optional[dict[str, Any]]:
+    """Find the changes required to turn the cloud state `other` into `element`'s state.
+
+    This returns None if there are no changes, otherwise a dict with changed keys set to their new value,
+    and removed keys set to None (if `remove` is True). Keys in `retain_fields` are always included.
+
+    If `only_dirty` is True, branches that haven't changed (see `Element.is_dirty`) since they were last marked clean
+    are skipped entirely.
+    """
+    if only_dirty and not element.is_dirty:
+        return None
+
+    retain_fields = retain_fields or []
+    result = _diff_attrs(element.to_dict_cached(), other, remove, retain_fields)
+
+    if isinstance(element, Container):
+        other_children = other.get("children") or {}
+
+        children_diff = dict()
+        if remove:
+            children_diff.update({k: None for k in other_children if k not in element._children})  # to_remove
+
+        for name, child in element._children.items():
+            other_child = other_children.get(name)
+            if not isinstance(other_child, dict):
+                children_diff[name] = _full_dict(child)
+                continue
+
+            diff = diff_element(child, other_child, remove=remove, retain_fields=retain_fields, only_dirty=only_dirty)
+            if diff is not None:
+                children_diff[name] = diff
+
+        if children_diff:
+            result["children"] = children_diff
+
+    if len(result) == 0:
+        return None
+    return result
+
+
+def mark_state_changes(element: Element, old: Optional[dict[str, Any]], new: Optional[dict[str, Any]]) -> None:
+    """Mark the elements whose cloud state differs between `old` and `new` as dirty, so they are diffed on the next push."""
+    if old == new:
+        return
+
+    element.mark_dirty()
+    if isinstance(element, Container) and isinstance(old, dict) and isinstance(new, dict):
+        old_children = old.get("children") or {}
+        new_children = new.get("children") or {}
+        for name, child in element._children.items():
+            mark_state_changes(child, old_children.get(name), new_children.get(name))
+    elif isinstance(element, Container):
+        for child in element._children.values():
+            mark_state_changes(child, None, {})
+
+
+if __name__ == "__main__":
+    from .variable import NumericVariable
+    from .element import Multiplot
+    from .submodule import Submodule
+
+    def legacy_diff(element, other, remove=True, retain_fields=[]):
+        ## The previous implementation, which serialises the whole subtree at every level
+        this = element.to_dict()
+        result = {k: v for k, v in this.items() if other.get(k) != v or k in retain_fields}
+        if remove:
+            result.update(**{k: None for k in other if k not in this})
+        if isinstance(element, Container):
+            result.pop("children", None)
+            other_children = other.get("children", {})
+            children_diff = {k: None for k in other_children if k not in element._children} if remove else {}
+            for name, child in element._children.items():
+                if name in other_children:
+                    diff = legacy_diff(child, other_children[name], remove, retain_fields)
+                    if diff is not None:
+                        children_diff[name] = diff
+                else:
+                    children_diff[name] = child.to_dict()
+            if children_diff:
+                result["children"] = children_diff
+        return result or None
+
+    def build_tree(num_submodules, per_submodule):
+        root = Container(name=None, display_name=None)
+        for i in range(num_submodules):
+            children = [NumericVariable(f"var_{i}_{j}", f"Variable {j}", curr_val=j) for j in range(per_submodule - 1)]
+            children.append(Multiplot(f"plot_{i}", "Plot", series=[c.name for c in children], series_colours=["blue"] * len(children), series_active=[True] * len(children)))
+            root.add_children(Submodule(f"submodule_{i}", f"Submodule {i}", children=children))
+        return root
+
+    def timed(func, repeats=5):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        return (time.perf_counter() - start) / repeats * 1000
+
+    print(f"{'elements':>10} {'legacy (ms)':>12} {'cold (ms)':>10} {'warm (ms)':>10} {'dirty (ms)':>10}")
+    for num_submodules, per_submodule in [(2, 5), (10, 10), (20, 50), (50, 100)]:
+        root = build_tree(num_submodules, per_submodule)
+        cloud = root.to_dict()
+
+        ## change two variables, as a typical uplink does
+        root.get_element("var_0_0").current_value = 100
+        root.get_element(f"var_{num_submodules - 1}_0").current_value = 100
+        assert diff_element(root, cloud) == legacy_diff(root, cloud)
+
+        legacy = timed(lambda: legacy_diff(root, cloud))
+
+        def cold():
+            ## every element has changed since the last diff
+            for sub in root.children:
+                sub.mark_changed()
+                for e in sub.children:
+                    e.mark_changed()
+            diff_element(root, cloud)
+
+        cold_ms = timed(cold)
+        warm_ms = timed(lambda: diff_element(root, cloud))
+
+        def dirty_only():
+            ## only the two changed variables (and their ancestors) are visited
+            root.mark_clean()
+            root.get_element("var_0_0").current_value = 100
+            root.get_element(f"var_{num_submodules - 1}_0").current_value = 100
+            diff_element(root, cloud, only_dirty=True)
+
+        dirty_ms = timed(dirty_only)
+        print(f"{num_submodules * (per_submodule + 1):>10} {legacy:>12.2f} {cold_ms:>10.2f} {warm_ms:>10.2f} {dirty_ms:>10.2f}")
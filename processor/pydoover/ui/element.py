@@ -54,18 +54,58 @@ class Element:
         # filter out any null values
         return {k: v for k, v in to_return.items() if v is not None}
 
-    def get_diff(self, other: dict[str, Any], remove: bool = True, retain_fields: Optional[list] = []) -> Optional[dict[str, Any]]:
-        this = self.to_dict()
-        # if this == other:
-        #     return None
-
-        result = {k: v for k, v in this.items() if other.get(k) != v or k in retain_fields}
-        if remove:
-            result.update(**{k: None for k in other if k not in this})  # to_remove
-        if len(result) == 0:
-            return None
+    def __setattr__(self, key: str, value: Any) -> None:
+        super().__setattr__(key, value)
+        # any attribute write invalidates the cached `to_dict` output and marks this branch for the next diff
+        self.mark_changed()
+
+    def mark_changed(self) -> None:
+        """Mark this element as changed.
+
+        Attribute writes do this automatically, but this must be called after mutating an attribute in place
+        (eg. appending to `Multiplot.series`), otherwise a stale cached `to_dict` may be used when diffing.
+        """
+        self.__dict__["_version"] = self.__dict__.get("_version", 0) + 1
+        self.mark_dirty()
+
+    @property
+    def is_dirty(self) -> bool:
+        # elements are dirty until they've been pushed
+        return self.__dict__.get("_dirty", True)
+
+    def mark_dirty(self) -> None:
+        """Mark this element, and all its ancestors, to be visited on the next diff against the cloud state."""
+        self.__dict__["_dirty"] = True
+
+        # an element can only be dirty if all its ancestors are, so stop at the first dirty one.
+        parent = self.__dict__.get("parent")
+        while parent is not None and not parent.is_dirty:
+            parent.__dict__["_dirty"] = True
+            parent = parent.__dict__.get("parent")
+
+    def mark_clean(self) -> None:
+        """Mark this element as being in sync with the cloud state, so it is skipped on the next diff."""
+        self.__dict__["_dirty"] = False
+
+    def _own_dict(self) -> dict[str, Any]:
+        # the serialised form of this element, excluding any children
+        return self.to_dict()
+
+    def to_dict_cached(self) -> dict[str, Any]:
+        """The same as `to_dict` (excluding any children), but only re-serialised if an attribute has changed.
+
+        The returned dict is shared between calls, so must not be modified.
+        """
+        version = self.__dict__.get("_version", 0)
+        cached = self.__dict__.get("_dict_cache")
+        if cached is None or cached[0] != version:
+            cached = (version, self._own_dict())
+            self.__dict__["_dict_cache"] = cached
+        return cached[1]
 
-        return result
+    def get_diff(self, other: dict[str, Any], remove: bool = True, retain_fields: Optional[list] = []) -> Optional[dict[str, Any]]:
+        from .diff import diff_element
+        return diff_element(self, other, remove=remove, retain_fields=retain_fields)
 
     ## A stub for the method that will be called when the UI state is updated.
     # The element can choose to update its internal state based on the previous state and the new state.
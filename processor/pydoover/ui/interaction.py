@@ -173,6 +173,7 @@ class StateCommand(SlimCommand):
                 self.user_options.append(o)
             elif isinstance(o, dict):
                 self.user_options.append(Option.from_dict(o))
+        self.mark_changed()
 
     add_user_option = add_user_options
 
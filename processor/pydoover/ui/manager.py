@@ -5,15 +5,18 @@ import logging
 import time
 import json
 from datetime import datetime
+from functools import partial
 
 from typing import Union, Any, Optional, TypeVar, TYPE_CHECKING
 
+from .diff import diff_element, mark_state_changes
+from .patch import apply_merge, apply_patch, diff_to_patch, changed_element_names
 from .element import Element
 from .interaction import SlimCommand, Interaction, NotSet
 from .submodule import Container, NAME_VALIDATOR
 from .variable import Variable
 
-from ..cloud.api import Client
+from ..cloud.api import Client, NotFound
 
 from .utils import find_object_with_key, find_path_to_key
 
@@ -40,8 +43,17 @@ class UIManager:
         auto_start: bool = False,
         min_ui_update_period: int = 600,
         min_observed_update_period: int = 4,
+        patch_updates: bool = False,
+        max_pull_age: float = 0,
     ):
         self.client = client
+        # log each update as JSON-patch style operations (`{"patch": [...]}`, see `patch.py`), rather than as a
+        # merge-style diff which republishes every changed list in full. See `_publish_patch`.
+        self.patch_updates = patch_updates
+        # an HTTP client's push skips its pull if the aggregates were loaded (or pulled) less than this many seconds ago,
+        # eg. from `Client.bootstrap` earlier in the same processor run. 0 means always pull before pushing.
+        self.max_pull_age = max_pull_age
+        self._aggregates_loaded_at = None
         # to determine whether we can use event-based logic
         self._has_persistent_connection = hasattr(client, "dda_uri")
         self._subscriptions_ready = False
@@ -50,6 +62,7 @@ class UIManager:
 
         self.last_ui_state = dict()  # A python dictionary of the full state from the cloud
         self.last_ui_state_update = None
+        self._ui_state_index = dict()  # element name -> (path, state dict) in last_ui_state, see `_index_ui_state`
 
         self.last_ui_state_wss_connections = dict()
         self.last_ui_state_wss_connections_update = None
@@ -178,11 +191,15 @@ class UIManager:
                 log.error(f"Failed to decode UI commands: {payload}")
                 payload = {}
 
+        payload, ops = self._split_pending_patch(payload)
         try:
             payload = payload["cmds"]
         except KeyError:
             pass
 
+        if ops:
+            payload = self._apply_pending_patch(payload, ops)
+
         self.last_ui_cmds = payload
         self.last_ui_cmds_update = time.time()
         return payload
@@ -191,13 +208,21 @@ class UIManager:
         if not isinstance(payload, dict):
             payload = {}
 
+        payload, ops = self._split_pending_patch(payload)
         try:
             payload = payload["state"]
         except KeyError:
             pass
 
+        if ops:
+            payload = self._apply_pending_patch(payload, ops)
+
+        # anything that's changed in the cloud since we last saw it needs to be diffed again on the next push
+        mark_state_changes(self._base_container, self.last_ui_state, payload)
+
         self.last_ui_state = payload
         self.last_ui_state_update = time.time()
+        self._index_ui_state()
 
         ## TODO: Implement this ????
         # if self._base_container is not None:
@@ -205,6 +230,7 @@ class UIManager:
 
         ## Iterate through the payload and update anything that needs updating
         # define a function to recursively trawl through each element of the last ui state and allow the element to update itself
+        # (`get_element` is an index lookup, so this is a single pass over the payload)
         def update_elements_from_ui_state(d):
             for k, v in d.items():
                 if isinstance(v, dict):
@@ -216,6 +242,52 @@ class UIManager:
 
         update_elements_from_ui_state(payload)
 
+    @staticmethod
+    def _split_pending_patch(payload: Any) -> tuple[Any, Optional[list[dict[str, Any]]]]:
+        # an aggregate can hold operations published in patch mode that haven't been merged into it yet, see `_publish_patch`
+        if not isinstance(payload, dict) or "patch" not in payload:
+            return payload, None
+        ops = payload["patch"]
+        return {k: v for k, v in payload.items() if k != "patch"}, ops if isinstance(ops, list) else None
+
+    @staticmethod
+    def _apply_pending_patch(payload: Any, ops: list[dict[str, Any]]) -> Any:
+        try:
+            return apply_patch(copy.deepcopy(payload if isinstance(payload, dict) else {}), ops)
+        except (KeyError, IndexError, ValueError) as e:
+            log.warning(f"Failed to apply pending UI patch, ignoring it: {e}")
+            return payload
+
+    def _apply_ui_state_patch(self, ops: list[dict[str, Any]]):
+        # apply a delta to last_ui_state in place, rather than re-fetching the whole state
+        for name in changed_element_names(ops):
+            element = self._base_container if name is None else self.get_element(name)
+            if element is not None:
+                element.mark_dirty()
+
+        self.last_ui_state = apply_patch(self.last_ui_state or {}, ops)
+        self.last_ui_state_update = time.time()
+        self._index_ui_state()
+
+    def _index_ui_state(self):
+        # build a name -> (path, state dict) index of every element in last_ui_state in a single walk,
+        # where path is the list of keys to the element's state dict.
+        index = dict()
+        stack = [((), self.last_ui_state)]
+        while stack:
+            path, current = stack.pop()
+            children = current.get("children")
+            if not isinstance(children, dict):
+                continue
+
+            for name, state in children.items():
+                if isinstance(state, dict):
+                    child_path = path + ("children", name)
+                    index.setdefault(name, (child_path, state))
+                    stack.append((child_path, state))
+
+        self._ui_state_index = index
+
 
     def _add_interaction(self, interaction: Interaction):
         name = interaction.name.strip()
@@ -295,11 +367,22 @@ class UIManager:
         return result
     
     def get_from_ui_state(self, element_name: str) -> Optional[dict]:
-        return find_object_with_key(self.last_ui_state, element_name)
+        try:
+            return self._ui_state_index[element_name][1]
+        except KeyError:
+            # not an element name, so fall back to searching for any key with this name
+            return find_object_with_key(self.last_ui_state, element_name)
+
+    def get_ui_state_path(self, element_name: str) -> Optional[list[str]]:
+        """Get the list of keys to an element's state in `last_ui_state`, or None if it isn't there."""
+        try:
+            return list(self._ui_state_index[element_name][0])
+        except KeyError:
+            return None
 
     def update_variable(self, variable_name: str, value: Any, critical: bool = False) -> bool:
         logging.info(f"updating variable called {variable_name} to a value of {value}")
-        element = self._base_container.get_element(variable_name)
+        element = self.get_element(variable_name)
         if not (element and isinstance(element, Variable)):
             return False
 
@@ -355,28 +438,68 @@ class UIManager:
     def _publish_to_channel(self, channel_name: str, data: dict[str, Any], record_log: bool = True, timestamp: Optional[datetime] = None, **kwargs):
         # this purely exists to provide cross-compatibility between clients (hence private method).
         if isinstance(self.client, Client):
-            channel = self.client.get_channel_named(channel_name, self.agent_id)
-            return channel.publish(data, save_log=record_log, timestamp=timestamp, **kwargs)
+            channel = self.client.resolve_channel_named(channel_name, self.agent_id)
+            try:
+                return channel.publish(data, save_log=record_log, timestamp=timestamp, **kwargs)
+            except NotFound:
+                if self.client.channel_cache is None:
+                    raise
+                # the cached channel ID is stale (eg. the channel was deleted and re-created), look it up again.
+                self.client.channel_cache.invalidate(self.agent_id, channel_name)
+                channel = self.client.get_channel_named(channel_name, self.agent_id)
+                return channel.publish(data, save_log=record_log, timestamp=timestamp, **kwargs)
         else:
             # fixme: allow for timestamp in DDA message publishing...
             return self.client.publish_to_channel(channel_name, data, record_log=record_log, **kwargs)
 
+    def _publish_patch(self, channel_name: str, update: dict[str, Any], ops: list[dict[str, Any]], record_log: bool, timestamp: Optional[datetime] = None):
+        # the logged message is only the operations. Channels merge published dicts into their aggregate (and can't
+        # apply operations), so the merge-style update then brings the aggregate up to date without being logged,
+        # and removes the operations from it. Until then, the operations are applied when loading the aggregate.
+        if not ops:
+            return
+        self._publish_to_channel(channel_name, {"patch": ops}, record_log=record_log, timestamp=timestamp)
+        self._publish_to_channel(channel_name, dict(update, patch=None), record_log=False, timestamp=timestamp)
+
+    def _fetch_channel_aggregate(self, channel_name: str) -> Any:
+        # resolve the channel through the channel cache (if set), rather than looking it up by name every time.
+        channel = self.client.resolve_channel_named(channel_name, self.agent_id)
+        try:
+            return channel.fetch_aggregate()
+        except NotFound:
+            if self.client.channel_cache is None:
+                raise
+            # the cached channel ID is stale (eg. the channel was deleted and re-created), look it up again.
+            self.client.channel_cache.invalidate(self.agent_id, channel_name)
+            return self.client.get_channel_named(channel_name, self.agent_id).fetch_aggregate()
+
     def pull(self):
         print("pulling...")
         if isinstance(self.client, Client):
-            ui_cmds = self.client.get_channel_named("ui_cmds", self.agent_id)
-            ui_state = self.client.get_channel_named("ui_state", self.agent_id)
-
-            ui_cmds_agg = ui_cmds.fetch_aggregate()
-            ui_state_agg = ui_state.fetch_aggregate()
+            ui_cmds_agg, ui_state_agg = self.client.gather(
+                partial(self._fetch_channel_aggregate, "ui_cmds"),
+                partial(self._fetch_channel_aggregate, "ui_state"),
+            )
         else:
             ui_cmds_agg = self.client.get_channel_aggregate("ui_cmds")
             ui_state_agg = self.client.get_channel_aggregate("ui_state")
 
+        self.load_aggregates(ui_state_agg, ui_cmds_agg)
+
+    def load_aggregates(self, ui_state_agg: dict[str, Any], ui_cmds_agg: dict[str, Any]):
+        """Set the UI state and commands from already-fetched channel aggregates, eg. from `Client.bootstrap`."""
         self._set_new_ui_state(ui_state_agg)
         
         # self._set_new_ui_cmds(ui_cmds_agg)
         self.on_command_update(None, ui_cmds_agg)
+        self._aggregates_loaded_at = time.time()
+
+    def _aggregates_are_current(self) -> bool:
+        return (
+            self.max_pull_age > 0
+            and self._aggregates_loaded_at is not None
+            and time.time() - self._aggregates_loaded_at < self.max_pull_age
+        )
 
     def push(self,
             record_log: bool = True,
@@ -402,21 +525,32 @@ class UIManager:
             elif self.last_ui_cmds_update is None:
                 log.warning("Waiting for UI commands to be pulled before pushing...")
                 return False
-        else:
+        elif not self._aggregates_are_current():
             self.pull()  # do a pull before HTTP client pushes anything...
 
         print("pushing...")
+        # our copies of the aggregates are kept in sync with what's published, so a later push needn't pull
         commands_update = self._get_commands_update(publish_fields=publish_fields)
-        if commands_update is not None:
-            ui_cmds_msg = {"cmds": commands_update}
-
-            if only_channels is None or "ui_cmds" in only_channels:
-                self._publish_to_channel("ui_cmds", ui_cmds_msg, timestamp=timestamp)
+        if commands_update is not None and (only_channels is None or "ui_cmds" in only_channels):
+            if self.patch_updates:
+                cmds_ops = diff_to_patch(commands_update, self.last_ui_cmds or {})
+                self._publish_patch("ui_cmds", {"cmds": commands_update}, cmds_ops, record_log=True, timestamp=timestamp)
+                self.last_ui_cmds = apply_patch(self.last_ui_cmds or {}, cmds_ops)
+            else:
+                self._publish_to_channel("ui_cmds", {"cmds": commands_update}, timestamp=timestamp)
+                self.last_ui_cmds = apply_merge(self.last_ui_cmds or {}, commands_update)
 
         ui_state_update = self._get_ui_state_update(should_remove=should_remove, retain_fields=publish_fields)
         if ui_state_update is not None:
             if only_channels is None or "ui_state" in only_channels:
-                self._publish_to_channel("ui_state", ui_state_update, record_log=record_log, timestamp=timestamp)
+                if self.patch_updates:
+                    state_ops = diff_to_patch(ui_state_update["state"], self.last_ui_state or {})
+                    self._publish_patch("ui_state", ui_state_update, state_ops, record_log=record_log, timestamp=timestamp)
+                    self._apply_ui_state_patch(state_ops)
+                else:
+                    self._publish_to_channel("ui_state", ui_state_update, record_log=record_log, timestamp=timestamp)
+                    self.last_ui_state = apply_merge(self.last_ui_state or {}, ui_state_update["state"])
+                    self._index_ui_state()
         elif even_if_empty:
             if only_channels is None or "ui_state" in only_channels:
                 print("pushing empty ui state")
@@ -424,6 +558,10 @@ class UIManager:
         else:
             print("not pushing empty ui state")
 
+        if should_remove and (only_channels is None or "ui_state" in only_channels):
+            # the cloud state now matches the element tree, so unchanged elements can be skipped next push
+            self._base_container.mark_clean()
+
         self._last_pushed_time = time.time()
         self._has_critical_interaction_pending = False
         return True
@@ -457,12 +595,17 @@ class UIManager:
 
     def _get_ui_state_update(self, should_remove: bool = True, retain_fields: Optional[list] = []) -> Optional[dict[str, Any]]:
         cloud_state = self.last_ui_state or {}
-        # this recursively evaluates and finds the diff on all children, rather than trying to do the diff here
-        result = self._base_container.get_diff(cloud_state, remove=should_remove, retain_fields=retain_fields)
-
-        log.debug("Last UI State: " + str(cloud_state))
-        log.debug("New UI State: " + str(self._base_container.to_dict()))
-        log.debug("UI State Update: " + str(result))
+        # this walks the element tree and cloud state together once, only visiting branches that have changed
+        # since the last push (unless fields need to be retained, which requires a full walk). See `diff.py`.
+        result = diff_element(
+            self._base_container, cloud_state, remove=should_remove, retain_fields=retain_fields, only_dirty=not retain_fields
+        )
+
+        if log.isEnabledFor(logging.DEBUG):
+            # serialising the whole tree is expensive, so only do it if it's going to be logged
+            log.debug("Last UI State: " + str(cloud_state))
+            log.debug("New UI State: " + str(self._base_container.to_dict()))
+            log.debug("UI State Update: " + str(result))
 
         if not result or len(result) == 0:
             return None
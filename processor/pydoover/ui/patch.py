@@ -0,0 +1,160 @@
+"""A compact, RFC 6902 (JSON Patch) style delta format for `ui_state` and `ui_cmds`.
+
+The default push format is a (recursively merged) dict where any changed key is replaced in full, so changing a single
+entry of a list (eg. a `Multiplot` series) republishes the whole list. A patch is instead a list of operations,
+each of which changes exactly one value, eg.
+
+    [{"op": "replace", "path": "/children/levelPlot/series/1", "value": "tankLevel"}]
+
+Only the `add`, `remove` and `replace` operations are generated, and `test` is additionally supported when applying.
+"""
+
+import copy
+
+from typing import Any, Optional
+
+
+def _escape(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def join_path(path: str, token: Any) -> str:
+    return f"{path}/{_escape(token)}"
+
+
+def split_path(path: str) -> list[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer: {path}")
+    return [_unescape(t) for t in path[1:].split("/")]
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> list[dict[str, Any]]:
+    """Generate the operations that turn `old` into `new`, recursing into dicts and lists."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": join_path(path, k)} for k in old if k not in new]
+        for k, v in new.items():
+            if k not in old:
+                ops.append({"op": "add", "path": join_path(path, k), "value": v})
+            else:
+                ops.extend(make_patch(old[k], v, join_path(path, k)))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(make_patch(old[i], new[i], join_path(path, i)))
+        # remove from the end first, so earlier indexes stay valid
+        ops.extend({"op": "remove", "path": join_path(path, i)} for i in reversed(range(common, len(old))))
+        ops.extend({"op": "add", "path": join_path(path, i), "value": new[i]} for i in range(common, len(new)))
+        return ops
+
+    if old != new or type(old) is not type(new):
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
+
+
+def diff_to_patch(diff: Optional[dict[str, Any]], base: dict[str, Any], path: str = "") -> list[dict[str, Any]]:
+    """Convert a merge-style diff (as generated by `diff_element` or `UIManager._get_commands_update`),
+    where a None value removes a key, into patch operations against `base`.
+    """
+    ops = []
+    for k, v in (diff or {}).items():
+        key_path = join_path(path, k)
+        if v is None:
+            if k in base:
+                ops.append({"op": "remove", "path": key_path})
+        elif k not in base:
+            ops.append({"op": "add", "path": key_path, "value": v})
+        elif isinstance(v, dict) and isinstance(base[k], dict):
+            # dicts are merged into the existing value, rather than replacing it
+            ops.extend(diff_to_patch(v, base[k], key_path))
+        else:
+            ops.extend(make_patch(base[k], v, key_path))
+    return ops
+
+
+def apply_merge(doc: dict[str, Any], diff: Optional[dict[str, Any]]) -> dict[str, Any]:
+    """Apply a merge-style diff to `doc` in place (as publishing it merges it into a channel aggregate),
+    returning the updated document.
+    """
+    for k, v in (diff or {}).items():
+        if v is None:
+            doc.pop(k, None)
+        elif isinstance(v, dict) and isinstance(doc.get(k), dict):
+            apply_merge(doc[k], v)
+        else:
+            doc[k] = copy.deepcopy(v)
+    return doc
+
+
+def _resolve(doc: Any, tokens: list[str]) -> Any:
+    for token in tokens:
+        doc = doc[int(token)] if isinstance(doc, list) else doc[token]
+    return doc
+
+
+def apply_patch(doc: dict[str, Any], ops: list[dict[str, Any]]) -> dict[str, Any]:
+    """Apply patch operations to `doc` in place, returning the patched document.
+
+    Values are copied into the document, so later changes to them (or to `doc`) don't affect each other.
+    """
+    for op in ops:
+        tokens = split_path(op["path"])
+        kind = op["op"]
+
+        if kind == "test":
+            if _resolve(doc, tokens) != op["value"]:
+                raise ValueError(f"Patch test failed at {op['path']}")
+            continue
+
+        if not tokens:
+            if kind == "remove":
+                raise ValueError("Can't remove the whole document")
+            doc = copy.deepcopy(op["value"])
+            continue
+
+        parent = _resolve(doc, tokens[:-1])
+        key = tokens[-1]
+
+        if isinstance(parent, list):
+            index = len(parent) if key == "-" else int(key)
+            if kind == "add":
+                parent.insert(index, copy.deepcopy(op["value"]))
+            elif kind == "remove":
+                del parent[index]
+            elif kind == "replace":
+                parent[index] = copy.deepcopy(op["value"])
+            else:
+                raise ValueError(f"Unsupported patch operation: {kind}")
+        else:
+            if kind in ("add", "replace"):
+                parent[key] = copy.deepcopy(op["value"])
+            elif kind == "remove":
+                parent.pop(key, None)
+            else:
+                raise ValueError(f"Unsupported patch operation: {kind}")
+
+    return doc
+
+
+def changed_element_names(ops: list[dict[str, Any]]) -> set[str]:
+    """The names of the (deepest) elements each `ui_state` patch operation changes.
+
+    An operation at the root of the state (ie. not under any element) is reported as None.
+    """
+    names = set()
+    for op in ops:
+        tokens = split_path(op["path"])
+        name = None
+        for i in range(len(tokens) - 1):
+            if tokens[i] == "children":
+                name = tokens[i + 1]
+        names.add(name)
+    return names
@@ -32,50 +32,74 @@ class Container(Element):
             item.callback = func
             setattr(self, func.__name__, item)
 
-    def to_dict(self):
+    def to_dict(self, include_children: bool = True):
         result = super().to_dict()
 
         if self.status_icon is not None:
             result['statusIcon'] = self.status_icon
 
-        result["children"] = {name: c.to_dict() for name, c in self._children.items()}
+        if include_children:
+            result["children"] = {name: c.to_dict() for name, c in self._children.items()}
         return result
 
-    def get_diff(self, other: dict[str, Any], remove: bool = True, retain_fields: Optional[list] = []) -> Optional[dict[str, Any]]:
-        res = super().get_diff(other, remove=remove, retain_fields=retain_fields) or {}
-        # this will account for all the "normal" attributes, but not the children, since dicts aren't hashable
-        # (ie. you can't do dict1 == dict2 to see if they're equal)
-        other_children = other.get("children", {})
-        this_children = {name: c for name, c in self._children.items()}
-
-        children_diff = dict()
-        if remove:
-            children_diff.update({k: None for k in other_children if k not in this_children})  # to_remove
-
-        for name, child in this_children.items():
-            try:
-                diff = child.get_diff(other_children[name], remove=remove, retain_fields=retain_fields)
-                if diff is not None:
-                    children_diff[name] = diff
-            except KeyError:
-                children_diff[name] = child.to_dict()
-
-        if children_diff:
-            res["children"] = children_diff
-
-        if len(res) == 0:
-            return None
+    def _own_dict(self):
+        return self.to_dict(include_children=False)
 
-        return res
+    def mark_clean(self):
+        # children of a clean container are always clean, so only visit dirty branches
+        if not self.is_dirty:
+            return
+        for c in self._children.values():
+            c.mark_clean()
+        super().mark_clean()
 
     @property
     def children(self):
         return list(self._children.values())
 
     def set_children(self, children: list[Element]):
-        self._children.clear()
+        self.clear_children()
         self.add_children(*children)
 
+    def _get_index(self) -> dict[str, list[tuple["Container", Element]]]:
+        # a name -> [(container, element), ...] index of every descendant, so lookups don't need to search the tree.
+        # names can be used more than once in a tree, so each name maps to every element with it.
+        # this is stored directly in __dict__ so maintaining it doesn't mark the container as changed.
+        try:
+            return self.__dict__["_descendants"]
+        except KeyError:
+            self.__dict__["_descendants"] = index = dict()
+            return index
+
+    def _index_entries(self, name: str, element: Element) -> list[tuple[str, "Container", Element]]:
+        entries = [(name, self, element)]
+        if isinstance(element, Container):
+            entries.extend((k, holder, elem) for k, found in element._get_index().items() for holder, elem in found)
+        return entries
+
+    def _index_add(self, name: str, element: Element):
+        entries = self._index_entries(name, element)
+        node = self
+        while node is not None:
+            index = node._get_index()
+            for k, holder, elem in entries:
+                index.setdefault(k, []).append((holder, elem))
+            node = node.__dict__.get("parent")
+
+    def _index_remove(self, name: str, element: Element):
+        entries = self._index_entries(name, element)
+        node = self
+        while node is not None:
+            index = node._get_index()
+            for k, holder, elem in entries:
+                found = index.get(k)
+                if not found:
+                    continue
+                found[:] = [(h, e) for h, e in found if not (h is holder and e is elem)]
+                if not found:
+                    del index[k]
+            node = node.__dict__.get("parent")
+
     def add_children(self, *children: Element):
 
         if not hasattr(self, "_max_position"):
@@ -89,37 +113,58 @@ class Container(Element):
             if not NAME_VALIDATOR.match(name):
                 raise RuntimeError(f"Invalid name '{name}' for element '{c}'. Valid characters include letters, numbers, and underscores.")
 
+            existing = self._children.get(name)
+            if existing is not None and existing is not c:
+                self._index_remove(name, existing)
+
             self._children[name] = c
             c.parent = self
+            self._index_add(name, c)
 
             if not c.position:
                 c.position = self._max_position
                 self._max_position += 1
 
+        if children:
+            self.mark_dirty()
         return self
 
     def remove_children(self, *children: Element):
+        ## remove every element with the same name from this container and any nested container
         for c in children:
-            try:
-                if c.name in self._children:
-                    del self._children[c.name]
-            except KeyError:
-                pass
-        
-        ## for all self._children, call remove_children on them
-        for c in self._children.values():
-            if isinstance(c, Container):
-                c.remove_children(*children)
+            for holder, found in list(self._get_index().get(c.name, ())):
+                holder._children.pop(c.name, None)
+                holder._index_remove(c.name, found)
+                holder.mark_dirty()
+                if found.__dict__.get("parent") is holder:
+                    found.parent = None
 
     def clear_children(self):
+        for name, c in list(self._children.items()):
+            self._index_remove(name, c)
+            if c.__dict__.get("parent") is self:
+                c.parent = None
         self._children.clear()
+        self.mark_dirty()
 
     def get_element(self, element_name: str) -> Optional[Element]:
+        """Find an element by name in this container or any nested container.
+
+        If more than one element has the name, a direct child is returned first, otherwise the first found
+        depth-first (in the order children were added).
+        """
         try:
             return self._children[element_name]
         except KeyError:
             pass
 
+        found = self._get_index().get(element_name)
+        if not found:
+            return None
+        if len(found) == 1:
+            return found[0][1]
+
+        # the name is used more than once, so search the tree for the first one (using each container's index)
         for element in self._children.values():
             if isinstance(element, Container):
                 elem = element.get_element(element_name)
@@ -138,8 +183,8 @@ class Submodule(Container):
         self.status = status or kwargs.pop("status_string", None)
         self.collapsed = is_collapsed or kwargs.pop("collapsed", False)
 
-    def to_dict(self):
-        result = super().to_dict()
+    def to_dict(self, include_children: bool = True):
+        result = super().to_dict(include_children=include_children)
         if self.status is not None:
             result['statusString'] = self.status
         # result['isCollapsed'] = self.collapsed()
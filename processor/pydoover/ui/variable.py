@@ -83,6 +83,7 @@ class Variable(Element):
                 self.ranges.append(r)
             elif isinstance(r, dict):
                 self.ranges.append(Range.from_dict(r))
+        self.mark_changed()
 
 
 class NumericVariable(Variable):
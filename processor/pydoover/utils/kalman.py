@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
-import time, logging
+import os, time, logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 ## A simple 1D Kalman filter implementation
@@ -131,6 +136,332 @@ class KalmanFilter1D:
         return self.estimate
     
 
+## A bank of independent 1D Kalman filters, updated together with NumPy
+## This applies exactly the same predict / update and outlier logic as KalmanFilter1D, for N channels (e.g. the tank levels of every sensor in a sweep) in one call.
+## The state of every channel is held in arrays (estimate, error_estimate, process_variance, ...), with NaN standing in for None.
+
+## Channels can be left out of an update by passing a NaN measurement for them, or with a boolean mask.
+## dt is computed per channel from the time since that channel was last updated, using a single clock read for the whole call, unless dts are provided.
+
+## This requires numpy to be installed.
+
+class KalmanFilterBank:
+
+    def __init__(self, size, initial_estimate=None, initial_error_estimate=None, process_variance=None, outlier_protection=None, outlier_threshold=None, outlier_variance_multiplier=None, clock=None):
+
+        if np is None:
+            raise RuntimeError("numpy must be installed to use KalmanFilterBank.")
+
+        self.size = size
+        self.clock = clock or time.time
+
+        ## The same defaults as KalmanFilter1D
+        self.default_process_variance = 0.5
+        self.default_initial_estimate_ratio = 25
+        self.default_measurement_variance = 0.5
+        self.default_outlier_threshold = 5
+        self.default_outlier_variance_multiplier = 25
+
+        self.estimate = self._values(initial_estimate)
+        self.error_estimate = self._values(initial_error_estimate)
+        self.process_variance = self._values(process_variance, self.default_process_variance, zero_is_default=True)
+        self.outlier_threshold = self._values(outlier_threshold, self.default_outlier_threshold, zero_is_default=True)
+        self.outlier_variance_multiplier = self._values(outlier_variance_multiplier, self.default_outlier_variance_multiplier, zero_is_default=True)
+
+        if outlier_protection is None:
+            outlier_protection = True
+        self.outlier_protection = np.broadcast_to(np.asarray(outlier_protection, dtype=bool), (size,)).copy()
+
+        self.kalman_gain = np.zeros(size)
+        self.last_timestamp = np.full(size, np.nan)
+        self.last_outliers = np.zeros(size, dtype=bool)  # Which channels were treated as outliers in the last update
+
+    @classmethod
+    def from_filters(cls, filters, clock=None):
+        ## Create a bank with the state of existing KalmanFilter1D instances, one channel per filter
+        def values(name):
+            return [getattr(f, name) if getattr(f, name) is not None else np.nan for f in filters]
+
+        bank = cls(
+            len(filters),
+            initial_estimate=values("estimate"),
+            initial_error_estimate=values("error_estimate"),
+            process_variance=values("process_variance"),
+            outlier_protection=[f.outlier_protection for f in filters],
+            outlier_threshold=values("outlier_threshold"),
+            outlier_variance_multiplier=values("outlier_variance_multiplier"),
+            clock=clock,
+        )
+        bank.kalman_gain[:] = values("kalman_gain")
+        bank.last_timestamp[:] = values("last_timestamp")
+        return bank
+
+    def __len__(self):
+        return self.size
+
+    def _values(self, values, default=float("nan"), zero_is_default=False):
+        ## Broadcast a scalar or sequence (with None / NaN for missing values) to a float array of one value per channel
+        if values is None:
+            return np.full(self.size, default, dtype=float)
+        values = np.array(np.broadcast_to(np.asarray(values, dtype=float), (self.size,)))
+        missing = np.isnan(values)
+        if zero_is_default:
+            missing |= values == 0
+        values[missing] = default
+        return values
+
+    def update(self, measurements, dts=None, mask=None, measurement_variance=None, outlier_protection=None, process_variance=None):
+
+        active = np.ones(self.size, dtype=bool) if mask is None else np.array(np.broadcast_to(np.asarray(mask, dtype=bool), (self.size,)))
+
+        ## As KalmanFilter1D, a new process variance is kept even for channels without a measurement
+        if process_variance is not None:
+            process_variance = self._values(process_variance)
+            changed = active & ~np.isnan(process_variance)
+            self.process_variance[changed] = process_variance[changed]
+
+        ## Channels without a measurement keep their last estimate
+        measurements = self._values(measurements)
+        active &= ~np.isnan(measurements)
+
+        measurement_variance = self._values(measurement_variance, self.default_measurement_variance, zero_is_default=True)
+
+        ## Initialise the error estimate of new channels from the first measurement variance
+        uninitialised = active & np.isnan(self.error_estimate)
+        self.error_estimate[uninitialised] = measurement_variance[uninitialised] * self.default_initial_estimate_ratio
+
+        ## One clock read for every channel
+        current_time = self.clock()
+
+        ## The first measurement of a channel becomes its estimate
+        first = active & np.isnan(self.estimate)
+        self.estimate[first] = measurements[first]
+        self.last_timestamp[first] = current_time
+
+        idx = np.flatnonzero(active & ~first)
+        self.last_outliers[:] = False
+        if idx.size == 0:
+            return self.estimate.copy()
+
+        ## If dt is not provided, calculate it based on the time since the last update (1 second if there wasn't one)
+        computed_dt = np.where(np.isnan(self.last_timestamp[idx]), 1.0, current_time - self.last_timestamp[idx])
+        if dts is None:
+            dt = computed_dt
+        else:
+            dt = self._values(dts)[idx]
+            dt = np.where(np.isnan(dt), computed_dt, dt)
+        self.last_timestamp[idx] = current_time
+
+        measurement = measurements[idx]
+        estimate = self.estimate[idx]
+        error_estimate = self.error_estimate[idx]
+        measurement_variance = measurement_variance[idx]
+
+        # If the measurement is an outlier, increase the measurement variance
+        if outlier_protection is None:
+            protected = self.outlier_protection[idx]
+        else:
+            protected = np.broadcast_to(np.asarray(outlier_protection, dtype=bool), (self.size,))[idx]
+        outliers = protected & (np.abs(measurement - estimate) > self.outlier_threshold[idx] * error_estimate)
+        measurement_variance = np.where(outliers, measurement_variance * self.outlier_variance_multiplier[idx], measurement_variance)
+        self.last_outliers[idx] = outliers
+
+        # Prediction step
+        error_estimate = error_estimate + self.process_variance[idx] * dt
+
+        # Update step (avoiding division by zero, as KalmanFilter1D does)
+        denominator = error_estimate + measurement_variance
+        kalman_gain = error_estimate / np.where(denominator == 0, 0.0001, denominator)
+        estimate = estimate + kalman_gain * (measurement - estimate)
+        error_estimate = (1 - kalman_gain) * error_estimate
+
+        self.estimate[idx] = estimate
+        self.error_estimate[idx] = error_estimate
+        self.kalman_gain[idx] = kalman_gain
+
+        return self.estimate.copy()
+
+
+
+## Filtering and smoothing of whole (historical) series, e.g. to rebuild a plot of tank levels after a sensor fault
+## kalman_filter_series runs the same filter as KalmanFilter1D forwards over a series, with dt taken from the timestamps.
+## kalman_smooth_series then runs a Rauch-Tung-Striebel backward pass, so every estimate also uses the measurements after it.
+
+## The series are processed in chunks, so the inputs can be memory-mapped arrays (e.g. from np.load(path, mmap_mode="r") or ChannelArchive.read)
+## and, with out_dir, the outputs are written to memory-mapped .npy files, so multi-year histories don't need to fit in memory.
+## Only the chunked I/O uses numpy: each step depends on the one before, so the filter (and the backward pass) still loops over
+## every sample in Python, one series at a time. To filter many series step by step with numpy, use KalmanFilterBank.
+## Samples without a measurement (NaN) are skipped by the filter, and are NaN in the output.
+
+## This requires numpy to be installed.
+
+def _series_array(out_dir, name, length):
+    if out_dir is None:
+        return np.empty(length)
+    return np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+", dtype=np.float64, shape=(length,))
+
+
+def _filter_series(timestamps, measurements, measurement_variance, kf, chunk_size, estimate_out, error_out, predicted_out):
+
+    ## Resolve the parameters once (with the same defaults as KalmanFilter1D), and keep them local for speed
+    x, P = kf.estimate, kf.error_estimate
+    q = kf.process_variance
+    default_variance = kf.default_measurement_variance
+    ratio = kf.default_initial_estimate_ratio
+    protect = kf.outlier_protection
+    threshold = kf.outlier_threshold
+    multiplier = kf.outlier_variance_multiplier
+    last_t = None
+
+    nan = float("nan")
+    length = len(measurements)
+    per_sample_variance = measurement_variance is not None and np.ndim(measurement_variance) > 0
+
+    for start in range(0, length, chunk_size):
+        stop = min(start + chunk_size, length)
+        ts = np.asarray(timestamps[start:stop], dtype=float).tolist()
+        ms = np.asarray(measurements[start:stop], dtype=float).tolist()
+        if per_sample_variance:
+            vs = np.asarray(measurement_variance[start:stop], dtype=float).tolist()
+        else:
+            vs = [measurement_variance] * (stop - start)
+
+        xs = [nan] * (stop - start)
+        ps = [nan] * (stop - start)
+        pps = [nan] * (stop - start)
+
+        ## The recursion is sequential in time, so it runs over plain floats rather than array elements
+        for i, m in enumerate(ms):
+            if m != m:
+                continue
+
+            v = vs[i]
+            if not v or v != v:
+                v = default_variance
+
+            if P is None:
+                P = v * ratio
+            if x is None:
+                x = m
+                last_t = ts[i]
+                xs[i], ps[i] = x, P
+                continue
+
+            dt = 1 if last_t is None else ts[i] - last_t
+            last_t = ts[i]
+
+            if protect and abs(m - x) > threshold * P:
+                v *= multiplier
+
+            P += q * dt
+            pps[i] = P
+
+            denominator = P + v
+            k = P / (denominator if denominator != 0 else 0.0001)
+            x += k * (m - x)
+            P = (1 - k) * P
+            xs[i], ps[i] = x, P
+
+        estimate_out[start:stop] = xs
+        error_out[start:stop] = ps
+        if predicted_out is not None:
+            predicted_out[start:stop] = pps
+
+
+def _check_series(timestamps, measurements, measurement_variance):
+    if np is None:
+        raise RuntimeError("numpy must be installed to filter or smooth series.")
+    if len(timestamps) != len(measurements):
+        raise ValueError(f"timestamps and measurements must be the same length ({len(timestamps)} != {len(measurements)})")
+    if measurement_variance is not None and np.ndim(measurement_variance) > 0 and len(measurement_variance) != len(measurements):
+        raise ValueError("measurement_variance must be a scalar or the same length as measurements")
+
+
+def kalman_filter_series(
+        timestamps,
+        measurements,
+        measurement_variance=None,
+        initial_estimate=None,
+        initial_error_estimate=None,
+        process_variance=None,
+        outlier_protection=None,
+        outlier_threshold=None,
+        outlier_variance_multiplier=None,
+        chunk_size=65536,
+        out_dir=None,
+    ):
+    ## Run KalmanFilter1D forwards over a series, returning arrays of the (filtered) estimates and error estimates
+    ## The estimates are the same as calling KalmanFilter1D.update for each measurement, with dt as the time since the last measurement.
+    ## This is a per-sample Python loop (over plain floats), not vectorised, see above.
+    _check_series(timestamps, measurements, measurement_variance)
+
+    kf = KalmanFilter1D(initial_estimate, initial_error_estimate, process_variance, outlier_protection, outlier_threshold, outlier_variance_multiplier)
+    estimate = _series_array(out_dir, "estimate", len(measurements))
+    error_estimate = _series_array(out_dir, "error_estimate", len(measurements))
+    _filter_series(timestamps, measurements, measurement_variance, kf, chunk_size, estimate, error_estimate, None)
+    return estimate, error_estimate
+
+
+def kalman_smooth_series(
+        timestamps,
+        measurements,
+        measurement_variance=None,
+        initial_estimate=None,
+        initial_error_estimate=None,
+        process_variance=None,
+        outlier_protection=None,
+        outlier_threshold=None,
+        outlier_variance_multiplier=None,
+        chunk_size=65536,
+        out_dir=None,
+    ):
+    ## Filter a series forwards (as kalman_filter_series) and smooth it with a Rauch-Tung-Striebel backward pass,
+    ## returning arrays of the smoothed estimates and error estimates. Both passes are per-sample Python loops, not vectorised.
+    _check_series(timestamps, measurements, measurement_variance)
+
+    length = len(measurements)
+    kf = KalmanFilter1D(initial_estimate, initial_error_estimate, process_variance, outlier_protection, outlier_threshold, outlier_variance_multiplier)
+    estimate = _series_array(out_dir, "estimate", length)
+    error_estimate = _series_array(out_dir, "error_estimate", length)
+    ## The predicted error estimates (before each update) are only needed for the backward pass
+    predicted = _series_array(out_dir, "_predicted_error_estimate", length)
+
+    try:
+        _filter_series(timestamps, measurements, measurement_variance, kf, chunk_size, estimate, error_estimate, predicted)
+
+        ## Backward pass, from the last chunk to the first, updating the filtered estimates in place
+        ## With a random walk model, the prediction for each sample is the previous estimate, so
+        ## C = P[k] / P_pred[k+1], x_s[k] = x[k] + C * (x_s[k+1] - x[k]), P_s[k] = P[k] + C^2 * (P_s[k+1] - P_pred[k+1])
+        next_x = next_P = next_predicted = None
+        for stop in range(length, 0, -chunk_size):
+            start = max(0, stop - chunk_size)
+            xs = np.asarray(estimate[start:stop]).tolist()
+            ps = np.asarray(error_estimate[start:stop]).tolist()
+            pps = np.asarray(predicted[start:stop]).tolist()
+
+            for i in range(stop - start - 1, -1, -1):
+                x = xs[i]
+                if x != x:
+                    continue
+
+                if next_x is not None:
+                    gain = ps[i] / next_predicted if next_predicted else 0.0
+                    xs[i] = x + gain * (next_x - x)
+                    ps[i] = ps[i] + gain * gain * (next_P - next_predicted)
+                next_x, next_P, next_predicted = xs[i], ps[i], pps[i]
+
+            estimate[start:stop] = xs
+            error_estimate[start:stop] = ps
+    finally:
+        if out_dir is not None:
+            path = predicted.filename
+            del predicted
+            os.remove(path)
+
+    return estimate, error_estimate
+
+
+
 ## A decorator to apply a Kalman filter to the return value of a function
 ## The function should return a single value (e.g., a sensor reading)
 ## See below for an example of how to use this decorator
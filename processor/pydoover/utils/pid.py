@@ -1,5 +1,236 @@
 import time
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class SimulatedClock:
+
+    def __init__(self, start=0.0):
+        """
+        A clock that only moves when told to, for running controllers faster than real time.
+
+        :param start: The initial time, in seconds
+        """
+        self.time = float(start)
+
+    def __call__(self):
+        return self.time
+
+    def set(self, t):
+        """
+        Set the current time.
+
+        :param t: The new time, in seconds
+        """
+        self.time = float(t)
+
+    def advance(self, dt):
+        """
+        Move the clock forward.
+
+        :param dt: The number of seconds to advance by
+        """
+        self.time += dt
+
+
+class PIDBank:
+
+    def __init__(self, Kp, Ki, Kd, setpoint=0, output_limits=(None, None), size=None, anti_windup=False, clock=None):
+        """
+        A bank of independent PID loops (e.g. the pressure loops of many pumps), updated together with numpy.
+
+        Each loop behaves as a `PID` with the same parameters. Gains, setpoints and limits can be scalars (shared by every loop)
+        or one value per loop; None (or NaN) limits are unbounded. This requires numpy to be installed.
+
+        :param Kp: Proportional gain(s)
+        :param Ki: Integral gain(s)
+        :param Kd: Derivative gain(s)
+        :param setpoint: The target value(s) for each loop
+        :param output_limits: Tuple (min_output, max_output) for limiting outputs
+        :param size: The number of loops, if not given by the length of the other parameters
+        :param anti_windup: Whether to stop integrating while a loop's output is saturated in the direction of its error. `PID` doesn't do this, so it's off by default.
+        :param clock: A function returning the current time in seconds, read once per update. Defaults to `time.time`, see `SimulatedClock`.
+        """
+        if np is None:
+            raise RuntimeError("numpy must be installed to use PIDBank.")
+
+        if size is None:
+            size = max(np.size(v) for v in (Kp, Ki, Kd, setpoint, output_limits[0], output_limits[1]))
+        self.size = size
+        self.anti_windup = anti_windup
+        self.clock = clock or time.time
+
+        self.Kp = self._values(Kp)
+        self.Ki = self._values(Ki)
+        self.Kd = self._values(Kd)
+        self.setpoint = self._values(setpoint)
+        self.set_output_limits(*output_limits)
+
+        self._last_time = np.full(size, np.nan)
+        self._last_error = np.full(size, np.nan)
+        self._integral = np.zeros(size)
+        self._last_output = np.zeros(size)
+
+    @classmethod
+    def from_controllers(cls, controllers, anti_windup=False, clock=None):
+        """
+        Create a bank with the parameters and state of existing `PID` controllers, one loop per controller.
+
+        :param controllers: A list of `PID` instances
+        """
+        def values(name):
+            return [v if v is not None else np.nan for v in (getattr(c, name) for c in controllers)]
+
+        bank = cls(
+            values("Kp"), values("Ki"), values("Kd"), values("setpoint"),
+            output_limits=(
+                [c.output_limits[0] if c.output_limits[0] is not None else np.nan for c in controllers],
+                [c.output_limits[1] if c.output_limits[1] is not None else np.nan for c in controllers],
+            ),
+            size=len(controllers),
+            anti_windup=anti_windup,
+            clock=clock,
+        )
+        bank._last_time[:] = values("_last_time")
+        bank._last_error[:] = values("_last_error")
+        bank._integral[:] = values("_integral")
+        bank._last_output[:] = values("_last_output")
+        return bank
+
+    def __len__(self):
+        return self.size
+
+    def _values(self, values, default=float("nan")):
+        if values is None:
+            return np.full(self.size, default)
+        values = np.array(np.broadcast_to(np.asarray(values, dtype=float), (self.size,)))
+        values[np.isnan(values)] = default
+        return values
+
+    def update(self, feedback_values, dt=None, mask=None):
+        """
+        Update every loop with its current feedback value.
+
+        :param feedback_values: The current value from each process. Loops with a NaN value are left unchanged.
+        :param dt: Optional time interval(s), per loop or shared. If not provided (or NaN), it's calculated from the time since each loop's last update.
+        :param mask: Optional boolean array of the loops to update
+        :return: An array of the control output of every loop
+        """
+        current_time = self.clock()
+        feedback_values = self._values(feedback_values)
+        error = self.setpoint - feedback_values
+
+        active = ~np.isnan(feedback_values)
+        if mask is not None:
+            active &= np.broadcast_to(np.asarray(mask, dtype=bool), (self.size,))
+
+        # First call, just initialise (the output stays as the last output)
+        first = active & np.isnan(self._last_time)
+        self._last_time[first] = current_time
+        self._last_error[first] = error[first]
+
+        idx = np.flatnonzero(active & ~first)
+        if idx.size == 0:
+            return self._last_output.copy()
+
+        # Calculate time difference (dt) if not provided
+        delta_time = current_time - self._last_time[idx]
+        if dt is not None:
+            given = self._values(dt)[idx]
+            delta_time = np.where(np.isnan(given), delta_time, given)
+
+        # Ensure we don't update too frequently
+        ready = delta_time > 0.0
+        idx, delta_time, error = idx[ready], delta_time[ready], error[idx][ready]
+
+        Kp, Ki, Kd = self.Kp[idx], self.Ki[idx], self.Kd[idx]
+        min_output, max_output = self._min_output[idx], self._max_output[idx]
+
+        proportional = Kp * error
+        integral_state = self._integral[idx] + error * delta_time
+        derivative = Kd * ((error - self._last_error[idx]) / delta_time)
+        output = proportional + Ki * integral_state + derivative
+
+        if self.anti_windup:
+            # Don't integrate further into saturation: keep the previous integral where the output is past a limit
+            # and the error would push it further past it.
+            growth = Ki * error
+            windup = ((output > max_output) & (growth > 0)) | ((output < min_output) & (growth < 0))
+            integral_state = np.where(windup, self._integral[idx], integral_state)
+            output = np.where(windup, proportional + Ki * integral_state + derivative, output)
+
+        # Limit the outputs to the specified limits
+        output = np.minimum(np.maximum(output, min_output), max_output)
+
+        # Store values for the next loop iteration
+        self._integral[idx] = integral_state
+        self._last_output[idx] = output
+        self._last_time[idx] = current_time
+        self._last_error[idx] = error
+
+        return self._last_output.copy()
+
+    def replay(self, timestamps, feedback_values):
+        """
+        Run the loops over recorded feedback, in simulated time (as fast as possible, and deterministically).
+
+        :param timestamps: A sequence of T timestamps (in seconds), one per row of feedback
+        :param feedback_values: An array of shape (T, size) of feedback values (NaN where a loop has no value)
+        :return: An array of shape (T, size) of the control outputs after each row
+        """
+        clock = self.clock
+        simulated = SimulatedClock()
+        self.clock = simulated
+        try:
+            outputs = np.empty((len(timestamps), self.size))
+            for i, (t, row) in enumerate(zip(timestamps, feedback_values)):
+                simulated.set(t)
+                outputs[i] = self.update(row)
+            return outputs
+        finally:
+            self.clock = clock
+
+    def set_output_limits(self, min_output, max_output):
+        """
+        Set the minimum and maximum output limits.
+
+        :param min_output: Minimum limit(s), None for unbounded
+        :param max_output: Maximum limit(s), None for unbounded
+        """
+        self.output_limits = (min_output, max_output)
+        self._min_output = self._values(min_output, -np.inf)
+        self._max_output = self._values(max_output, np.inf)
+
+    def set_setpoint(self, setpoint, mask=None):
+        """
+        Set new target values for the loops to reach.
+
+        :param setpoint: The target value(s)
+        :param mask: Optional boolean array of the loops to set
+        """
+        setpoint = self._values(setpoint)
+        if mask is None:
+            self.setpoint = setpoint
+        else:
+            mask = np.broadcast_to(np.asarray(mask, dtype=bool), (self.size,))
+            self.setpoint[mask] = setpoint[mask]
+
+    def reset(self, mask=None):
+        """
+        Reset the internal state of the loops.
+
+        :param mask: Optional boolean array of the loops to reset, defaults to all of them
+        """
+        mask = slice(None) if mask is None else np.broadcast_to(np.asarray(mask, dtype=bool), (self.size,))
+        self._last_time[mask] = np.nan
+        self._last_error[mask] = np.nan
+        self._integral[mask] = 0
+        self._last_output[mask] = 0
+
+
 class PID:
 
     def __init__(self, Kp, Ki, Kd, setpoint=0, output_limits=(None, None)):
@@ -1,3 +1,9 @@
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 ## A function to map a reading to a value in a range
@@ -29,6 +35,68 @@ def map_reading(in_val, output_values, raw_readings=[4,20], ignore_below=3):
     return output_values[lower_val_ind] + (valueScaled * outSpan)
 
 
+## A precompiled calibration table, to map arrays of readings (e.g. 4-20mA samples) in bulk
+## Mapping is the same as map_reading for every value (including extrapolating beyond the ends of raw_readings),
+## with NaN in place of None for values below ignore_below (or NaN values).
+## This requires numpy to be installed.
+class CalibrationTable:
+
+    def __init__(self, output_values, raw_readings=[4,20], ignore_below=3):
+        if np is None:
+            raise RuntimeError("numpy must be installed to use CalibrationTable.")
+        if len(raw_readings) < 2 or len(raw_readings) != len(output_values):
+            raise ValueError("raw_readings and output_values must be the same length, with at least 2 values")
+
+        self.raw_readings = np.asarray(raw_readings, dtype=float)
+        self.output_values = np.asarray(output_values, dtype=float)
+        self.ignore_below = ignore_below
+        self.ascending = bool(np.all(np.diff(self.raw_readings) >= 0))
+
+        ## The segment for a value is indexed by lower_val_ind + 1 (0 to len - 1), as a lower_val_ind of -1 is possible in map_reading
+        ## (i.e. values at or below the first reading use the span between the last and first readings).
+        lower = np.arange(-1, len(raw_readings) - 1)
+        self._raw_lower = self.raw_readings[lower]
+        self._output_lower = self.output_values[lower]
+        self._in_span = self.raw_readings[lower + 1] - self._raw_lower
+        self._out_span = self.output_values[lower + 1] - self._output_lower
+
+    def segments(self, values):
+        ## The index of the first raw reading each value is less than or equal to (as map_reading searches for),
+        ## or the last segment if there isn't one
+        n = len(self.raw_readings)
+        if self.ascending:
+            first = np.searchsorted(self.raw_readings, values, side="left")
+        else:
+            ## Not sorted, so compare against every reading (there are only ever a few)
+            below = values[..., None] <= self.raw_readings
+            first = np.where(below.any(axis=-1), below.argmax(axis=-1), n)
+        return np.where(first >= n, n - 1, first)
+
+    def __call__(self, values):
+        values = np.asarray(values, dtype=float)
+        segment = self.segments(values)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = self._output_lower[segment] + ((values - self._raw_lower[segment]) / self._in_span[segment]) * self._out_span[segment]
+
+        ## NaN compares false, so NaN values are NaN in the result anyway
+        return np.where(values < self.ignore_below, np.nan, result)
+
+
+@functools.lru_cache(maxsize=64)
+def _calibration_table(output_values, raw_readings, ignore_below):
+    return CalibrationTable(output_values, raw_readings, ignore_below)
+
+
+## An array version of map_reading, mapping every value in values in one call
+## The calibration table for each (output_values, raw_readings, ignore_below) is compiled once and reused between calls.
+## Returns an array of floats, with NaN where map_reading would return None.
+def map_readings(values, output_values, raw_readings=[4,20], ignore_below=3):
+    if isinstance(output_values, CalibrationTable):
+        return output_values(values)
+    return _calibration_table(tuple(output_values), tuple(raw_readings), ignore_below)(values)
+
+
 def find_object_with_key(obj, key_to_find):
     stack = [obj]
 
@@ -1,14 +1,17 @@
 import logging, json, time
-# from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+from functools import partial
 
 from pydoover.cloud.processor import ProcessorBase
 from pydoover import ui
 
 from farmo_client import Client as FarmoClient
-# from farmo_client import ScheduleManager as FarmoScheduleManager
-# from farmo_client import ScheduleItem as FarmoScheduleItem
+from farmo_client import ScheduleManager as FarmoScheduleManager
+from farmo_client import ScheduleItem as FarmoScheduleItem
+from farmo_client import TimeslotIndex as FarmoTimeslotIndex
 
 from farmo_client import PumpMode, TankSensor, PumpController
+from farmo_client import DeviceStateCache
 
 from ui import construct_ui
 
@@ -18,22 +21,40 @@ class target(ProcessorBase):
     def setup(self):
 
         self.uplink_channel_name = "farmo_uplink_recv"
+        ## Where the last uplink ingested in batch mode is recorded, see `on_uplink_batch`
+        self.uplink_ingest_channel_name = "farmo_uplink_ingest"
 
-        # Get the required channels
-        self.ui_state_channel = self.api.create_channel("ui_state", self.agent_id)
-        self.ui_cmds_channel = self.api.create_channel("ui_cmds", self.agent_id)
+        ## In batch mode, an uplink with newer ones after it is ingested by the invocation for the latest, so skip everything
+        self.superseded_uplink = self.is_superseded_uplink()
+        if self.superseded_uplink:
+            logging.info("A newer uplink will ingest this one - skipping processing")
+            return
+
+        channel_names = ["ui_state", "ui_cmds", "significantEvent", self.uplink_channel_name, "schedules"]
+        if self.is_batching_uplinks():
+            channel_names.append(self.uplink_ingest_channel_name)
+
+        # Get the required channels, along with their aggregates and the last uplink, in one pass
+        channels = self.bootstrap_channels(
+            channels=channel_names,
+            with_last_message=[self.uplink_channel_name],
+            create_missing=True,
+        )
+        self.ui_state_channel = channels["ui_state"]
+        self.ui_cmds_channel = channels["ui_cmds"]
         
-        self.significant_event_channel = self.api.create_channel("significantEvent", self.agent_id)
+        self.significant_event_channel = channels["significantEvent"]
         # self.activity_log_channel = self.api.create_channel("activity_log", self.agent_id)
-        self.uplink_channel = self.api.create_channel(self.uplink_channel_name, self.agent_id)
+        self.uplink_channel = channels[self.uplink_channel_name]
 
-        self.pump_schedules_channel = self.api.create_channel("schedules", self.agent_id)
+        self.pump_schedules_channel = channels["schedules"]
+        self.uplink_ingest_channel = channels.get(self.uplink_ingest_channel_name)
 
         self.construct_ui()
 
     def construct_ui(self):
         # Construct the UI
-        self.ui_manager.pull()
+        self.ui_manager.load_aggregates(self.ui_state_channel.aggregate, self.ui_cmds_channel.aggregate)
         self._ui_elements = construct_ui(self)
         self.ui_manager.set_children(self._ui_elements)
 
@@ -51,10 +72,32 @@ class target(ProcessorBase):
             self._farmo_client = FarmoClient()
         return self._farmo_client
 
+    def get_device_state_cache(self):
+        ## With warm state, persist device state (eg. tank level) so warm invocations don't re-fetch it from Farmo.
+        ## It's written once at the end of the run (see `close`), otherwise it's only kept in memory for this run.
+        if not hasattr(self, "_device_state_cache"):
+            if self.warm_state is not None:
+                store = self.warm_state.section(self.agent_id, "farmo_device_cache")
+                self._device_state_cache = DeviceStateCache(store=store, autosave=False)
+            else:
+                self._device_state_cache = DeviceStateCache()
+        return self._device_state_cache
+
+    def skip_unchanged_farmo_settings(self):
+        ## Opt in to only sending the tank sensor and thresholds to Farmo when they change, see `Device`
+        return bool(self.package_config.get("skip_unchanged_farmo_settings"))
+
+    def close(self):
+        if hasattr(self, "_device_state_cache"):
+            self._device_state_cache.flush()
+
     def get_pump_controller_obj(self):
         if not hasattr(self, "_pump_controller"):
             imei = self.get_imei()
-            self._pump_controller = PumpController(self.get_farmo_client(), imei)
+            self._pump_controller = PumpController(
+                self.get_farmo_client(), imei,
+                cache=self.get_device_state_cache(), skip_unchanged_settings=self.skip_unchanged_farmo_settings(),
+            )
         return self._pump_controller
 
     def get_tank_sensor_obj(self):
@@ -76,7 +119,10 @@ class target(ProcessorBase):
 
         logging.info(f"Target tank sensor: {target_tank_imei}")
         if not hasattr(self, "_tank_sensor") or self._tank_sensor.imei != target_tank_imei:
-            self._tank_sensor = TankSensor(self.get_farmo_client(), target_tank_imei)
+            self._tank_sensor = TankSensor(
+                self.get_farmo_client(), target_tank_imei,
+                cache=self.get_device_state_cache(), skip_unchanged_settings=self.skip_unchanged_farmo_settings(),
+            )
         return self._tank_sensor
 
     def get_available_tank_sensors(self):
@@ -131,10 +177,64 @@ class target(ProcessorBase):
             ss_button.colour = "green"
         self.ui_manager.update_interaction("startStopNow", ss_button)
 
+    def configure_tank_sensor(self, tank_sensor_obj, tank_level_triggers):
+        ## The tank sensor and thresholds are sent on every run, unless `skip_unchanged_farmo_settings` is set
+        ## and they're the same as last sent (see `Device`)
+        pump_controller = self.get_pump_controller_obj()
+        sensor_changed = pump_controller.tank_sensor_changed(tank_sensor_obj)
+        thresholds_changed = bool(tank_level_triggers) and tank_sensor_obj.tank_threshold_changed(tank_level_triggers[0], tank_level_triggers[1])
+        if not (sensor_changed or thresholds_changed):
+            logging.info("Tank sensor and thresholds are unchanged")
+            return
+
+        ## Assigning the tank sensor to the pump and setting the tank's thresholds are independent Farmo calls,
+        ## so make them concurrently. This uses the Farmo client's threads (see `FarmoClient.gather`) rather than the
+        ## async client, since it's on every run's path and importing aiohttp would cost more than it saves.
+        calls = []
+        if sensor_changed:
+            calls.append(partial(pump_controller.set_tank_sensor, tank_sensor_obj))
+        if thresholds_changed:
+            calls.append(partial(tank_sensor_obj.set_tank_threshold, tank_level_triggers[0], tank_level_triggers[1]))
+
+        results = iter(self.get_farmo_client().gather(*calls))
+        if sensor_changed:
+            logging.info(f"Result of setting tank sensor: {next(results)}")
+        if thresholds_changed:
+            logging.info(f"Result of setting tank thresholds: {next(results)}")
+
+    def run_pump_command(self, command, tank_sensor_obj):
+        ## The tank level (read in `on_uplink`) doesn't depend on the pump command, so fetch it into the device cache at
+        ## the same time, as in `configure_tank_sensor`.
+        if not tank_sensor_obj:
+            return command()
+
+        result, tank_level = self.get_farmo_client().gather(command, self.get_pump_controller_obj().get_tank_level, return_exceptions=True)
+        if isinstance(tank_level, Exception):
+            logging.info(f"Failed to prefetch tank level: {tank_level}")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def is_batching_uplinks(self):
+        ## Ingest bursts of uplinks in one run, see `on_uplink_batch`
+        return bool(self.package_config.get("batch_uplinks"))
+
+    def is_superseded_uplink(self):
+        if not self.is_batching_uplinks() or self.package_config.get("message_type") != "UPLINK":
+            return False
+        if not (self.message and self.message.id and self.message.channel_id) or self.message.channel_name != self.uplink_channel_name:
+            return False
+        ## Listing the latest message is much lighter than bootstrapping the channels
+        latest = self.api.get_channel_messages(self.message.channel_id, 1)
+        return bool(latest) and latest[0].id != self.message.id
+
     def get_warning_indicator(self):
         return ui.WarningIndicator("pendingCommand", "Waiting for pump controller to receive command")
 
     def process(self):
+        if self.superseded_uplink:
+            return
+
         message_type = self.package_config.get("message_type")
 
         if message_type == "DEPLOY":
@@ -142,8 +242,11 @@ class target(ProcessorBase):
         elif message_type == "DOWNLINK":
             self.on_downlink()
         elif message_type == "UPLINK":
-            # self.on_uplink()
-            self.on_downlink()
+            if self.is_batching_uplinks():
+                self.on_uplink_batch()
+            else:
+                # self.on_uplink()
+                self.on_downlink()
         elif message_type == "SCHEDULE_UPDATE":
             self.on_schedule_update()
 
@@ -171,24 +274,17 @@ class target(ProcessorBase):
         logging.info(f"Pump state: {pump_state}")
         logging.info(f"Pump mode: {pump_mode}")
 
-        ## Handle an update of the target tank sensor from the UI
+        ## Handle an update of the target tank sensor and tank thresholds from the UI
         tank_sensor_obj = self.get_tank_sensor_obj()
+        tank_level_triggers = self.get_tank_level_triggers()
+        logging.info(f"Tank level triggers: {tank_level_triggers}")
         if tank_sensor_obj:
-            result = self.get_pump_controller_obj().set_tank_sensor(self.get_tank_sensor_obj())
-            logging.info(f"Result of setting tank sensor: {result}")
+            self.configure_tank_sensor(tank_sensor_obj, tank_level_triggers)
         else:
             logging.warning("No available tank sensors found")
-
-        ## Handle an update of the tank thresholds from the UI
-        tank_level_triggers = self.get_tank_level_triggers()
-        logging.info(f"Tank level triggers: {tank_level_triggers}")
-        if tank_level_triggers:
-            tank_sensor_obj = self.get_tank_sensor_obj()
-            if not tank_sensor_obj:
+            if tank_level_triggers:
                 logging.warning("Tank sensor not found.")
                 return
-            result = tank_sensor_obj.set_tank_threshold(tank_level_triggers[0], tank_level_triggers[1])
-            logging.info(f"Result of setting tank thresholds: {result}")
 
         logging.info(f"checking that startButton has been pressed: {self.ui_manager.get_command('startStopNow').current_value}")
         ## Handle a pending start/stop pump command from the UI
@@ -202,14 +298,14 @@ class target(ProcessorBase):
             logging.info(f"Pump mode: {pump_mode}")
 
             if pump_state == True:
-                result = self.get_pump_controller_obj().stop_pump()
+                result = self.run_pump_command(self.get_pump_controller_obj().stop_pump, tank_sensor_obj)
                 logging.info(f"Result of stopping pump: {result}")
                 if pump_mode == PumpMode.ON:
                     ## Coerce the pump state to off
                     self.ui_manager.coerce_command("pumpMode", PumpMode.OFF)
                 self.set_pump_state(False)
             elif pump_state == False:
-                result = self.get_pump_controller_obj().start_pump()
+                result = self.run_pump_command(self.get_pump_controller_obj().start_pump, tank_sensor_obj)
                 logging.info(f"Result of starting pump: {result}")
                 if pump_mode == PumpMode.OFF:
                     ## Coerce the pump state to on
@@ -231,7 +327,7 @@ class target(ProcessorBase):
             pump_mode = self.get_pump_mode()
             logging.info(f"Pump mode: {pump_mode}") 
             if pump_mode:
-                result = self.get_pump_controller_obj().set_pump_mode(pump_mode)
+                result = self.run_pump_command(partial(self.get_pump_controller_obj().set_pump_mode, pump_mode), tank_sensor_obj)
                 logging.info(f"Result of setting pump mode: {result}")
                 if pump_mode == PumpMode.ON:
                     self.set_pump_state(True)
@@ -371,6 +467,111 @@ class target(ProcessorBase):
         self.ui_manager.push(record_log=save_log_required, even_if_empty=True)
 
 
+    ## The oldest pending uplink that will be ingested in one batch, relative to the latest (in seconds)
+    uplink_batch_max_age = 7 * 24 * 60 * 60
+
+    def iter_pending_uplinks(self):
+        ## Yield the uplinks that haven't been ingested yet, oldest first
+        latest = self.uplink_channel.last_message
+        if latest is None:
+            return
+
+        marker = self.uplink_ingest_channel.aggregate if self.uplink_ingest_channel else None
+        last_id = marker.get("message_id") if isinstance(marker, dict) else None
+        last_timestamp = marker.get("timestamp") if isinstance(marker, dict) else None
+        if last_id == latest.id:
+            return
+        if last_timestamp is None:
+            ## Nothing has been ingested in batch mode yet, so start from the latest uplink
+            yield latest
+            return
+
+        ## Pad the range, as datetimes only have microsecond precision (the marker itself is filtered out below)
+        since = max(last_timestamp, latest.timestamp - self.uplink_batch_max_age) - 1
+        for message in self.uplink_channel.iter_messages(
+            since=datetime.fromtimestamp(since, tz=timezone.utc),
+            until=datetime.fromtimestamp(latest.timestamp + 1, tz=timezone.utc),
+        ):
+            if message.id != last_id and message.timestamp >= last_timestamp:
+                yield message
+
+    @staticmethod
+    def iter_uplink_states(messages):
+        ## Parse uplinks into (message, pump_running) pairs, skipping any without a switch state
+        for message in messages:
+            payload = message.fetch_payload()
+            if not isinstance(payload, dict) or not isinstance(payload.get("message"), dict):
+                continue
+            switch_state = payload["message"].get("switch_state")
+            if switch_state is None:
+                continue
+            if switch_state == '0':
+                switch_state = False
+            yield message, bool(switch_state)
+
+    def record_pump_states(self, states):
+        ## Publish past pump states to ui_state with their original timestamps (concurrently), so they show in the history
+        path = self.ui_manager.get_ui_state_path("pumpState") or ["children", "pumpState"]
+
+        def state_update(value):
+            update = {"currentValue": value}
+            for key in reversed(path):
+                update = {key: update}
+            return {"state": update}
+
+        self.api.gather(*[
+            partial(
+                self.ui_state_channel.publish,
+                state_update(pump_running),
+                save_log=True,
+                timestamp=datetime.fromtimestamp(message.timestamp, tz=timezone.utc),
+            )
+            for message, pump_running in states
+        ])
+
+    def on_uplink_batch(self):
+
+        ## When a pump reconnects, Farmo flushes a burst of uplinks which each invoke the processor.
+        ## Rather than a full run (and UI push) for each, the invocation for the latest uplink ingests all of them at once
+        ## (the others are skipped in `setup`): changes of pump state are recorded with their original timestamps,
+        ## and then the latest uplink is processed as in an unbatched run.
+
+        ## Coalesce the pending uplinks to the latest state, keeping only the changes of state before it
+        changes = []
+        latest_state = None
+        previous = self.get_pump_state()
+        for message, pump_running in self.iter_uplink_states(self.iter_pending_uplinks()):
+            if pump_running != previous:
+                changes.append((message, pump_running))
+            previous = pump_running
+            latest_state = (message, pump_running)
+
+        if latest_state is None:
+            logging.info("No pending uplinks found")
+        else:
+            last_message, pump_running = latest_state
+            if changes and changes[-1][0] is last_message:
+                changes.pop()  ## The latest state is pushed with the UI by `on_uplink`
+
+            logging.info(f"Ingesting uplinks up to {last_message.id}, recording {len(changes)} earlier changes of pump state")
+            if changes:
+                self.record_pump_states(changes)
+
+            last_message.channel_name = self.uplink_channel_name
+            self.message = last_message
+
+        ## As in an unbatched run, reconcile the pump with the config (and any pending command) from the UI,
+        ## and then push the UI with the latest uplink
+        self.on_downlink()
+
+        if latest_state is not None:
+            ## Record where this batch ended, so the next one starts after it
+            self.uplink_ingest_channel.publish(
+                {"message_id": last_message.id, "timestamp": last_message.timestamp},
+                save_log=False,
+                override_aggregate=True,
+            )
+
 
     def on_schedule_update(self):
 
@@ -411,88 +612,31 @@ class target(ProcessorBase):
             return
         else:
             logging.info(f"IMEI: {imei}")
-        farmo_client = FarmoClient()
-        #schedule_manager = FarmoScheduleManager(farmo_client, imei)
-
-        #schedule_manager.clear_schedules()
-
-        payload = farmo_client.get_schedules(imei)
-        logging.info(f"Payload: {payload}")
-        for i in payload:
-            farmo_client.delete_schedule({
-                "imei":imei,
-                "schedule_id":i['schedule_id'],
-                })
-        
+
         current_time = int(time.time())
 
         logging.info(f"schedules to add from UI: {schedule_aggregate['schedules']}")
 
+        desired_items = []
         for schedule in schedule_aggregate['schedules']:
+            desired_items.extend(FarmoScheduleItem.from_ui_schedule(imei, schedule, current_time))
+
+        ## Reject overlapping schedules before making any changes in Farmo
+        horizon_start, horizon_end = FarmoTimeslotIndex.conflict_horizon(desired_items)
+        conflicts = FarmoTimeslotIndex.from_schedule_items(desired_items, horizon_start, horizon_end).conflicts()
+        if conflicts:
+            for (start, end, item), (other_start, other_end, other) in conflicts[:10]:
+                logging.error(f"Schedule conflict: {start}-{end} ({item.frequency}) overlaps {other_start}-{other_end} ({other.frequency})")
+            logging.error(f"Found {len(conflicts)} conflicting timeslots in UI schedules - skipping processing")
+            return
 
-                if schedule["start_time"] <= current_time + 30:
-                    if schedule["frequency"] == "once":
-                        logging.info("shcedule is in the past and is a once off schedule - skipping") 
-                        continue
-                        
-                    elif schedule["frequency"] == "daily":
-                        rawdiff = current_time + 30 - schedule["start_time"]
-                        incdiff = ((rawdiff // (24 * 3600)) + 1) * 24 * 3600
-                        start_time = schedule["start_time"] + incdiff
-
-                    elif schedule["frequency"] == "weekly":
-                        rawdiff = current_time + 30 - schedule["start_time"]
-                        incdiff = ((rawdiff // (24 * 3600 * 7)) + 1) * 24 * 3600 * 7
-                        start_time = schedule['start_time'] + incdiff
-
-                    if start_time >= schedule["end_time"]:
-                        logging.info("schedule has expired - skipping")
-                        continue
-
-                    end_time = start_time + (schedule["duration"] * 3600)
+        farmo_client = self.get_farmo_client()
 
-                else:
-                    start_time = schedule["start_time"]
-                    end_time = start_time + (schedule["duration"] * 3600)
-
-                if schedule["edited"] == 0:
-                    new_item = {
-                        "imei":imei,
-                        "start_time":start_time,
-                        "end_time":end_time,
-                        "frequency":schedule["frequency"],
-                        "repeat_until":schedule["end_time"]
-                    }
-                    farmo_client.add_schedules(new_item)
-
-                else:
-                    new_item = {
-                        "imei":imei,
-                        "timeslots":[]
-                    }
-                    for timeslot in schedule["timeslots"]:
-                        if timeslot["start_time"] <= current_time + 30:
-                            logging.info("timeslot is in the past - skipping")
-                            continue
-                        new_item["timeslots"].append({
-                            "start_time":timeslot["start_time"],
-                            "end_time":timeslot["end_time"],
-                        })
-
-                    farmo_client.add_schedules_manual(new_item)
-
-                test = farmo_client.get_schedules(imei)
-                logging.info(f"Updated schedules: {test}")
-                test2 = farmo_client.get_timeslots(imei)
-                # logging.info(f"Page BREAK FOR EYES")
-
-                # schedule["edited"] == 1:
-                #     plainSlots = []
-                #     editSlots = []
-                #     for i in 
-
-                # logging.info(f"Timeslots: {farmo_client.get_timeslots(imei)}")
-                logging.info(f"Timeslots: {test2}")    
+        ## Only add / delete the schedules that have changed, rather than clearing and re-adding everything
+        schedule_manager = FarmoScheduleManager.get_schedule(farmo_client, imei)
+        logging.info(f"Current schedules: {schedule_manager.to_json()}")
+        schedule_manager.sync(desired_items)
+        logging.info(f"Updated schedules: {schedule_manager.to_json()}")
 
     def get_connection_period(self):
         return 60 * 5 ## 5 mins
\ No newline at end of file
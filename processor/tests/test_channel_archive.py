@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+from pydoover.cloud.api import ChannelArchive
+from pydoover.cloud.api.message import Message
+
+
+START = 1_700_000_000
+
+
+def message(i, payload):
+    return Message(None, {"message": f"m{i}", "timestamp": START + i * 60, "payload": payload})
+
+
+class ChannelArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.archive = ChannelArchive(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_mixed_column_kinds(self):
+        # `x` is numeric in the first segment and a string in the second
+        self.archive.append_messages([message(0, {"x": 1, "y": 2.5}), message(1, {"y": None})])
+        self.archive.append_messages([message(2, {"x": "on", "y": "off"})])
+
+        data = self.archive.read(["x", "y"])
+        self.assertEqual(data["x"].tolist(), ["1", "", "on"])
+        self.assertEqual(data["y"].tolist(), ["2.5", "", "off"])
+
+    def test_numeric_columns(self):
+        self.archive.append_messages([message(0, {"x": 1})])
+        self.archive.append_messages([message(1, {"y": 2})])
+
+        data = self.archive.read(["x"])
+        self.assertEqual(data["x"].dtype.kind, "f")
+        self.assertEqual(data["x"][0], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
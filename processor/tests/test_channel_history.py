@@ -0,0 +1,82 @@
+import unittest
+
+from datetime import datetime, timezone
+
+from pydoover.cloud.api import ChannelCache, Client
+from pydoover.cloud.api.fake import FakeDooverAPI
+
+
+AGENT_ID = "test-agent"
+# a message every minute from this (UTC) time
+START = 1_700_000_000
+
+
+class ChannelHistoryTest(unittest.TestCase):
+    """`Client.iter_channel_messages` against the fake API, which only lists a channel's latest messages."""
+
+    def setUp(self):
+        self.api = FakeDooverAPI()
+        self.channel_id = self.api.add_channel(AGENT_ID, "history", aggregate={})
+        for i in range(250):
+            self.api.publish(self.channel_id, {"i": i}, timestamp=START + i * 60)
+
+        self.client = Client(token="fake", base_url=self.api.base_url, channel_cache=ChannelCache(path=None))
+        self.api.install(self.client.session)
+
+    def at(self, i):
+        return datetime.fromtimestamp(START + i * 60, tz=timezone.utc)
+
+    def test_range_oldest_first(self):
+        messages = list(self.client.iter_channel_messages(self.channel_id, since=self.at(20), until=self.at(29)))
+        self.assertEqual([m.fetch_payload()["i"] for m in messages], list(range(20, 30)))
+
+    def test_listing_grows_until_since(self):
+        self.api.reset_counts()
+        messages = list(self.client.iter_channel_messages(
+            self.channel_id, since=self.at(10), list_size=50, fetch_payloads=False
+        ))
+        self.assertEqual(len(messages), 240)
+        # 50, 100, 200 and then 400 (which has the whole channel) latest messages
+        self.assertEqual(self.api.request_counts["GET /ch/v1/channel/{}/messages/{}/"], 4)
+
+    def test_listing_stops_at_since(self):
+        self.api.reset_counts()
+        messages = list(self.client.iter_channel_messages(
+            self.channel_id, since=self.at(230), list_size=50, fetch_payloads=False
+        ))
+        self.assertEqual(len(messages), 20)
+        self.assertEqual(self.api.request_counts["GET /ch/v1/channel/{}/messages/{}/"], 1)
+
+
+class ChannelMessageCacheTest(unittest.TestCase):
+    """`Channel.fetch_messages` reusing the messages it has already fetched."""
+
+    def setUp(self):
+        self.api = FakeDooverAPI()
+        self.channel_id = self.api.add_channel(AGENT_ID, "small", aggregate={})
+        for i in range(3):
+            self.api.publish(self.channel_id, {"i": i}, timestamp=START + i * 60)
+
+        self.client = Client(token="fake", base_url=self.api.base_url, channel_cache=ChannelCache(path=None))
+        self.api.install(self.client.session)
+        self.channel = self.client.get_channel(self.channel_id)
+
+    def test_short_result_is_complete(self):
+        self.api.reset_counts()
+        self.assertEqual(len(self.channel.fetch_messages(10)), 3)
+        # the channel only has 3 messages, so asking for as many (or more) again doesn't refetch them
+        self.assertEqual(len(self.channel.fetch_messages(10)), 3)
+        self.assertEqual(len(self.channel.fetch_messages(50)), 3)
+        self.assertEqual(len(self.channel.fetch_messages(2)), 2)
+        self.assertEqual(self.api.request_counts["GET /ch/v1/channel/{}/messages/{}/"], 1)
+
+    def test_full_result_refetches_more(self):
+        self.api.reset_counts()
+        self.assertEqual(len(self.channel.fetch_messages(2)), 2)
+        self.assertEqual(len(self.channel.fetch_messages(1)), 1)
+        self.assertEqual(len(self.channel.fetch_messages(5)), 3)
+        self.assertEqual(self.api.request_counts["GET /ch/v1/channel/{}/messages/{}/"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+from pydoover.utils import kalman
+from pydoover.utils.kalman import KalmanFilter1D, KalmanFilterBank
+
+
+class KalmanFilterBankTest(unittest.TestCase):
+    """`KalmanFilterBank` against a `KalmanFilter1D` per channel, updated side by side."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.now = 1_700_000_000.0
+
+    def series(self, steps, size):
+        # a random walk per channel, with missing (NaN) measurements and large outliers
+        measurements = 10 + np.cumsum(self.rng.normal(0, 0.3, (steps, size)), axis=0)
+        measurements[self.rng.random((steps, size)) < 0.1] = np.nan
+        measurements[self.rng.random((steps, size)) < 0.05] += 50
+        return measurements
+
+    def assert_matches(self, bank, filters, measurements, use_dts=False):
+        for row in measurements:
+            self.now += self.rng.uniform(0.1, 3)
+            dts = self.rng.uniform(0.1, 3, len(filters)) if use_dts else None
+
+            estimates = bank.update(row, dts=dts)
+            with mock.patch.object(kalman.time, "time", return_value=self.now):
+                expected = [
+                    f.update(None if np.isnan(m) else float(m), dt=None if dts is None else float(dts[i]))
+                    for i, (f, m) in enumerate(zip(filters, row))
+                ]
+
+            expected = np.array([np.nan if e is None else e for e in expected])
+            np.testing.assert_allclose(estimates, expected, rtol=1e-12, equal_nan=True)
+
+            error_estimates = [np.nan if f.error_estimate is None else f.error_estimate for f in filters]
+            np.testing.assert_allclose(bank.error_estimate, error_estimates, rtol=1e-12, equal_nan=True)
+
+    def test_defaults(self):
+        bank = KalmanFilterBank(5, clock=lambda: self.now)
+        filters = [KalmanFilter1D() for _ in range(5)]
+        self.assert_matches(bank, filters, self.series(300, 5))
+
+    def test_dts(self):
+        bank = KalmanFilterBank(5, clock=lambda: self.now)
+        filters = [KalmanFilter1D() for _ in range(5)]
+        self.assert_matches(bank, filters, self.series(300, 5), use_dts=True)
+
+    def test_from_filters(self):
+        # each channel with its own parameters, and some already part way through a series
+        filters = [
+            KalmanFilter1D(process_variance=0.1),
+            KalmanFilter1D(outlier_protection=False),
+            KalmanFilter1D(outlier_threshold=2, outlier_variance_multiplier=100),
+            KalmanFilter1D(initial_estimate=12.0, initial_error_estimate=1.0),
+        ]
+        with mock.patch.object(kalman.time, "time", return_value=self.now):
+            filters[0].update(9.5)
+
+        bank = KalmanFilterBank.from_filters(filters, clock=lambda: self.now)
+        self.assert_matches(bank, filters, self.series(300, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from pydoover.utils import CalibrationTable, map_reading, map_readings
+
+
+# (output_values, raw_readings) pairs: the default 4-20mA span, a multi-point curve, unsorted / descending readings
+# and descending outputs
+CALIBRATIONS = [
+    ([0, 100], [4, 20]),
+    ([0, 30, 80, 100], [4, 8, 15, 20]),
+    ([100, 60, 10, 0], [4, 9, 14, 20]),
+    ([0, 50, 100], [20, 12, 4]),
+    ([5, 10, 20], [3.5, 10, 19]),
+]
+
+
+class MapReadingsTest(unittest.TestCase):
+    """`map_readings` against `map_reading` for each value."""
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        # values below ignore_below, within and beyond the raw readings
+        self.values = rng.uniform(0, 25, 2000).tolist() + [3, 2.999, 4, 20, 25.5]
+
+    def assert_matches(self, values, output_values, raw_readings, **kwargs):
+        mapped = map_readings(values, output_values, raw_readings, **kwargs)
+        for value, result in zip(values, mapped):
+            expected = map_reading(value, output_values, raw_readings, **kwargs)
+            if expected is None:
+                self.assertTrue(np.isnan(result), value)
+            else:
+                self.assertAlmostEqual(result, expected, places=12, msg=value)
+
+    def test_calibrations(self):
+        for output_values, raw_readings in CALIBRATIONS:
+            with self.subTest(raw_readings=raw_readings):
+                self.assert_matches(self.values + raw_readings, output_values, raw_readings)
+
+    def test_ignore_below(self):
+        self.assert_matches(self.values, [0, 100], [4, 20], ignore_below=6)
+
+    def test_nan(self):
+        self.assertTrue(np.isnan(map_readings([np.nan, 2.0], [0, 100])).all())
+
+    def test_calibration_table(self):
+        table = CalibrationTable([0, 30, 80, 100], [4, 8, 15, 20])
+        np.testing.assert_array_equal(map_readings(self.values, table), table(self.values))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+from pydoover.utils import pid
+from pydoover.utils.pid import PID, PIDBank, SimulatedClock
+
+
+class PIDBankTest(unittest.TestCase):
+    """`PIDBank` against a `PID` per loop, updated side by side."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+        self.controllers = [
+            PID(1.2, 0.5, 0.1, setpoint=5),
+            PID(0.8, 0.2, 0.0, setpoint=2, output_limits=(-5, 5)),
+            PID(2.0, 0.0, 0.3, setpoint=8, output_limits=(None, 3)),
+            PID(0.5, 1.0, 0.05, setpoint=0, output_limits=(-1, None)),
+        ]
+
+    def feedback(self, steps):
+        # noisy feedback, with loops missing (NaN) a value at some steps
+        values = self.rng.normal(5, 3, (steps, len(self.controllers)))
+        values[self.rng.random(values.shape) < 0.2] = np.nan
+        return values
+
+    def expected(self, row, now):
+        # a loop without feedback isn't updated, and keeps its last output
+        with mock.patch.object(pid.time, "time", return_value=now):
+            return [c._last_output if np.isnan(v) else c.update(float(v)) for c, v in zip(self.controllers, row)]
+
+    def test_update(self):
+        clock = SimulatedClock(1_700_000_000)
+        bank = PIDBank.from_controllers(self.controllers, clock=clock)
+
+        for row in self.feedback(300):
+            # including repeated timestamps, which neither updates
+            clock.advance(self.rng.choice([0, 0.5, 1.3]))
+            outputs = bank.update(row)
+            np.testing.assert_allclose(outputs, self.expected(row, clock.time), rtol=1e-12)
+
+    def test_replay(self):
+        bank = PIDBank.from_controllers(self.controllers)
+        timestamps = 1_700_000_000 + np.cumsum(self.rng.uniform(0.1, 2, 200))
+        feedback = self.feedback(200)
+
+        outputs = bank.replay(timestamps, feedback)
+        for t, row, output in zip(timestamps, feedback, outputs):
+            np.testing.assert_allclose(output, self.expected(row, t), rtol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from farmo_client import Client, ScheduleItem, ScheduleManager
+from farmo_client.fake import FakeFarmoAPI
+from farmo_client.schedule import ScheduleFrequency, SECONDS_PER_DAY
+
+
+IMEI = "444666444666444"
+# midnight UTC
+START = 1_700_006_400
+
+
+def daily(start_time, hours=1, repeat_until=None):
+    return ScheduleItem(
+        imei=IMEI, start_time=start_time, duration=hours * 3600, frequency=ScheduleFrequency.daily, repeat_until=repeat_until
+    )
+
+
+class ScheduleSyncTest(unittest.TestCase):
+    """`ScheduleManager.sync` against the fake Farmo API."""
+
+    def setUp(self):
+        self.api = FakeFarmoAPI()
+        self.api.add_device(IMEI)
+        self.client = Client(token="fake")
+        self.api.install(self.client.session)
+
+        # a daily schedule at 6am, already on Farmo
+        self.api.schedules[IMEI] = [{
+            "imei": IMEI, "schedule_id": 7, "start_time": START + 6 * 3600, "end_time": START + 7 * 3600, "frequency": "daily",
+        }]
+        self.api._next_schedule_id = 8
+        self.manager = ScheduleManager.get_schedule(self.client, IMEI)
+
+    def remote_keys(self):
+        return sorted(ScheduleItem(json_data=s).sync_key() for s in self.api.schedules[IMEI])
+
+    def test_no_op(self):
+        self.api.reset_counts()
+        # the same schedule, rolled forward to its next occurrence, doesn't need any changes
+        diff = self.manager.sync([daily(START + SECONDS_PER_DAY + 6 * 3600)])
+
+        self.assertFalse(diff)
+        self.assertEqual(len(diff.unchanged), 1)
+        self.assertEqual(sum(self.api.request_counts.values()), 0)
+        self.assertIs(self.manager.get_schedule_item(7), diff.unchanged[0])
+
+    def test_add(self):
+        self.api.reset_counts()
+        added = daily(START + 18 * 3600, hours=2)
+        diff = self.manager.sync([daily(START + 6 * 3600), added])
+
+        self.assertEqual(diff.to_add, [added])
+        self.assertEqual(diff.to_delete, [])
+        self.assertEqual(self.api.request_counts["POST add_schedules"], 1)
+        self.assertEqual(self.api.request_counts["POST delete_schedule"], 0)
+        self.assertEqual(self.remote_keys(), sorted([daily(START + 6 * 3600).sync_key(), added.sync_key()]))
+
+        # the added item is only found by the ID Farmo assigned it, once it's pulled
+        self.assertFalse(added.has_server_id)
+        self.assertIsNone(self.manager.get_schedule_item(added.schedule_id))
+        self.assertIsNotNone(self.manager.get_schedule_item(8))
+
+    def test_delete(self):
+        self.api.reset_counts()
+        diff = self.manager.sync([])
+
+        self.assertEqual([item.schedule_id for item in diff.to_delete], [7])
+        self.assertEqual(diff.to_add, [])
+        self.assertEqual(self.api.request_counts["POST delete_schedule"], 1)
+        self.assertEqual(self.api.schedules[IMEI], [])
+        self.assertIsNone(self.manager.get_schedule_item(7))
+
+    def test_changed(self):
+        # a changed schedule is deleted and re-added
+        diff = self.manager.sync([daily(START + 6 * 3600, hours=3)])
+
+        self.assertEqual(len(diff.to_delete), 1)
+        self.assertEqual(len(diff.to_add), 1)
+        self.assertEqual(self.remote_keys(), [daily(START + 6 * 3600, hours=3).sync_key()])
+
+    def test_unsynced_items_not_indexed(self):
+        manager = ScheduleManager(self.client, IMEI)
+        item = daily(START)
+        manager.add_schedule_item(item)
+
+        self.assertIn(item, manager.schedule_items)
+        self.assertNotIn(item.schedule_id, manager._items_by_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from pydoover.ui import Container, NumericVariable, Submodule
+
+
+class DuplicateNameTest(unittest.TestCase):
+    """Element lookups when a name is used in more than one place in a tree."""
+
+    def setUp(self):
+        self.root = Container(name=None, display_name=None)
+        self.first = NumericVariable("level", "First")
+        self.second = NumericVariable("level", "Second")
+        self.third = NumericVariable("level", "Third")
+
+        self.outer = Submodule("outer", "Outer")
+        self.inner = Submodule("inner", "Inner")
+        self.inner.add_children(self.first)
+        self.outer.add_children(self.inner)
+
+        self.later = Submodule("later", "Later")
+        self.later.add_children(self.second)
+        self.root.add_children(self.outer, self.later)
+
+    def test_get_element_depth_first(self):
+        # added after `first`, but `first` is found first searching the tree depth-first
+        self.assertIs(self.root.get_element("level"), self.first)
+        self.later.add_children(Submodule("nested", "Nested"))
+        self.later.get_element("nested").add_children(self.third)
+        self.assertIs(self.root.get_element("level"), self.first)
+        self.assertIs(self.later.get_element("level"), self.second)
+
+    def test_get_element_direct_child_first(self):
+        self.root.add_children(self.third)
+        self.assertIs(self.root.get_element("level"), self.third)
+
+    def test_remove_children_removes_all(self):
+        self.root.remove_children(NumericVariable("level", "Level"))
+        self.assertIsNone(self.root.get_element("level"))
+        self.assertIsNone(self.inner.get_element("level"))
+        self.assertIsNone(self.later.get_element("level"))
+        # the containers themselves are kept
+        self.assertIs(self.root.get_element("inner"), self.inner)
+
+
+if __name__ == "__main__":
+    unittest.main()
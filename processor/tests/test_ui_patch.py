@@ -0,0 +1,100 @@
+import unittest
+
+from pydoover.cloud.api import ChannelCache, Client
+from pydoover.cloud.api.fake import FakeDooverAPI
+from pydoover.ui import HiddenValue, NumericVariable, UIManager
+
+
+AGENT_ID = "test-agent"
+
+
+class PatchUpdatesTest(unittest.TestCase):
+    """UIManager(patch_updates=True) against the fake API, which merges published payloads into aggregates."""
+
+    def setUp(self):
+        self.api = FakeDooverAPI()
+        self.ui_state_id = self.api.add_channel(AGENT_ID, "ui_state", aggregate={})
+        self.ui_cmds_id = self.api.add_channel(AGENT_ID, "ui_cmds", aggregate={})
+
+        self.client = Client(token="fake", base_url=self.api.base_url, channel_cache=ChannelCache(path=None))
+        self.api.install(self.client.session)
+
+    def make_manager(self, level=None, mode=None, **kwargs):
+        kwargs.setdefault("patch_updates", True)
+        manager = UIManager(AGENT_ID, self.client, **kwargs)
+        manager.add_children(
+            NumericVariable("level", "Level", curr_val=level),
+            HiddenValue("mode", current_value=mode),
+        )
+        return manager
+
+    def aggregate(self, channel_id):
+        return self.api.channels[channel_id]["aggregate"]
+
+    def test_push_pull_push(self):
+        manager = self.make_manager(level=10, mode="auto")
+        manager.push()
+        self.assertEqual(self.aggregate(self.ui_state_id)["state"]["children"]["level"]["currentValue"], 10)
+        self.assertEqual(self.aggregate(self.ui_cmds_id)["cmds"], {"mode": "auto"})
+
+        # the second push pulls the aggregates published by the first
+        manager.update_variable("level", 20)
+        manager.get_interaction("mode").current_value = "manual"
+        manager.push()
+
+        self.assertEqual(self.aggregate(self.ui_state_id)["state"]["children"]["level"]["currentValue"], 20)
+        self.assertEqual(self.aggregate(self.ui_cmds_id)["cmds"], {"mode": "manual"})
+
+        # only the operations are logged, and they aren't kept in the aggregate
+        message = self.api.channels[self.ui_state_id]["messages"][-1]["payload"]
+        self.assertEqual(list(message), ["patch"])
+        self.assertIn(
+            {"op": "replace", "path": "/children/level/currentValue", "value": 20}, message["patch"]
+        )
+        self.assertNotIn("patch", self.aggregate(self.ui_state_id))
+        self.assertNotIn("patch", self.aggregate(self.ui_cmds_id))
+
+        # a new manager (ie. the next invocation) loads the same state, and can push on top of it
+        other = self.make_manager(level=30, mode="manual")
+        other.pull()
+        self.assertEqual(other.get_from_ui_state("level")["currentValue"], 20)
+        self.assertEqual(other.last_ui_cmds, {"mode": "manual"})
+
+        other.push()
+        self.assertEqual(self.aggregate(self.ui_state_id)["state"]["children"]["level"]["currentValue"], 30)
+
+    def test_load_pending_patch(self):
+        # an aggregate the operations have been published to, but not yet the merge-style update
+        manager = self.make_manager()
+        manager.load_aggregates(
+            {
+                "state": {"children": {"level": {"currentValue": 10}}},
+                "patch": [{"op": "replace", "path": "/children/level/currentValue", "value": 20}],
+            },
+            {"cmds": {"mode": "auto"}, "patch": [{"op": "replace", "path": "/mode", "value": "manual"}]},
+        )
+        self.assertEqual(manager.get_from_ui_state("level")["currentValue"], 20)
+        self.assertEqual(manager.last_ui_cmds, {"mode": "manual"})
+        self.assertEqual(manager.get_interaction("mode").current_value, "manual")
+
+    def test_push_skips_pull_when_current(self):
+        for patch_updates in (True, False):
+            manager = self.make_manager(level=10, mode="auto", patch_updates=patch_updates, max_pull_age=60)
+            manager.pull()
+            self.api.reset_counts()
+
+            manager.push()
+            manager.update_variable("level", 20)
+            manager.get_interaction("mode").current_value = "manual"
+            manager.push()
+
+            # both pushes rely on the pulled aggregates (kept in sync with what was published) rather than pulling
+            self.assertEqual(sum(n for k, n in self.api.request_counts.items() if k.startswith("GET")), 0)
+            self.assertEqual(self.aggregate(self.ui_state_id)["state"]["children"]["level"]["currentValue"], 20)
+            self.assertEqual(self.aggregate(self.ui_cmds_id)["cmds"], {"mode": "manual"})
+            self.assertEqual(manager.last_ui_cmds, {"mode": "manual"})
+            self.assertEqual(manager.get_from_ui_state("level")["currentValue"], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()